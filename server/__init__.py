@@ -13,12 +13,30 @@ import server.extensions as ext
 from server.database import init_session_factory
 from server.api.routes import api_bp
 from server.errors import errors_bp
+from server.search import install_search_indexes
+from server.versions import install_table_versions
+from server.readmodels import install_read_models
+from server.cache import ref_cache
+from server.jobs import job_runner
+from server.graph import graph_index
+from server.database import session_scope
+from sqlalchemy.exc import OperationalError
 
 def create_app(engine=None) -> Flask:
     app = Flask(__name__)
     if engine is not None:
         ext.ENGINE = engine
         init_session_factory()
+    install_search_indexes(ext.ENGINE)
+    install_table_versions(ext.ENGINE)
+    install_read_models(ext.ENGINE)
+    try:
+        with session_scope() as s:
+            ref_cache.warm(s)
+            graph_index.build(s)
+        job_runner.recover_jobs()
+    except OperationalError:
+        pass  # schema not created yet; the cache fills lazily
 
     CORS(
         app,
@@ -6,12 +6,33 @@ import time
 from pathlib import Path
 from urllib.parse import urlparse
 from datetime import date, datetime, timedelta
+from decimal import Decimal
 
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, Response, request, jsonify, current_app, send_file, stream_with_context
 from werkzeug.utils import secure_filename
 
 from ..database import session_scope
-from ..crud import list_items, get_item, create_item, update_item, delete_item
+from ..cache import invalidate_for, ref_cache
+from ..graph import GRAPH_MODELS, ROLES as GRAPH_ROLES, graph_index
+from ..serializers import dump_many
+from ..versions import (
+    change_token, change_token_expired, changed_since, left_since, make_etag, not_modified,
+    parse_change_token, with_etag,
+)
+from ..explain import predicate_report, predicate_stats
+from ..jobs import QueueFull, job_runner
+from ..network import DEFAULT_SAMPLES, MAX_SAMPLES, metrics_cache
+from ..loading import columns_only, loader_options
+from ..queries import (
+    CLUSTER_KEYS, EXPIRY_SCOPES, NETWORK_WEIGHTS, ROLLUP_DIMENSIONS, ROLLUP_MEASURES, ROLLUP_UNIT,
+    all_in, cluster_interlinkage_ids, dependency_clusters, expiry_page, expiry_totals, exposure_rollup,
+    latest_exposures, maturity_bucket,
+)
+from ..crud import (
+    list_items, get_item, create_item, update_item, delete_item, export_items, expand_tables, explain_list,
+    bulk_create_items, bulk_update_items, bulk_delete_items,
+)
+from .. import frames
 from .. import models as m
 from ..schemas import (
     CurrencySchema, CountrySchema, SectorSchema, PraActivitySchema, CounterpartyTypeSchema,
@@ -46,32 +67,75 @@ RESOURCES = [
     (m.WorkflowEvent, "workflow-events", WorkflowEventSchema()),
 ]
 
+# target schemas for ?expand= on list/get
+SCHEMAS_BY_MODEL = {model: schema for model, _, schema in RESOURCES}
+
+def _patch_graph(model, resp, item_id=None):
+    """Hand the ids a successful write view response wrote (item_id for single updates/deletes) to the graph index."""
+    if model not in GRAPH_MODELS:
+        return
+    body, status = resp if isinstance(resp, tuple) else (resp, resp.status_code)
+    if status >= 400:
+        return
+    if item_id is not None:
+        ids = [item_id]
+    else:
+        data = body.get_json()
+        ids = [r["id"] for r in data["results"] if r["status"] < 400] if "results" in data else [data.get("id")]
+    graph_index.patch(model, ids)
+
+
 for model, name, schema in RESOURCES:
     list_ep        = f"/{name}"
     item_get_ep    = f"/{name}/<int:item_id>"
     item_update_ep = f"/{name}/<int:item_id>/update"   # POST for update
     item_delete_ep = f"/{name}/<int:item_id>/delete"   # POST for delete
+    export_ep      = f"/{name}/export"                  # GET ?format=ndjson|csv
+    bulk_create_ep = f"/{name}/bulk"                    # POST [{...}, ...] or {"items": [...]}
+    bulk_update_ep = f"/{name}/bulk/update"             # POST [{"id": .., ...}, ...]
+    bulk_delete_ep = f"/{name}/bulk/delete"             # POST {"ids": [...]}
 
     def _make_list(model=model, schema=schema):
         def _list():
             include_deleted = request.args.get("include_deleted") in ("1", "true", "yes")
             with session_scope() as s:
-                return list_items(s, model, schema, include_deleted=include_deleted)
+                etag = make_etag(s, [model.__tablename__] + expand_tables(model, SCHEMAS_BY_MODEL))
+                cached = not_modified(etag)
+                if cached is not None:
+                    return cached
+                resp = list_items(s, model, schema, include_deleted=include_deleted, related_schemas=SCHEMAS_BY_MODEL)
+                return with_etag(resp, etag)
         _list.__name__ = f"{name}_list_view"
         return _list
 
+    def _make_export(model=model, schema=schema):
+        def _export():
+            include_deleted = request.args.get("include_deleted") in ("1", "true", "yes")
+            return export_items(model, schema, include_deleted=include_deleted)
+        _export.__name__ = f"{name}_export_view"
+        return _export
+
     def _make_get(model=model, schema=schema):
         def _get(item_id: int):
             with session_scope() as s:
-                return get_item(s, model, schema, item_id)
+                etag = make_etag(s, [model.__tablename__] + expand_tables(model, SCHEMAS_BY_MODEL))
+                cached = not_modified(etag)
+                if cached is not None:
+                    return cached
+                return with_etag(get_item(s, model, schema, item_id, related_schemas=SCHEMAS_BY_MODEL), etag)
         _get.__name__ = f"{name}_get_view"
         return _get
 
     def _make_create(model=model, schema=schema):
         def _create():
             payload = request.get_json(force=True, silent=False)
-            with session_scope() as s:
-                return create_item(s, model, schema, payload)
+            try:
+                with session_scope() as s:
+                    resp = create_item(s, model, schema, payload)
+            finally:
+                invalidate_for(model)
+            _patch_graph(model, resp)
+            return resp
         _create.__name__ = f"{name}_create_view"
         return _create
 
@@ -79,25 +143,113 @@ for model, name, schema in RESOURCES:
         def _update(item_id: int):
             # allow empty body meaning "no-op"
             payload = request.get_json(silent=True) or {}
-            with session_scope() as s:
-                return update_item(s, model, schema, item_id, payload)
+            try:
+                with session_scope() as s:
+                    resp = update_item(s, model, schema, item_id, payload)
+            finally:
+                invalidate_for(model)
+            _patch_graph(model, resp, item_id)
+            return resp
         _update.__name__ = f"{name}_update_view"
         return _update
 
     def _make_delete(model=model):
         def _delete(item_id: int):
             soft = request.args.get("soft", "1") != "0"
-            with session_scope() as s:
-                return delete_item(s, model, item_id, soft=soft)
+            try:
+                with session_scope() as s:
+                    resp = delete_item(s, model, item_id, soft=soft)
+            finally:
+                invalidate_for(model)
+            _patch_graph(model, resp, item_id)
+            return resp
         _delete.__name__ = f"{name}_delete_view"
         return _delete
 
+    def _make_bulk_create(model=model, schema=schema):
+        def _bulk_create():
+            payload = request.get_json(force=True, silent=False)
+            try:
+                with session_scope() as s:
+                    resp = bulk_create_items(s, model, schema, payload)
+            finally:
+                invalidate_for(model)
+            _patch_graph(model, resp)
+            return resp
+        _bulk_create.__name__ = f"{name}_bulk_create_view"
+        return _bulk_create
+
+    def _make_bulk_update(model=model, schema=schema):
+        def _bulk_update():
+            payload = request.get_json(force=True, silent=False)
+            try:
+                with session_scope() as s:
+                    resp = bulk_update_items(s, model, schema, payload)
+            finally:
+                invalidate_for(model)
+            _patch_graph(model, resp)
+            return resp
+        _bulk_update.__name__ = f"{name}_bulk_update_view"
+        return _bulk_update
+
+    def _make_bulk_delete(model=model):
+        def _bulk_delete():
+            payload = request.get_json(force=True, silent=False)
+            soft = request.args.get("soft", "1") != "0"
+            try:
+                with session_scope() as s:
+                    resp = bulk_delete_items(s, model, payload, soft=soft)
+            finally:
+                invalidate_for(model)
+            _patch_graph(model, resp)
+            return resp
+        _bulk_delete.__name__ = f"{name}_bulk_delete_view"
+        return _bulk_delete
+
     # unique endpoints
     api_bp.add_url_rule(list_ep,        view_func=_make_list(),   methods=["GET"],  endpoint=f"{name}_list")
     api_bp.add_url_rule(list_ep,        view_func=_make_create(), methods=["POST"], endpoint=f"{name}_create")
     api_bp.add_url_rule(item_get_ep,    view_func=_make_get(),    methods=["GET"],  endpoint=f"{name}_get")
+    api_bp.add_url_rule(export_ep,      view_func=_make_export(), methods=["GET"],  endpoint=f"{name}_export")
     api_bp.add_url_rule(item_update_ep, view_func=_make_update(), methods=["POST"], endpoint=f"{name}_update")
     api_bp.add_url_rule(item_delete_ep, view_func=_make_delete(), methods=["POST"], endpoint=f"{name}_delete")
+    api_bp.add_url_rule(bulk_create_ep, view_func=_make_bulk_create(), methods=["POST"], endpoint=f"{name}_bulk_create")
+    api_bp.add_url_rule(bulk_update_ep, view_func=_make_bulk_update(), methods=["POST"], endpoint=f"{name}_bulk_update")
+    api_bp.add_url_rule(bulk_delete_ep, view_func=_make_bulk_delete(), methods=["POST"], endpoint=f"{name}_bulk_delete")
+
+
+# --- admin: query plans / index advice ---
+RESOURCES_BY_NAME = {name: (model, schema) for model, name, schema in RESOURCES}
+
+
+@api_bp.get("/_admin/explain/<resource>")
+def admin_explain(resource: str):
+    """
+    EXPLAIN QUERY PLAN + timings for GET /api/<resource> with the same query string
+    (filters, sort, fields, page/page_size or cursor).
+    """
+    if resource not in RESOURCES_BY_NAME:
+        return jsonify({"error": "not_found"}), 404
+    model, schema = RESOURCES_BY_NAME[resource]
+    include_deleted = request.args.get("include_deleted") in ("1", "true", "yes")
+    with session_scope() as s:
+        return explain_list(s, model, schema, include_deleted=include_deleted)
+
+
+@api_bp.get("/_admin/explain")
+def admin_unindexed_predicates():
+    """
+    Most frequent list filter/sort combinations served without an index since start-up
+    (or the last ?reset=1), with a suggested composite index for each.
+    """
+    try:
+        limit = max(int(request.args.get("limit", 20)), 1)
+    except ValueError:
+        limit = 20
+    report = predicate_report(limit)
+    if request.args.get("reset") in ("1", "true", "yes"):
+        predicate_stats.reset()
+    return jsonify({"items": report})
 
 
 def _sha256(path: str) -> str:
@@ -165,7 +317,8 @@ def upload_interlinkage_attachment():
         # enrich (not persisted unless you add columns)
         payload.update({"size": size, "checksum": checksum})
 
-        return jsonify(payload), 201
+    invalidate_for(m.InterlinkageAttachment)
+    return jsonify(payload), 201
 
 
 
@@ -224,8 +377,15 @@ def download_interlinkage_attachment(att_id: int):
             conditional=True,
         )
 
-from sqlalchemy import func, and_, or_, select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import or_
+
+FOCUS_KINDS = ("project", "entity", "interlinkage")
+NOT_FOUND_ENTITY = {"project": "project", "entity": "legal_entity", "interlinkage": "interlinkage"}
+MAX_FOCI = 200
+MAX_DEPTH = 5
+DEFAULT_MAX_NODES = 1000
+MAX_NODES = 20000
+
 
 @api_bp.get("/focus-bundle")
 def focus_bundle():
@@ -233,8 +393,14 @@ def focus_bundle():
     Return EVERYTHING related to a selected focus, in one efficient payload.
 
     Query params:
-      - kind: 'project' | 'entity' | 'interlinkage'   (required)
-      - id:   int                                     (required)
+      - kind: 'project' | 'entity' | 'interlinkage'   (required unless foci is given)
+      - id:   int                                     (required unless foci is given)
+      - foci: 'project:12,entity:7,...'  batch mode: the union of several foci in one
+              payload (at most MAX_FOCI); shared rows appear once
+      - depth: 1..MAX_DEPTH (default 1)  hops to follow: entity/project -> interlinkage ->
+               its entities/projects (incl. interdependence projects) -> ...
+      - max_nodes: node budget for depth > 1 (default DEFAULT_MAX_NODES, nearest kept)
+      - max_edges: traversal-step budget for depth > 1 (default 10 x max_nodes)
       - include_interdeps: 0|1 (default 1)
       - exposures_mode: 'none' | 'latest' | 'last_n'  (default 'latest')
       - exposures_n: int (only used if exposures_mode='last_n'; default 12)
@@ -242,10 +408,30 @@ def focus_bundle():
       - include_attachments: 0|1 (default 1)
       - include_workflow: 0|1 (default 1)
       - include_analysis: 0|1 (default 1)
+      - since: the "token" of a previous response. Delta bundle: only rows created,
+              updated or deleted after it (interlinkages that changed come with
+              everything they point at and all of their sub-rows, and their edges
+              only), rows deleted (soft or hard) or re-pointed out of scope listed by
+              id under "deleted".
+              Exposures are resent as the whole window of each interlinkage with a
+              changed snapshot. A token older than the change log's retention
+              (server/versions.py) gets a 410: fetch the full bundle again.
+      - format: 'json' (default) | 'ndjson' | 'msgpack'
+              ndjson/msgpack stream one {"section": name, "items": rows} frame per section
+              as soon as it is fetched: "meta" first (focus/foci/missing/depth/truncated),
+              then interlinkages, projects, legal_entities, ..., edges last. msgpack
+              sends exposures column by column ({"section", "columns", "scale"}, see
+              server/frames.py) and needs the optional msgpack package.
 
     Response JSON (IDs are unique; ref tables are filtered to only what's used):
       {
         "focus": {"kind": "...", "id": ...},
+        // batch mode instead: "foci": [{"kind", "id"}, ...] found, "missing": [...] not found
+        // depth > 1 adds: "depth": n, "truncated": true|false (a budget was hit)
+        "token": "...",              // pass back as ?since= for the next refresh
+        // since= adds: "since": "...", "deleted": {"interlinkages": [ids], "exposures": [ids], ...}
+        // projects / legal_entities / interlinkages rows carry "hop": distance from the nearest focus
+
 
         "projects": [...],
         "legal_entities": [...],
@@ -273,6 +459,7 @@ def focus_bundle():
         },
 
         "edges": [
+          // every edge carries "foci": ["project:12", ...], the foci that reached it
           // entity <-> interlinkage (role-aware)
           {"type":"entity-interlinkage","role":"sponsor","entity_id":..,"interlinkage_id":..},
           {"type":"entity-interlinkage","role":"counterparty","entity_id":..,"interlinkage_id":..},
@@ -283,6 +470,9 @@ def focus_bundle():
 
           // interdep -> interlinkage
           {"type":"interdep-of","interdep_id":..,"interlinkage_id":..}
+
+          // interdep -> project (depth > 1 only)
+          {"type":"interdep-project","interdep_id":..,"interlinkage_id":..,"project_id":..}
         ]
       }
     """
@@ -302,10 +492,27 @@ def focus_bundle():
         if v is None: return default
         return v.lower() in ("1", "true", "yes", "on")
 
-    kind = qstr("kind")
-    focus_id = qint("id")
-    if kind not in ("project", "entity", "interlinkage") or not focus_id:
-        return jsonify({"error": "invalid_args", "hint": "kind ∈ {project, entity, interlinkage} and id is required"}), 400
+    # --------- foci: ?foci=project:1,entity:7,... (batch) or ?kind=&id= (single)
+    raw_foci = qstr("foci")
+    batch = raw_foci is not None
+    if batch:
+        foci = []
+        for part in raw_foci.split(","):
+            k, _, v = part.strip().partition(":")
+            try:
+                foci.append((k, int(v)))
+            except ValueError:
+                foci.append((k, None))
+    else:
+        kind, focus_id = qstr("kind"), qint("id")
+        foci = [(kind, focus_id)]
+    foci = list(dict.fromkeys(foci))
+    if any(k not in FOCUS_KINDS or not i for k, i in foci):
+        hint = ("foci is a comma-separated list of <kind>:<id>, kind ∈ {project, entity, interlinkage}" if batch
+                else "kind ∈ {project, entity, interlinkage} and id is required")
+        return jsonify({"error": "invalid_args", "hint": hint}), 400
+    if len(foci) > MAX_FOCI:
+        return jsonify({"error": "invalid_args", "hint": f"at most {MAX_FOCI} foci per request"}), 400
 
     include_interdeps = qbool("include_interdeps", True)
     exposures_mode     = qstr("exposures_mode", "latest")  # 'none' | 'latest' | 'last_n'
@@ -315,83 +522,129 @@ def focus_bundle():
     include_workflow   = qbool("include_workflow", True)
     include_analysis   = qbool("include_analysis", True)
 
+    depth     = qint("depth", 1)
+    max_nodes = qint("max_nodes", DEFAULT_MAX_NODES)
+    max_edges = qint("max_edges", max_nodes * 10 if max_nodes else None)
+    if not (1 <= depth <= MAX_DEPTH):
+        return jsonify({"error": "invalid_args", "hint": f"depth must be between 1 and {MAX_DEPTH}"}), 400
+    if not (max_nodes and 1 <= max_nodes <= MAX_NODES) or not (max_edges and max_edges >= 1):
+        return jsonify({"error": "invalid_args", "hint": f"max_nodes ∈ [1, {MAX_NODES}], max_edges >= 1"}), 400
+
+    fmt = (qstr("format", "json")).lower()
+    if fmt != "json" and fmt not in frames.MIMETYPES:
+        return jsonify({"error": "invalid_args", "hint": "format ∈ {json, ndjson, msgpack}"}), 400
+    if fmt != "json" and not frames.available(fmt):
+        return jsonify({"error": "unsupported_format", "hint": f"format={fmt} needs the {fmt} package on the server"}), 406
+
+    raw_since = qstr("since")
+    since = None if raw_since is None else parse_change_token(raw_since)
+    if raw_since is not None and since is None:
+        return jsonify({"error": "invalid_args", "hint": "since must be the token of a previous focus-bundle response"}), 400
+    with session_scope() as s:
+        if since is not None and change_token_expired(s, since):
+            return jsonify({"error": "token_expired", "hint": "fetch the full bundle again"}), 410
+        token = change_token(s)  # taken before any read: what changes from here on is in the next delta
+
     # --------- tiny helper
     def not_deleted(q, Model):
         if hasattr(Model, "is_deleted"):
             return q.filter(Model.is_deleted == False)  # noqa: E712
         return q
 
-    with session_scope() as s:
-        # Accumulators (use sets for IDs to de-dup)
-        proj_set, ent_set, il_set, dep_set = set(), set(), set(), set()
-        fac_set, inst_set, ccy_set = set(), set(), set()
-        exp_rows, att_rows, note_rows, wf_rows, an_rows = [], [], [], [], []
-        edges = []
-
-        # =============== FOCUS BRANCHES ===============
-        if kind == "project":
-            prj = not_deleted(s.query(m.Project).filter(m.Project.id == focus_id), m.Project).first()
-            if not prj: return jsonify({"error":"not_found","entity":"project"}), 404
-            proj_set.add(prj.id)
-
-            # All interlinkages of this project
-            ils = not_deleted(
-                s.query(m.Interlinkage).options(
-                    selectinload(m.Interlinkage.interdependences),
-                    selectinload(m.Interlinkage.exposures),
-                    selectinload(m.Interlinkage.attachments),
-                    selectinload(m.Interlinkage.notes),
-                    selectinload(m.Interlinkage.workflow_events),
-                    selectinload(m.Interlinkage.analysis),
-                ).filter(m.Interlinkage.project_id == prj.id),
-                m.Interlinkage
-            ).all()
+    # relations read off the focus interlinkages (exposures are queried separately;
+    # a delta bundle queries only the changed sub-rows instead)
+    il_loads = loader_options("focus_bundle", m.Interlinkage, without=[
+        rel for rel, wanted in (
+            ("interdependences", include_interdeps), ("attachments", include_attachments),
+            ("notes", include_notes), ("workflow_events", include_workflow), ("analysis", include_analysis),
+        ) if not wanted or since is not None
+    ])
+
+    def sections():
+        """(section, rows) pairs in fetch order; the first is ("meta", {...}) or ("not_found", None)."""
+        with session_scope() as s:
+            # Accumulators (use sets for IDs to de-dup)
+            proj_set, ent_set, il_set, dep_set = set(), set(), set(), set()
+            fac_set, inst_set = set(), set()
+            att_rows, note_rows, wf_rows, an_rows = [], [], [], []
+            edges = []
+
+            # =============== FOCI ===============
+            focus_ids = {k: {i for kk, i in foci if kk == k} for k in FOCUS_KINDS}
+            found = set()
+            if focus_ids["project"]:
+                rows = not_deleted(s.query(m.Project.id).filter(m.Project.id.in_(focus_ids["project"])), m.Project).all()
+                found |= {("project", r[0]) for r in rows}
+            if focus_ids["entity"]:
+                rows = not_deleted(s.query(m.LegalEntity.id).filter(m.LegalEntity.id.in_(focus_ids["entity"])), m.LegalEntity).all()
+                found |= {("entity", r[0]) for r in rows}
+
+            prj_ids, ent_ids, il_ids = focus_ids["project"], focus_ids["entity"], focus_ids["interlinkage"]
+            truncated = False
+            if depth > 1:
+                if il_ids:
+                    rows = not_deleted(s.query(m.Interlinkage.id).filter(m.Interlinkage.id.in_(il_ids)), m.Interlinkage).all()
+                    found |= {("interlinkage", r[0]) for r in rows}
+                # Multi-hop: walk the in-memory graph index, then load the interlinkages it reached
+                hops, truncated, origins = graph_index.reach(s, sorted(found), depth, max_nodes, max_edges)
+                ils = sorted(all_in(
+                    not_deleted(s.query(m.Interlinkage).options(*il_loads), m.Interlinkage),
+                    m.Interlinkage.id, [i for k, i in hops if k == "interlinkage"]
+                ), key=lambda i: i.id)
+                proj_set |= {i for k, i in hops if k == "project"}
+                ent_set |= {i for k, i in hops if k == "entity"}
+            else:
+                # Union of the interlinkages of every focus, in one query
+                conds = []
+                if prj_ids:
+                    conds.append(m.Interlinkage.project_id.in_(prj_ids))
+                if ent_ids:
+                    conds += [
+                        m.Interlinkage.sponsor_id.in_(ent_ids),
+                        m.Interlinkage.counterparty_id.in_(ent_ids),
+                        m.Interlinkage.booking_entity_id.in_(ent_ids),
+                    ]
+                if il_ids:
+                    conds.append(m.Interlinkage.id.in_(il_ids))
+                ils = not_deleted(
+                    s.query(m.Interlinkage).options(*il_loads).filter(or_(*conds)),
+                    m.Interlinkage
+                ).order_by(m.Interlinkage.id).all()
+                found |= {("interlinkage", i.id) for i in ils if i.id in il_ids}
+
+            missing = [f for f in foci if f not in found]
+            if missing and not batch:
+                yield "not_found", None
+                return
+            meta = {"token": token}
+            if since is not None:
+                meta["since"] = raw_since
+            if depth > 1:
+                meta["depth"] = depth
+                meta["truncated"] = truncated
+            if batch:
+                meta["foci"] = [{"kind": k, "id": i} for k, i in foci if (k, i) in found]
+                meta["missing"] = [{"kind": k, "id": i} for k, i in missing]
+            else:
+                meta["focus"] = {"kind": foci[0][0], "id": foci[0][1]}
+            yield "meta", meta
+
+            proj_set |= {i for k, i in found if k == "project"}
+            ent_set |= {i for k, i in found if k == "entity"}
+
+            il_foci = {}
             for i in ils:
-                il_set.add(i.id)
-                # related entity ids
-                if i.sponsor_id:       ent_set.add(i.sponsor_id)
-                if i.counterparty_id:  ent_set.add(i.counterparty_id)
-                if i.booking_entity_id:ent_set.add(i.booking_entity_id)
-                # facility, instrument, currency
-                if i.facility_id:  fac_set.add(i.facility_id)
-                if i.instrument_id:inst_set.add(i.instrument_id)
-                if i.currency_id:  ccy_set.add(i.currency_id)
-                # edges
-                if i.sponsor_id:       edges.append({"type":"entity-interlinkage","role":"sponsor","entity_id":i.sponsor_id,"interlinkage_id":i.id})
-                if i.counterparty_id:  edges.append({"type":"entity-interlinkage","role":"counterparty","entity_id":i.counterparty_id,"interlinkage_id":i.id})
-                if i.booking_entity_id:edges.append({"type":"entity-interlinkage","role":"booking","entity_id":i.booking_entity_id,"interlinkage_id":i.id})
-                edges.append({"type":"interlinkage-project","interlinkage_id":i.id,"project_id":prj.id})
-                # collect subrows
-                if include_interdeps:
-                    for d in i.interdependences: dep_set.add(d.id)
-                if include_attachments: att_rows.extend(i.attachments or [])
-                if include_notes:       note_rows.extend(i.notes or [])
-                if include_workflow:    wf_rows.extend(i.workflow_events or [])
-                if include_analysis and i.analysis: an_rows.append(i.analysis)
+                # foci this interlinkage was reached from (beyond the first hop: the nearest
+                # ones, as the traversal found them), tagged on each of its edges
+                if depth > 1:
+                    src = sorted(f"{k}:{f}" for k, f in origins.get(("interlinkage", i.id), ()))
+                else:
+                    src = [f"interlinkage:{i.id}"] if i.id in il_ids else []
+                    if i.project_id in prj_ids: src.append(f"project:{i.project_id}")
+                    src += [f"entity:{e}" for e in dict.fromkeys((i.sponsor_id, i.counterparty_id, i.booking_entity_id))
+                            if e in ent_ids]
+                il_foci[i.id] = src
 
-        elif kind == "entity":
-            ent = not_deleted(s.query(m.LegalEntity).filter(m.LegalEntity.id == focus_id), m.LegalEntity).first()
-            if not ent: return jsonify({"error":"not_found","entity":"legal_entity"}), 404
-            ent_set.add(ent.id)
-
-            ils = not_deleted(
-                s.query(m.Interlinkage).options(
-                    selectinload(m.Interlinkage.interdependences),
-                    selectinload(m.Interlinkage.exposures),
-                    selectinload(m.Interlinkage.attachments),
-                    selectinload(m.Interlinkage.notes),
-                    selectinload(m.Interlinkage.workflow_events),
-                    selectinload(m.Interlinkage.analysis),
-                ).filter(
-                    or_(
-                        m.Interlinkage.sponsor_id == ent.id,
-                        m.Interlinkage.counterparty_id == ent.id,
-                        m.Interlinkage.booking_entity_id == ent.id
-                    )
-                ),
-                m.Interlinkage
-            ).all()
-            for i in ils:
                 il_set.add(i.id)
                 if i.project_id: proj_set.add(i.project_id)
                 if i.sponsor_id: ent_set.add(i.sponsor_id)
@@ -399,12 +652,13 @@ def focus_bundle():
                 if i.booking_entity_id: ent_set.add(i.booking_entity_id)
                 if i.facility_id:  fac_set.add(i.facility_id)
                 if i.instrument_id:inst_set.add(i.instrument_id)
-                if i.currency_id:  ccy_set.add(i.currency_id)
                 # edges
-                if i.sponsor_id:       edges.append({"type":"entity-interlinkage","role":"sponsor","entity_id":i.sponsor_id,"interlinkage_id":i.id})
-                if i.counterparty_id:  edges.append({"type":"entity-interlinkage","role":"counterparty","entity_id":i.counterparty_id,"interlinkage_id":i.id})
-                if i.booking_entity_id:edges.append({"type":"entity-interlinkage","role":"booking","entity_id":i.booking_entity_id,"interlinkage_id":i.id})
-                if i.project_id:       edges.append({"type":"interlinkage-project","interlinkage_id":i.id,"project_id":i.project_id})
+                if i.sponsor_id:       edges.append({"type":"entity-interlinkage","role":"sponsor","entity_id":i.sponsor_id,"interlinkage_id":i.id,"foci":src})
+                if i.counterparty_id:  edges.append({"type":"entity-interlinkage","role":"counterparty","entity_id":i.counterparty_id,"interlinkage_id":i.id,"foci":src})
+                if i.booking_entity_id:edges.append({"type":"entity-interlinkage","role":"booking","entity_id":i.booking_entity_id,"interlinkage_id":i.id,"foci":src})
+                if i.project_id:       edges.append({"type":"interlinkage-project","interlinkage_id":i.id,"project_id":i.project_id,"foci":src})
+                if since is not None:
+                    continue  # delta: sub-rows are queried by changed_since below
                 # collect subrows
                 if include_interdeps:
                     for d in i.interdependences: dep_set.add(d.id)
@@ -412,222 +666,328 @@ def focus_bundle():
                 if include_notes:       note_rows.extend(i.notes or [])
                 if include_workflow:    wf_rows.extend(i.workflow_events or [])
                 if include_analysis and i.analysis: an_rows.append(i.analysis)
+            del ils
+
+            if depth == 1:
+                # foci and their interlinkages are hop 0, everything attached to those hop 1
+                hops = {("project", i): 1 for i in proj_set}
+                hops.update({("entity", i): 1 for i in ent_set})
+                hops.update({("interlinkage", i): 0 for i in il_set})
+                hops.update({f: 0 for f in found})
+
+            def with_hops(rows, node_kind):
+                # hop distance from the nearest focus on every graph node
+                for row in rows:
+                    row["hop"] = hops.get((node_kind, row["id"]))
+                return rows
+
+            # =============== SECONDARY TABLES, one section at a time ===============
+            # Each section is fetched, dumped and handed over before the next one is read;
+            # only the ids the reference section needs are kept from the ORM rows.
+            def fetch(Model, column, ids, opts, renewed=()):
+                """Live rows with `column` in ids; with ?since=, only the changed ones plus those
+                whose `column` is in `renewed` (rows the client may not have yet)."""
+                q = not_deleted(s.query(Model).options(*opts), Model)
+                if since is None:
+                    return all_in(q, column, ids)
+                rows = {r.id: r for r in all_in(q.filter(changed_since(Model, since)), column, ids)}
+                rows.update((r.id, r) for r in all_in(q, column, set(renewed) & set(ids)))
+                return sorted(rows.values(), key=lambda r: r.id)
+
+            country_ids, sector_ids, pra_ids, cpty_type_ids, inst_type_ids, fac_type_ids = (set() for _ in range(6))
 
-        else:  # kind == "interlinkage"
-            inter = not_deleted(
-                s.query(m.Interlinkage).options(
-                    selectinload(m.Interlinkage.interdependences),
-                    selectinload(m.Interlinkage.exposures),
-                    selectinload(m.Interlinkage.attachments),
-                    selectinload(m.Interlinkage.notes),
-                    selectinload(m.Interlinkage.workflow_events),
-                    selectinload(m.Interlinkage.analysis),
-                ).filter(m.Interlinkage.id == focus_id),
-                m.Interlinkage
-            ).first()
-            if not inter: return jsonify({"error":"not_found","entity":"interlinkage"}), 404
-            il_set.add(inter.id)
-            if inter.project_id: proj_set.add(inter.project_id)
-            if inter.sponsor_id: ent_set.add(inter.sponsor_id)
-            if inter.counterparty_id: ent_set.add(inter.counterparty_id)
-            if inter.booking_entity_id: ent_set.add(inter.booking_entity_id)
-            if inter.facility_id:  fac_set.add(inter.facility_id)
-            if inter.instrument_id:inst_set.add(inter.instrument_id)
-            if inter.currency_id:  ccy_set.add(inter.currency_id)
-            # edges
-            if inter.sponsor_id:       edges.append({"type":"entity-interlinkage","role":"sponsor","entity_id":inter.sponsor_id,"interlinkage_id":inter.id})
-            if inter.counterparty_id:  edges.append({"type":"entity-interlinkage","role":"counterparty","entity_id":inter.counterparty_id,"interlinkage_id":inter.id})
-            if inter.booking_entity_id:edges.append({"type":"entity-interlinkage","role":"booking","entity_id":inter.booking_entity_id,"interlinkage_id":inter.id})
-            if inter.project_id:       edges.append({"type":"interlinkage-project","interlinkage_id":inter.id,"project_id":inter.project_id})
-            # collect subrows
-            if include_interdeps:
-                for d in inter.interdependences:
-                    dep_set.add(d.id)
-            if include_attachments: att_rows.extend(inter.attachments or [])
-            if include_notes:       note_rows.extend(inter.notes or [])
-            if include_workflow:    wf_rows.extend(inter.workflow_events or [])
-            if include_analysis and inter.analysis: an_rows.append(inter.analysis)
-
-        # =============== BULK FETCH SECONDARY TABLES ===============
-        projects = []
-        if proj_set:
-            projects = not_deleted(
-                s.query(m.Project).filter(m.Project.id.in_(proj_set)),
-                m.Project
-            ).all()
-
-        interlinkages = []
-        if il_set:
             # Re-fetch minimal interlinkage rows to ensure consistent dump (avoid double-loading heavy rels here)
-            interlinkages = not_deleted(
-                s.query(m.Interlinkage).filter(m.Interlinkage.id.in_(il_set)),
-                m.Interlinkage
-            ).all()
-
-        entities = []
-        if ent_set:
-            entities = not_deleted(
-                s.query(m.LegalEntity).filter(m.LegalEntity.id.in_(ent_set)),
-                m.LegalEntity
-            ).all()
-
-        facilities = []
-        if fac_set:
-            facilities = not_deleted(
-                s.query(m.Facility).filter(m.Facility.id.in_(fac_set)),
-                m.Facility
-            ).all()
-
-        instruments = []
-        if inst_set:
-            instruments = not_deleted(
-                s.query(m.Instrument).filter(m.Instrument.id.in_(inst_set)),
-                m.Instrument
-            ).all()
-
-        currencies = []
-        if ccy_set:
-            currencies = not_deleted(
-                s.query(m.Currency).filter(m.Currency.id.in_(ccy_set)),
-                m.Currency
-            ).all()
-
-        # Interdeps
-        interdeps = []
-        if dep_set:
-            interdeps = not_deleted(
-                s.query(m.Interdependence).filter(m.Interdependence.id.in_(dep_set)),
-                m.Interdependence
-            ).all()
-
-        # Exposures (mode-dependent)
-        exposures = []
-        if exposures_mode != "none" and il_set:
-            if exposures_mode == "latest":
-                # one latest row per interlinkage
-                sub = (
-                    s.query(
-                        m.ExposureSnapshot.interlinkage_id,
-                        func.max(m.ExposureSnapshot.as_of_date).label("max_d")
-                    )
-                    .filter(m.ExposureSnapshot.interlinkage_id.in_(il_set))
-                    .group_by(m.ExposureSnapshot.interlinkage_id)
-                    .subquery()
-                )
-                exposures = not_deleted(
-                    s.query(m.ExposureSnapshot)
-                    .join(sub, and_(
-                        m.ExposureSnapshot.interlinkage_id == sub.c.interlinkage_id,
-                        m.ExposureSnapshot.as_of_date == sub.c.max_d
-                    )),
-                    m.ExposureSnapshot
-                ).all()
-            elif exposures_mode == "last_n":
-                # last N per interlinkage (portable windowing)
-                # get top N dates per il, then fetch rows by (il_id, date) pairs
-                date_rows = (
-                    s.query(
-                        m.ExposureSnapshot.interlinkage_id,
-                        m.ExposureSnapshot.as_of_date
-                    )
-                    .filter(m.ExposureSnapshot.interlinkage_id.in_(il_set))
-                    .order_by(m.ExposureSnapshot.interlinkage_id, m.ExposureSnapshot.as_of_date.desc())
-                    .all()
-                )
-                wanted_pairs = set()
-                count_per_il = {}
-                for il_id, d in date_rows:
-                    c = count_per_il.get(il_id, 0)
-                    if c < exposures_n:
-                        wanted_pairs.add((il_id, d))
-                        count_per_il[il_id] = c + 1
-                if wanted_pairs:
-                    conds = [and_(
-                        m.ExposureSnapshot.interlinkage_id == il,
-                        m.ExposureSnapshot.as_of_date == dt
-                    ) for (il, dt) in wanted_pairs]
-                    exposures = not_deleted(
-                        s.query(m.ExposureSnapshot).filter(or_(*conds)),
-                        m.ExposureSnapshot
-                    ).all()
-
-        # Deduplicate row lists we collected from eager loads
-        if include_attachments:
-            att_rows = list({a.id: a for a in att_rows}.values())
-        if include_notes:
-            note_rows = list({n.id: n for n in note_rows}.values())
-        if include_workflow:
-            wf_rows = list({w.id: w for w in wf_rows}.values())
-        if include_analysis:
-            an_rows = list({a.id: a for a in an_rows}.values())
-
-        # Reference rows actually used
-        country_ids = {p.country_id for p in projects if p.country_id} | {e.country_id for e in entities if e.country_id}
-        sector_ids  = {p.sector_id for p in projects if p.sector_id}  | {e.sector_id for e in entities if e.sector_id}
-        pra_ids     = {i.pra_activity_id for i in interlinkages if i.pra_activity_id}
-        cpty_type_ids = {i.counterparty_type_id for i in interlinkages if i.counterparty_type_id}
-        inst_type_ids = {x.instrument_type_id for x in instruments if getattr(x, "instrument_type_id", None)}
-        fac_type_ids  = {x.facility_type_id for x in facilities if getattr(x, "facility_type_id", None)}
-
-        countries = s.query(m.Country).filter(m.Country.id.in_(country_ids)).all() if country_ids else []
-        sectors   = s.query(m.Sector).filter(m.Sector.id.in_(sector_ids)).all() if sector_ids else []
-        pra_acts  = s.query(m.PraActivity).filter(m.PraActivity.id.in_(pra_ids)).all() if pra_ids else []
-        cpty_types= s.query(m.CounterpartyType).filter(m.CounterpartyType.id.in_(cpty_type_ids)).all() if cpty_type_ids else []
-        inst_types= s.query(m.InstrumentType).filter(m.InstrumentType.id.in_(inst_type_ids)).all() if inst_type_ids else []
-        fac_types = s.query(m.FacilityType).filter(m.FacilityType.id.in_(fac_type_ids)).all() if fac_type_ids else []
-
-        # Entity identifiers for the returned entities
-        identifiers = []
-        if ent_set:
-            identifiers = s.query(m.EntityIdentifier).filter(m.EntityIdentifier.entity_id.in_(ent_set)).all()
-
-        # --------- Serialize using your existing Marshmallow schemas
-        payload = {
-            "focus": {"kind": kind, "id": focus_id},
-
-            "projects":              ProjectSchema(many=True).dump(projects),
-            "legal_entities":        LegalEntitySchema(many=True).dump(entities),
-            "entity_identifiers":    EntityIdentifierSchema(many=True).dump(identifiers),
-            "interlinkages":         InterlinkageSchema(many=True).dump(interlinkages),
-            "interdependences":      InterdependenceSchema(many=True).dump(interdeps),
-
-            "facilities":            FacilitySchema(many=True).dump(facilities),
-            "instruments":           InstrumentSchema(many=True).dump(instruments),
-            "currencies":            CurrencySchema(many=True).dump(currencies),
-
-            "exposures":             (ExposureSnapshotSchema(many=True).dump(exposures) if exposures_mode != "none" else []),
-            "attachments":           (InterlinkageAttachmentSchema(many=True).dump(att_rows) if include_attachments else []),
-            "notes":                 (InterlinkageNoteSchema(many=True).dump(note_rows) if include_notes else []),
-            "workflow_events":       (WorkflowEventSchema(many=True).dump(wf_rows) if include_workflow else []),
-            "analyses":              (InterlinkageAnalysisSchema(many=True).dump(an_rows) if include_analysis else []),
-
-            "ref": {
-                "countries":         CountrySchema(many=True).dump(countries),
-                "sectors":           SectorSchema(many=True).dump(sectors),
-                "pra_activities":    PraActivitySchema(many=True).dump(pra_acts),
-                "counterparty_types":CounterpartyTypeSchema(many=True).dump(cpty_types),
-                "instrument_types":  InstrumentTypeSchema(many=True).dump(inst_types),
-                "facility_types":    FacilityTypeSchema(many=True).dump(fac_types),
-            },
+            interlinkages = fetch(m.Interlinkage, m.Interlinkage.id, il_set, columns_only())
+            pra_ids |= {i.pra_activity_id for i in interlinkages if i.pra_activity_id}
+            cpty_type_ids |= {i.counterparty_type_id for i in interlinkages if i.counterparty_type_id}
+            ccy_set = {i.currency_id for i in interlinkages if i.currency_id}
+            # with ?since=: the interlinkages changed since the token. Whatever they point at,
+            # and all of their own rows, may be new to the client and is sent in full.
+            sent_ils = {i.id for i in interlinkages}
+            renewed = {
+                "project": {i.project_id for i in interlinkages},
+                "entity": {e for i in interlinkages for e in (i.sponsor_id, i.counterparty_id, i.booking_entity_id)},
+                "facility": {i.facility_id for i in interlinkages},
+                "instrument": {i.instrument_id for i in interlinkages},
+            }
+            yield "interlinkages", with_hops(dump_many(InterlinkageSchema, interlinkages), "interlinkage")
+            del interlinkages
+            if since is not None:
+                edges = [e for e in edges if e["interlinkage_id"] in sent_ils]
+
+            projects = fetch(m.Project, m.Project.id, proj_set, loader_options("focus_bundle", m.Project), renewed["project"])
+            country_ids |= {p.country_id for p in projects if p.country_id}
+            sector_ids |= {p.sector_id for p in projects if p.sector_id}
+            yield "projects", with_hops(dump_many(ProjectSchema, projects), "project")
+            del projects
+
+            entities = fetch(m.LegalEntity, m.LegalEntity.id, ent_set, loader_options("focus_bundle", m.LegalEntity), renewed["entity"])
+            country_ids |= {e.country_id for e in entities if e.country_id}
+            sector_ids |= {e.sector_id for e in entities if e.sector_id}
+            sent_ents = {e.id for e in entities}
+            yield "legal_entities", with_hops(dump_many(LegalEntitySchema, entities), "entity")
+            del entities
+
+            facilities = fetch(m.Facility, m.Facility.id, fac_set, loader_options("focus_bundle", m.Facility), renewed["facility"])
+            fac_type_ids |= {x.facility_type_id for x in facilities if getattr(x, "facility_type_id", None)}
+            yield "facilities", dump_many(FacilitySchema, facilities)
+            del facilities
+
+            instruments = fetch(m.Instrument, m.Instrument.id, inst_set, loader_options("focus_bundle", m.Instrument), renewed["instrument"])
+            inst_type_ids |= {x.instrument_type_id for x in instruments if getattr(x, "instrument_type_id", None)}
+            yield "instruments", dump_many(InstrumentSchema, instruments)
+            del instruments
+
+            yield "currencies", ref_cache.pick(s, m.Currency, ccy_set)
+
+            # Interdeps
+            interdeps = []
+            dep_opts = loader_options("focus_bundle", m.Interdependence)
+            if since is None:
+                interdeps = fetch(m.Interdependence, m.Interdependence.id, dep_set, dep_opts)
+            elif include_interdeps:
+                interdeps = fetch(m.Interdependence, m.Interdependence.interlinkage_id, il_set, dep_opts, sent_ils)
+            if depth > 1:
+                # the interdependence -> project links the traversal followed
+                edges += [
+                    {"type": "interdep-project", "interdep_id": d.id, "interlinkage_id": d.interlinkage_id, "project_id": d.project_id,
+                     "foci": il_foci.get(d.interlinkage_id, [])}
+                    for d in interdeps if d.project_id in proj_set
+                ]
+            yield "interdependences", dump_many(InterdependenceSchema, interdeps)
+            del interdeps
+
+            # Exposures (mode-dependent): latest / last N per interlinkage
+            exposures = []
+            if exposures_mode != "none" and il_set:
+                n = 1 if exposures_mode == "latest" else max(exposures_n or 0, 0)
+                window = il_set
+                if since is not None:
+                    # the whole window of every interlinkage with a new, changed or deleted snapshot
+                    ES = m.ExposureSnapshot
+                    moved = all_in(s.query(ES.interlinkage_id).filter(changed_since(ES, since)).distinct(),
+                                   ES.interlinkage_id, il_set)
+                    window = {r[0] for r in moved} | sent_ils
+                    window |= {scope["interlinkage_id"] for _, scope in left_since(s, ES, since)} & il_set
+                if exposures_mode in ("latest", "last_n"):
+                    exposures = latest_exposures(s, window, n)
+            yield "exposures", exposures
+            del exposures
+
+            if since is not None:
+                # rows of the interlinkages in scope, queried directly rather than eager-loaded
+                for Model, wanted, rows in (
+                    (m.InterlinkageAttachment, include_attachments, att_rows), (m.InterlinkageNote, include_notes, note_rows),
+                    (m.WorkflowEvent, include_workflow, wf_rows), (m.InterlinkageAnalysis, include_analysis, an_rows),
+                ):
+                    if wanted:
+                        rows.extend(fetch(Model, Model.interlinkage_id, il_set, columns_only(), sent_ils))
+
+            # Deduplicate row lists we collected from eager loads
+            yield "attachments", (dump_many(InterlinkageAttachmentSchema, {a.id: a for a in att_rows}.values())
+                                  if include_attachments else [])
+            yield "notes", (dump_many(InterlinkageNoteSchema, {n.id: n for n in note_rows}.values())
+                            if include_notes else [])
+            yield "workflow_events", (dump_many(WorkflowEventSchema, {w.id: w for w in wf_rows}.values())
+                                      if include_workflow else [])
+            yield "analyses", (dump_many(InterlinkageAnalysisSchema, {a.id: a for a in an_rows}.values())
+                               if include_analysis else [])
+
+            # Reference rows actually used (already dumped, from the in-process reference cache)
+            yield "ref", {
+                "countries":         ref_cache.pick(s, m.Country, country_ids),
+                "sectors":           ref_cache.pick(s, m.Sector, sector_ids),
+                "pra_activities":    ref_cache.pick(s, m.PraActivity, pra_ids),
+                "counterparty_types":ref_cache.pick(s, m.CounterpartyType, cpty_type_ids),
+                "instrument_types":  ref_cache.pick(s, m.InstrumentType, inst_type_ids),
+                "facility_types":    ref_cache.pick(s, m.FacilityType, fac_type_ids),
+            }
 
-            "edges": edges,
-        }
+            # Entity identifiers for the returned entities (with ?since=: the changed ones, plus all
+            # of every entity sent)
+            identifiers = fetch(m.EntityIdentifier, m.EntityIdentifier.entity_id, ent_set, (), sent_ents)
+            yield "entity_identifiers", dump_many(EntityIdentifierSchema, identifiers)
+
+            if since is not None:
+                # tombstones: rows updated or deleted since the token whose `column` was in
+                # ids before, and that are no longer live with `column` in ids (soft- or
+                # hard-deleted, or re-pointed out of scope)
+                left = {}
+
+                def gone(Model, column, ids, live=None):
+                    if Model not in left:
+                        left[Model] = left_since(s, Model, since)
+                    was_in = {i for i, scope in left[Model] if (i if column.key == "id" else scope.get(column.key)) in ids}
+                    if live is None:
+                        q = not_deleted(s.query(Model.id, column), Model)
+                        live = {i for i, v in all_in(q, Model.id, was_in) if v in ids}
+                    return was_in - live
+
+                IL = m.Interlinkage
+                near_prj, near_ent = (proj_set, ent_set) if depth > 1 else (prj_ids, ent_ids)
+                # an interlinkage still reached through another focus or column stays
+                gone_ils = gone(IL, IL.id, il_ids | il_set, il_set)
+                for column in (IL.sponsor_id, IL.counterparty_id, IL.booking_entity_id):
+                    gone_ils |= gone(IL, column, near_ent, il_set)
+                gone_ils |= gone(IL, IL.project_id, near_prj, il_set)
+                deleted = {
+                    "interlinkages":    gone_ils,
+                    "projects":         gone(m.Project, m.Project.id, proj_set),
+                    "legal_entities":   gone(m.LegalEntity, m.LegalEntity.id, ent_set),
+                    "facilities":       gone(m.Facility, m.Facility.id, fac_set),
+                    "instruments":      gone(m.Instrument, m.Instrument.id, inst_set),
+                    "interdependences": gone(m.Interdependence, m.Interdependence.interlinkage_id, il_set) if include_interdeps else (),
+                    "exposures":        gone(m.ExposureSnapshot, m.ExposureSnapshot.interlinkage_id, il_set) if exposures_mode != "none" else (),
+                    "attachments":      gone(m.InterlinkageAttachment, m.InterlinkageAttachment.interlinkage_id, il_set) if include_attachments else (),
+                    "notes":            gone(m.InterlinkageNote, m.InterlinkageNote.interlinkage_id, il_set) if include_notes else (),
+                    "workflow_events":  gone(m.WorkflowEvent, m.WorkflowEvent.interlinkage_id, il_set) if include_workflow else (),
+                    "analyses":         gone(m.InterlinkageAnalysis, m.InterlinkageAnalysis.interlinkage_id, il_set) if include_analysis else (),
+                    "entity_identifiers": gone(m.EntityIdentifier, m.EntityIdentifier.entity_id, ent_set),
+                }
+                yield "deleted", {section: sorted(ids) for section, ids in deleted.items()}
+
+            yield "edges", edges
+
+    parts = sections()
+    first, meta = next(parts)  # runs the foci lookups, so a 404 is still a plain response
+    if first == "not_found":
+        parts.close()
+        return jsonify({"error": "not_found", "entity": NOT_FOUND_ENTITY[foci[0][0]]}), 404
+
+    if fmt == "json":
+        payload = {}
+        for section, rows in parts:
+            payload[section] = dump_many(ExposureSnapshotSchema, rows) if section == "exposures" else rows
+        payload.update(meta)
         return jsonify(payload), 200
 
+    exposure_names = list(ExposureSnapshotSchema().dump_fields)
+
+    def encoded():
+        yield frames.encode(fmt, {"section": "meta", "items": meta})
+        for section, rows in parts:
+            if section == "exposures" and fmt == "msgpack":
+                frame = {"section": section, **frames.columnar(m.ExposureSnapshot, exposure_names, rows)}
+            elif section == "exposures":
+                frame = {"section": section, "items": dump_many(ExposureSnapshotSchema, rows)}
+            else:
+                frame = {"section": section, "items": rows}
+            yield frames.encode(fmt, frame)
+
+    return Response(stream_with_context(encoded()), mimetype=frames.MIMETYPES[fmt])
+
+
+@api_bp.get("/graph/neighbours")
+def graph_neighbours():
+    """
+    Direct neighbours of one node, from the in-memory graph index (server/graph.py).
+
+    GET ?kind=entity|project|interlinkage&id=<int>[&roles=sponsor,counterparty,...]
+    {"kind", "id",
+     "neighbours": [{"kind", "id", "role": sponsor|counterparty|booking|project|interdependence,
+                     "interdependence_id": int|null}]}
+    """
+    kind = request.args.get("kind")
+    node_id = request.args.get("id", type=int)
+    roles = [r for r in (request.args.get("roles") or "").split(",") if r] or None
+    if kind not in FOCUS_KINDS or node_id is None or (roles and not set(roles) <= set(GRAPH_ROLES)):
+        return jsonify({"error": "invalid_args",
+                        "hint": f"kind ∈ {{{', '.join(FOCUS_KINDS)}}}, integer id, roles ⊆ {{{', '.join(GRAPH_ROLES)}}}"}), 400
+    with session_scope() as s:
+        found = graph_index.neighbours(s, kind, node_id, roles)
+    if found is None:
+        return jsonify({"error": "not_found", "entity": NOT_FOUND_ENTITY[kind]}), 404
+    return jsonify({
+        "kind": kind, "id": node_id,
+        "neighbours": [{"kind": k, "id": i, "role": role, "interdependence_id": ref} for k, i, role, ref in found],
+    }), 200
+
+
+ANALYSIS_PAGE_SIZE = 50
+MAX_ANALYSIS_PAGE_SIZE = 500
+
+
+def _interlinkage_summaries(s, il_ids, measure, exposures_mode):
+    """{id: enriched interlinkage summary} for the live interlinkages among `il_ids`."""
+    il_rows = {}
+    if il_ids:
+        q_ils = s.query(m.Interlinkage).options(*loader_options("analysis.concentration", m.Interlinkage)) \
+            .filter(m.Interlinkage.is_deleted == False)  # noqa: E712
+        for il in all_in(q_ils, m.Interlinkage.id, il_ids):
+            il_rows[il.id] = il
+
+    # latest exposure measure per IL (for measure != none)
+    meas_map = {}
+    if measure != "none" and il_rows and exposures_mode == "latest":
+        for r in latest_exposures(s, il_rows):
+            v = getattr(r, measure, None)
+            if v is not None:
+                meas_map[r.interlinkage_id] = v
+
+    # names & currency codes
+    ent_ids = {e for il in il_rows.values() for e in (il.sponsor_id, il.counterparty_id) if e}
+    name_by_entity_id = {}
+    if ent_ids:
+        q_ents = s.query(m.LegalEntity).options(*loader_options("analysis.concentration", m.LegalEntity)) \
+            .filter(m.LegalEntity.is_deleted == False)  # noqa: E712
+        for ent in all_in(q_ents, m.LegalEntity.id, ent_ids):
+            name_by_entity_id[ent.id] = ent.name or ""
+    code_by_ccy_id = {cid: (cur["code"] or "") for cid, cur in ref_cache.rows(s, m.Currency).items()}
+
+    return {il.id: {
+        "id": il.id,
+        "project_id": il.project_id,
+        "sponsor_id": il.sponsor_id,
+        "sponsor_name": name_by_entity_id.get(il.sponsor_id) or None,             # ENRICHED
+        "counterparty_id": il.counterparty_id,
+        "counterparty_name": name_by_entity_id.get(il.counterparty_id) or None,    # ENRICHED
+        "notional_amount": (str(il.notional_amount) if il.notional_amount is not None else None),
+        "currency_id": il.currency_id,
+        "currency_code": code_by_ccy_id.get(il.currency_id) or None,               # ENRICHED
+        "measure": (str(meas_map.get(il.id)) if meas_map.get(il.id) is not None else None)
+    } for il in il_rows.values()}
+
+
+def _body_paging(body):
+    try:
+        page = max(int(body.get("page") or 1), 1)
+        page_size = int(body.get("page_size") or ANALYSIS_PAGE_SIZE)
+    except (TypeError, ValueError):
+        page, page_size = 1, ANALYSIS_PAGE_SIZE
+    return page, min(max(page_size, 1), MAX_ANALYSIS_PAGE_SIZE)
+
+
+def _cluster_node(key, il_count):
+    # overlay cluster bubble; size hint scales with IL count
+    return {
+        "kind": "cluster",
+        "id": f"cluster:{key}",
+        "label": key or "—",
+        "size_hint": min(40 + il_count * 6, 120),
+        "il_count": il_count
+    }
+
+
 @api_bp.post("/analysis/concentration/shared-dependencies")
 def analysis_concentration_shared_dependencies():
     """
     POST JSON:
       {
-        "pov_kind": "project" | "entity" | "interlinkage",
-        "pov_id":   <int>,
+        "pov_kind": "project" | "entity" | "interlinkage" | "portfolio",
+        "pov_id":   <int>,                                              # not used for "portfolio"
         "group_by": "identifier" | "type" | "id_type" | "type_level",   # default: "identifier"
         "min_cluster": <int>=2,
         "levels": ["low","medium","high","critical"],                   # optional filter
         "measure": "none" | "ead" | "rwa" | "mtm" | "pnl",              # default: "none"
-        "exposures_mode": "latest" | "none"                             # default: "latest"
+        "exposures_mode": "latest" | "none",                            # default: "latest"
+        "page": 1, "page_size": 50                                      # "portfolio" only
       }
 
+    pov_kind "portfolio" clusters the interdependences of the whole book: grouping and
+    the min_cluster cut run in SQL, clusters come one page at a time (largest first,
+    with "total", "page", "page_size") and without their "interlinkages" lists or
+    overlay links; fetch those per cluster from .../shared-dependencies/cluster.
+
     Response:
       {
         "scope": { "pov_kind": "...", "pov_id": ..., "interlinkage_ids": [...] },
@@ -679,10 +1039,11 @@ def analysis_concentration_shared_dependencies():
     measure       = (body.get("measure") or "none").strip().lower()
     exposures_mode= (body.get("exposures_mode") or "latest").strip().lower()
 
-    if pov_kind not in ("project", "entity", "interlinkage") or not isinstance(pov_id, int):
+    if pov_kind not in ("project", "entity", "interlinkage", "portfolio") or \
+            (pov_kind != "portfolio" and not isinstance(pov_id, int)):
         return jsonify({"error": "invalid_args",
-                        "hint": "pov_kind ∈ {project, entity, interlinkage} and pov_id must be int"}), 400
-    if group_by not in ("identifier", "type", "id_type", "type_level"):
+                        "hint": "pov_kind ∈ {project, entity, interlinkage, portfolio} and pov_id must be int"}), 400
+    if group_by not in CLUSTER_KEYS:
         return jsonify({"error": "invalid_group_by"}), 400
     if measure not in ("none", "ead", "rwa", "mtm", "pnl"):
         return jsonify({"error": "invalid_measure"}), 400
@@ -691,6 +1052,23 @@ def analysis_concentration_shared_dependencies():
     if min_cluster < 2:
         min_cluster = 2
 
+    if pov_kind == "portfolio":
+        page, page_size = _body_paging(body)
+        with session_scope() as s:
+            clusters, total = dependency_clusters(
+                s, group_by, levels_flt, min_cluster, limit=page_size, offset=(page - 1) * page_size,
+            )
+        return jsonify({
+            "scope": {"pov_kind": pov_kind, "pov_id": None},
+            "params": {"group_by": group_by, "min_cluster": min_cluster, "levels": levels_flt,
+                       "measure": measure, "exposures_mode": exposures_mode},
+            "clusters": [dict(c, label=c["key"] or "—", by=group_by) for c in clusters],
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "overlay": {"nodes": [_cluster_node(c["key"], c["il_count"]) for c in clusters], "links": []},
+        }), 200
+
     def not_deleted(q, Model):
         return q.filter(getattr(Model, "is_deleted", False) == False) if hasattr(Model, "is_deleted") else q  # noqa: E712
 
@@ -729,12 +1107,12 @@ def analysis_concentration_shared_dependencies():
         # ------------------ Load Interdependences in scope (+ optional level filter) ------------------
         qd = not_deleted(
             s.query(m.Interdependence)
-             .filter(m.Interdependence.interlinkage_id.in_(il_ids)),
+             .options(*loader_options("analysis.concentration", m.Interdependence)),
             m.Interdependence
         )
         if levels_flt:
             qd = qd.filter(m.Interdependence.level.in_(levels_flt))
-        deps = qd.all()
+        deps = all_in(qd, m.Interdependence.interlinkage_id, il_ids)
 
         # ------------------ Grouping key ------------------
         def key_for(dep: m.Interdependence) -> str:
@@ -768,90 +1146,21 @@ def analysis_concentration_shared_dependencies():
         # sort: larger clusters first
         clusters_raw.sort(key=lambda b: (len(b["il_ids"]), len(b["deps"])), reverse=True)
 
-        # ------------------ Pull needed ILs ------------------
+        # ------------------ Pull needed ILs, enriched ------------------
         needed_il_ids = set().union(*(c["il_ids"] for c in clusters_raw)) if clusters_raw else set()
-        il_rows = {}
-        if needed_il_ids:
-            q_ils = not_deleted(s.query(m.Interlinkage).filter(m.Interlinkage.id.in_(needed_il_ids)), m.Interlinkage)
-            for il in q_ils.all():
-                il_rows[il.id] = il
-
-        # ------------------ Optional: latest exposures per IL (for measure != none) ------------------
-        meas_map = {}
-        if measure != "none" and needed_il_ids and exposures_mode == "latest":
-            latest_sub = (
-                s.query(
-                    m.ExposureSnapshot.interlinkage_id,
-                    func.max(m.ExposureSnapshot.as_of_date).label("max_d")
-                )
-                .filter(m.ExposureSnapshot.interlinkage_id.in_(needed_il_ids))
-                .group_by(m.ExposureSnapshot.interlinkage_id)
-                .subquery()
-            )
-            snaps = (
-                s.query(m.ExposureSnapshot)
-                .join(latest_sub,
-                      and_(m.ExposureSnapshot.interlinkage_id == latest_sub.c.interlinkage_id,
-                           m.ExposureSnapshot.as_of_date     == latest_sub.c.max_d))
-                .all()
-            )
-            for r in snaps:
-                v = getattr(r, measure, None)
-                if v is not None:
-                    meas_map[r.interlinkage_id] = v
-
-        # ------------------ ENRICH: names & currency codes ------------------
-        sponsor_ids   = set()
-        counterpty_ids= set()
-        currency_ids  = set()
-        for il in il_rows.values():
-            if il.sponsor_id:      sponsor_ids.add(il.sponsor_id)
-            if il.counterparty_id: counterpty_ids.add(il.counterparty_id)
-            if il.currency_id:     currency_ids.add(il.currency_id)
-
-        name_by_entity_id = {}
-        ent_ids = sponsor_ids | counterpty_ids
-        if ent_ids:
-            for ent in not_deleted(s.query(m.LegalEntity).filter(m.LegalEntity.id.in_(ent_ids)), m.LegalEntity).all():
-                name_by_entity_id[ent.id] = ent.name or ""
-
-        code_by_ccy_id = {}
-        if currency_ids:
-            for cur in s.query(m.Currency).filter(m.Currency.id.in_(currency_ids)).all():
-                code_by_ccy_id[cur.id] = cur.code or ""
+        summaries = _interlinkage_summaries(s, needed_il_ids, measure, exposures_mode)
 
         # ------------------ Build response ------------------
-        def label_for(key: str, by: str) -> str:
-            # Keep terse; FE can prettify if needed
-            return key or "—"
-
         resp_clusters = []
         overlay_nodes = []
         overlay_links = []
 
         for b in clusters_raw:
-            il_summaries = []
-            for il_id in sorted(b["il_ids"]):
-                il = il_rows.get(il_id)
-                if not il:
-                    continue
-                sv = {
-                    "id": il.id,
-                    "project_id": il.project_id,
-                    "sponsor_id": il.sponsor_id,
-                    "sponsor_name": name_by_entity_id.get(il.sponsor_id) or None,             # ENRICHED
-                    "counterparty_id": il.counterparty_id,
-                    "counterparty_name": name_by_entity_id.get(il.counterparty_id) or None,    # ENRICHED
-                    "notional_amount": (str(il.notional_amount) if il.notional_amount is not None else None),
-                    "currency_id": il.currency_id,
-                    "currency_code": code_by_ccy_id.get(il.currency_id) or None,               # ENRICHED
-                    "measure": (str(meas_map.get(il.id)) if meas_map.get(il.id) is not None else None)
-                }
-                il_summaries.append(sv)
+            il_summaries = [summaries[il_id] for il_id in sorted(b["il_ids"]) if il_id in summaries]
 
             resp_clusters.append({
                 "key": b["key"],
-                "label": label_for(b["key"], b["by"]),
+                "label": b["key"] or "—",
                 "by": b["by"],
                 "il_count": len(b["il_ids"]),
                 "dep_count": len(b["deps"]),
@@ -860,14 +1169,7 @@ def analysis_concentration_shared_dependencies():
                 "interlinkages": il_summaries
             })
 
-            # overlay cluster bubble; size hint scales with IL count
-            overlay_nodes.append({
-                "kind": "cluster",
-                "id": f"cluster:{b['key']}",
-                "label": label_for(b["key"], b["by"]),
-                "size_hint": min(40 + len(b["il_ids"]) * 6, 120),
-                "il_count": len(b["il_ids"])
-            })
+            overlay_nodes.append(_cluster_node(b["key"], len(b["il_ids"])))
             for il_id in b["il_ids"]:
                 overlay_links.append({
                     "from": f"il:{il_id}",
@@ -896,15 +1198,139 @@ def analysis_concentration_shared_dependencies():
         }), 200
 
 
+@api_bp.post("/analysis/concentration/shared-dependencies/cluster")
+def analysis_concentration_cluster():
+    """
+    The interlinkages of one portfolio cluster, a page at a time.
+
+    POST JSON:
+      {
+        "group_by": "identifier" | "type" | "id_type" | "type_level",   # as for the clusters
+        "key": "<cluster key>",                                         # REQUIRED
+        "levels": [...],                                                # same filter as for the clusters
+        "measure": "none" | "ead" | "rwa" | "mtm" | "pnl",
+        "exposures_mode": "latest" | "none",
+        "page": 1, "page_size": 50
+      }
+
+    Response:
+      {
+        "key": "...", "by": "...",
+        "items": [ { interlinkage summary, as in the clusters above }, ... ],   # ascending id
+        "total": <distinct interlinkages in the cluster>, "page": 1, "page_size": 50,
+        "links": [ { "from": "il:<id>", "to": "cluster:<key>", "label": "shared-dependency" }, ... ]
+      }
+    """
+    body = request.get_json(force=True, silent=False) or {}
+    group_by       = (body.get("group_by") or "identifier").strip().lower()
+    key            = body.get("key")
+    levels_flt     = body.get("levels") or []
+    measure        = (body.get("measure") or "none").strip().lower()
+    exposures_mode = (body.get("exposures_mode") or "latest").strip().lower()
+
+    if not isinstance(key, str):
+        return jsonify({"error": "invalid_args", "hint": "key (string) is required"}), 400
+    if group_by not in CLUSTER_KEYS:
+        return jsonify({"error": "invalid_group_by"}), 400
+    if measure not in ("none", "ead", "rwa", "mtm", "pnl"):
+        return jsonify({"error": "invalid_measure"}), 400
+    if exposures_mode not in ("latest", "none"):
+        return jsonify({"error": "invalid_exposures_mode"}), 400
+    page, page_size = _body_paging(body)
+
+    with session_scope() as s:
+        ids, total = cluster_interlinkage_ids(
+            s, group_by, key, levels_flt, limit=page_size, offset=(page - 1) * page_size,
+        )
+        summaries = _interlinkage_summaries(s, ids, measure, exposures_mode)
+        return jsonify({
+            "key": key,
+            "by": group_by,
+            "items": [summaries[i] for i in ids if i in summaries],
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "links": [{"from": f"il:{i}", "to": f"cluster:{key}", "label": "shared-dependency"} for i in ids],
+        }), 200
+
+
+def _expiry_for_scope(pov_kind, pov_value, today, bucket_defs, params, page, page_size):
+    """
+    Book-wide expiry monitoring: buckets are a SQL CASE over maturity_date, totals
+    exact per-currency sums, and items one page at a time (soonest maturity first).
+    """
+    bucket = maturity_bucket(bucket_defs, today)
+    with session_scope() as s:
+        totals = expiry_totals(s, pov_kind, pov_value, bucket)
+        rows, total = expiry_page(s, pov_kind, pov_value, bucket, page_size, (page - 1) * page_size)
+        summaries = _interlinkage_summaries(s, [r.id for r in rows], params["measure"], params["exposures_mode"])
+        code_by_ccy = {cid: (c["code"] or "") for cid, c in ref_cache.rows(s, m.Currency).items()}
+
+    unit = Decimal(10) ** -m.Interlinkage.notional_amount.type.scale
+    counts, amounts = {}, {}
+    for r in totals:
+        counts[r.bucket] = counts.get(r.bucket, 0) + r.count
+        ccy = code_by_ccy.get(r.currency_id) or "—"
+        per_ccy = amounts.setdefault(r.bucket, {})
+        per_ccy[ccy] = per_ccy.get(ccy, 0) + (r.cents or 0)
+
+    labels = [(label, lo, hi) for label, lo, hi in bucket_defs]
+    if "Outside window" in counts:
+        labels.append(("Outside window", None, None))
+    buckets_resp = [{
+        "label": label,
+        "from_days": None if label == "Overdue" else lo,
+        "to_days": -1 if label == "Overdue" else hi,
+        "count": counts.get(label, 0),
+        "total_notional": [
+            {"currency_code": ccy, "amount": str(Decimal(cents) * unit)}
+            for ccy, cents in sorted(amounts.get(label, {}).items())
+        ],
+    } for label, lo, hi in labels]
+
+    items = []
+    for r in rows:
+        if r.id not in summaries:
+            continue
+        item = dict(summaries[r.id])
+        item.update({
+            "maturity_date": r.maturity_date.isoformat(),
+            "days_to_maturity": (r.maturity_date - today).days,
+            "bucket": r.bucket,
+        })
+        items.append(item)
+
+    return jsonify({
+        "scope": {"pov_kind": pov_kind, "pov_id": pov_value, "interlinkage_count": total},
+        "params": params,
+        "items": items,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "buckets": buckets_resp,
+        "overlay": {
+            "nodes": [{
+                "kind": "bucket", "id": f"bucket:{b['label']}", "label": b["label"],
+                "size_hint": min(40 + b["count"] * 6, 120), "count": b["count"],
+            } for b in buckets_resp if b["count"] > 0],
+            "links": [{"from": f"il:{it['id']}", "to": f"bucket:{it['bucket']}", "label": "expires-in"}
+                      for it in items if it["bucket"] != "Outside window"],
+        },
+    }), 200
+
+
 @api_bp.post("/analysis/expiry-monitoring")
 def analysis_expiry_monitoring():
     """
-    Expiry monitoring for a given project POV.
+    Expiry monitoring for a project POV, or book-wide.
 
     POST JSON
     ---------
     {
-      "pov_id": <int>,                            # REQUIRED (project id)
+      "pov_kind": "project" | "portfolio" | "business_line" | "project_portfolio",   # default "project"
+      "pov_id": <int> | <str>,                    # project id; Project.business_line / .portfolio
+                                                  # value for those kinds; unused for "portfolio"
+      "page": 1, "page_size": 50,                 # items paging, all kinds but "project"
       "window_start": "YYYY-MM-DD",               # optional, default: today
       "window_end":   "YYYY-MM-DD",               # optional, default: today + 365
       "buckets_days": [0, 30, 90, 180, 365],      # optional cut points (ascending)
@@ -913,6 +1339,11 @@ def analysis_expiry_monitoring():
       "exposures_mode": "latest" | "none"                 # optional, default "latest"
     }
 
+    All kinds but "project" bucket in SQL (CASE over maturity_date), sum notionals exactly
+    per currency, and return the items a page at a time, soonest maturity first, with
+    "total", "page" and "page_size"; their scope carries "interlinkage_count" instead of
+    the id list.
+
     Response
     --------
     {
@@ -968,9 +1399,15 @@ def analysis_expiry_monitoring():
     body = request.get_json(force=True, silent=False) or {}
 
     # ---- Inputs & defaults
+    pov_kind = (body.get("pov_kind") or "project").strip().lower()
     pov_id = body.get("pov_id")
-    if not isinstance(pov_id, int):
+    if pov_kind not in ("project", *EXPIRY_SCOPES):
+        return jsonify({"error": "invalid_args",
+                        "hint": "pov_kind ∈ {project, portfolio, business_line, project_portfolio}"}), 400
+    if pov_kind == "project" and not isinstance(pov_id, int):
         return jsonify({"error": "invalid_args", "hint": "pov_id (int) is required"}), 400
+    if pov_kind in ("business_line", "project_portfolio") and not isinstance(pov_id, str):
+        return jsonify({"error": "invalid_args", "hint": f"pov_id (the {pov_kind} name) is required"}), 400
 
     # dates: default window [today, today+365]
     today = date.today()
@@ -1039,10 +1476,28 @@ def analysis_expiry_monitoring():
         return labels
 
     bucket_defs = _build_bucket_labels(buckets_days)
+    params = {
+        "window_start": window_start.isoformat(),
+        "window_end": window_end.isoformat(),
+        "buckets_days": buckets_days,
+        "include_overdue": include_overdue,
+        "measure": measure,
+        "exposures_mode": exposures_mode
+    }
+
+    if pov_kind != "project":
+        page, page_size = _body_paging(body)
+        return _expiry_for_scope(pov_kind, None if pov_kind == "portfolio" else pov_id,
+                                 today, bucket_defs, params, page, page_size)
 
     with session_scope() as s:
         # --- Scope: ILs for this project
-        q_il = not_deleted(s.query(m.Interlinkage).filter(m.Interlinkage.project_id == pov_id), m.Interlinkage)
+        q_il = not_deleted(
+            s.query(m.Interlinkage)
+             .options(*loader_options("analysis.expiry", m.Interlinkage))
+             .filter(m.Interlinkage.project_id == pov_id),
+            m.Interlinkage
+        )
         ils_all = q_il.all()
         if not ils_all:
             return jsonify({
@@ -1091,45 +1546,27 @@ def analysis_expiry_monitoring():
         # ---- Optional: latest exposures per IL
         meas_map = {}
         if measure != "none" and maturity_map and exposures_mode == "latest":
-            latest_sub = (
-                s.query(
-                    m.ExposureSnapshot.interlinkage_id,
-                    func.max(m.ExposureSnapshot.as_of_date).label("max_d")
-                )
-                .filter(m.ExposureSnapshot.interlinkage_id.in_(list(maturity_map.keys())))
-                .group_by(m.ExposureSnapshot.interlinkage_id)
-                .subquery()
-            )
-            snaps = (
-                s.query(m.ExposureSnapshot)
-                .join(latest_sub,
-                      and_(m.ExposureSnapshot.interlinkage_id == latest_sub.c.interlinkage_id,
-                           m.ExposureSnapshot.as_of_date     == latest_sub.c.max_d))
-                .all()
-            )
+            snaps = latest_exposures(s, maturity_map.keys())
             for r in snaps:
                 v = getattr(r, measure, None)
                 if v is not None:
                     meas_map[r.interlinkage_id] = v
 
         # ---- Enrich: names/currencies
-        sponsor_ids, cpty_ids, ccy_ids = set(), set(), set()
+        sponsor_ids, cpty_ids = set(), set()
         for il in il_by_id.values():
             if il.sponsor_id:      sponsor_ids.add(il.sponsor_id)
             if il.counterparty_id: cpty_ids.add(il.counterparty_id)
-            if il.currency_id:     ccy_ids.add(il.currency_id)
 
         name_by_entity = {}
         ent_ids = sponsor_ids | cpty_ids
         if ent_ids:
-            ents = not_deleted(s.query(m.LegalEntity).filter(m.LegalEntity.id.in_(ent_ids)), m.LegalEntity).all()
+            q_ents = not_deleted(s.query(m.LegalEntity).options(*loader_options("analysis.expiry", m.LegalEntity)), m.LegalEntity)
+            ents = all_in(q_ents, m.LegalEntity.id, ent_ids)
             for e in ents:
                 name_by_entity[e.id] = e.name or ""
 
-        code_by_ccy = {}
-        if ccy_ids:
-            for c in s.query(m.Currency).filter(m.Currency.id.in_(ccy_ids)).all():
-                code_by_ccy[c.id] = c.code or ""
+        code_by_ccy = {cid: (c["code"] or "") for cid, c in ref_cache.rows(s, m.Currency).items()}
 
         # ---- Build items & bucket assignment
         def _bucket_of(days):
@@ -1172,18 +1609,12 @@ def analysis_expiry_monitoring():
         # ---- Aggregate per bucket (count + total notional per currency)
         from collections import defaultdict
         bucket_counts = defaultdict(int)
-        bucket_totals = defaultdict(lambda: defaultdict(float))  # bucket -> ccy_code -> total
-
-        def _as_float(x):
-            try:
-                return float(x)
-            except Exception:
-                return 0.0
+        bucket_totals = defaultdict(lambda: defaultdict(Decimal))  # bucket -> ccy_code -> total
 
         for it in items:
             b = it["bucket"]
             bucket_counts[b] += 1
-            amt = _as_float(it["notional_amount"])
+            amt = Decimal(it["notional_amount"] or 0)
             ccy = it["currency_code"] or "—"
             bucket_totals[b][ccy] += amt
 
@@ -1263,4 +1694,266 @@ def analysis_expiry_monitoring():
                 "nodes": overlay_nodes,
                 "links": overlay_links
             }
-        }), 200
\ No newline at end of file
+        }), 200
+
+@api_bp.post("/analysis/exposure-rollup")
+def analysis_exposure_rollup():
+    """
+    Exposure time series in the reporting currency, summed by date x dimension.
+
+    POST JSON
+    ---------
+    {
+      "group_by": "project" | "sector" | "country" | "currency" | "business_line",   # default "project"
+      "measures": ["ead", "rwa", ...],      # subset of ead, undrawn, mtm, pnl, rwa; default ["ead"]
+      "date_from": "YYYY-MM-DD",            # optional, inclusive
+      "date_to":   "YYYY-MM-DD"             # optional, inclusive
+    }
+
+    Sector / country / business line are the project's. Amounts are converted with each
+    snapshot's fx_to_reporting; snapshots without a rate are left out and counted in
+    "unconverted".
+
+    Response
+    --------
+    {
+      "params": { ...echoed... },
+      "dates":  ["2024-01-31", ...],                          # ascending
+      "groups": [ {"key": <id|str|null>, "label": "..."} ],   # ascending key
+      "values": { "ead": [[<amount|null> per date] per group], ... },   # "1234.50", null = no snapshot
+      "rows": <snapshots summed>,
+      "unconverted": <snapshots without fx_to_reporting>
+    }
+    """
+    body = request.get_json(force=True, silent=False) or {}
+
+    group_by = (body.get("group_by") or "project").strip().lower()
+    measures = body.get("measures") or ["ead"]
+    if group_by not in ROLLUP_DIMENSIONS:
+        return jsonify({"error": "invalid_group_by", "hint": f"group_by ∈ {{{', '.join(ROLLUP_DIMENSIONS)}}}"}), 400
+    if not isinstance(measures, list) or not measures or any(ms not in ROLLUP_MEASURES for ms in measures):
+        return jsonify({"error": "invalid_measure", "hint": f"measures ⊆ {{{', '.join(ROLLUP_MEASURES)}}}"}), 400
+    measures = list(dict.fromkeys(measures))
+
+    def _parse_d(name):
+        raw = body.get(name)
+        if raw is None:
+            return None
+        try:
+            return datetime.strptime(raw, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            raise ValueError(name)
+
+    try:
+        date_from, date_to = _parse_d("date_from"), _parse_d("date_to")
+    except ValueError as e:
+        return jsonify({"error": "invalid_args", "hint": f"{e} must be YYYY-MM-DD"}), 400
+
+    with session_scope() as s:
+        rows = exposure_rollup(s, group_by, measures, date_from, date_to)
+
+        dates = sorted({r.as_of_date for r in rows})
+        keys = sorted({r.key for r in rows}, key=lambda k: (k is not None, k))
+        date_idx = {d: i for i, d in enumerate(dates)}
+        key_idx = {k: i for i, k in enumerate(keys)}
+        values = {ms: [[None] * len(dates) for _ in keys] for ms in measures}
+        unit = Decimal(1) / ROLLUP_UNIT
+        for r in rows:
+            gi, di = key_idx[r.key], date_idx[r.as_of_date]
+            for ms in measures:
+                cents = getattr(r, ms)
+                if cents is not None:
+                    values[ms][gi][di] = str(Decimal(cents) * unit)
+
+        # labels
+        if group_by == "project":
+            names = {p.id: p.name for p in all_in(
+                s.query(m.Project).options(*columns_only()), m.Project.id, keys)}
+        elif group_by == "business_line":
+            names = {k: k for k in keys}
+        else:
+            Ref, field = {"sector": (m.Sector, "label"), "country": (m.Country, "name"),
+                          "currency": (m.Currency, "code")}[group_by]
+            names = {i: r.get(field) for i, r in ref_cache.rows(s, Ref).items()}
+
+        return jsonify({
+            "params": {
+                "group_by": group_by,
+                "measures": measures,
+                "date_from": date_from.isoformat() if date_from else None,
+                "date_to": date_to.isoformat() if date_to else None,
+            },
+            "dates": [d.isoformat() for d in dates],
+            "groups": [{"key": k, "label": names.get(k) or "—"} for k in keys],
+            "values": values,
+            "rows": sum(r.rows for r in rows),
+            "unconverted": sum(r.unconverted for r in rows),
+        }), 200
+
+
+NETWORK_SORTS = ("weighted_degree", "degree", "betweenness")
+COMPONENT_LIMIT = 20
+MAX_COMPONENT_LIMIT = 500
+COMPONENT_IDS = 100  # interlinkage ids listed per component
+
+
+@api_bp.post("/analysis/network-metrics")
+def analysis_network_metrics():
+    """
+    Book-wide network metrics over the graph index (server/network.py).
+
+    POST JSON:
+      {
+        "weight": "count" | "notional" | "ead",       # default "count"; amounts in reporting currency
+        "samples": <int>,                             # betweenness sources, default 64 (exact when >= nodes)
+        "kind": "entity" | "project",                 # nodes listed in items, default "entity"
+        "sort": "weighted_degree" | "degree" | "betweenness",
+        "components_limit": 20,
+        "page": 1, "page_size": 50
+      }
+
+    Response:
+      {
+        "params": { ...echoed... },
+        "graph": { "nodes", "edges", "components", "isolated",   # isolated: single-interlinkage components
+                   "unweighted", "exact" },                      # interlinkages without a weight; exact betweenness
+        "components": [ { "rank", "interlinkages", "entities", "projects", "weight",
+                          "interlinkage_ids": [...first COMPONENT_IDS...], "truncated": bool }, ... ],
+        "items": [ { "id", "name", "degree", "weighted_degree", "betweenness", "component" }, ... ],
+        "total": <nodes of kind>, "page": 1, "page_size": 50
+      }
+    """
+    body = request.get_json(force=True, silent=False) or {}
+    weight = (body.get("weight") or "count").strip().lower()
+    kind = (body.get("kind") or "entity").strip().lower()
+    sort = (body.get("sort") or "weighted_degree").strip().lower()
+    try:
+        samples = int(body.get("samples") or DEFAULT_SAMPLES)
+        components_limit = int(body.get("components_limit") or COMPONENT_LIMIT)
+    except (TypeError, ValueError):
+        return jsonify({"error": "invalid_args", "hint": "samples and components_limit are integers"}), 400
+    if weight not in NETWORK_WEIGHTS:
+        return jsonify({"error": "invalid_weight", "hint": f"weight ∈ {{{', '.join(NETWORK_WEIGHTS)}}}"}), 400
+    if kind not in ("entity", "project") or sort not in NETWORK_SORTS:
+        return jsonify({"error": "invalid_args",
+                        "hint": f"kind ∈ {{entity, project}}, sort ∈ {{{', '.join(NETWORK_SORTS)}}}"}), 400
+    if not (1 <= samples <= MAX_SAMPLES) or not (1 <= components_limit <= MAX_COMPONENT_LIMIT):
+        return jsonify({"error": "invalid_args",
+                        "hint": f"samples ∈ [1, {MAX_SAMPLES}], components_limit ∈ [1, {MAX_COMPONENT_LIMIT}]"}), 400
+    page, page_size = _body_paging(body)
+
+    with session_scope() as s:
+        mx = metrics_cache.get(s, weight, samples)
+        keys = mx.keys
+
+        components = []
+        for rank, members in enumerate(mx.components[:components_limit], start=1):
+            ils = sorted(keys[u][1] for u in members if keys[u][0] == "interlinkage")
+            components.append({
+                "rank": rank,
+                "interlinkages": len(ils),
+                "entities": sum(1 for u in members if keys[u][0] == "entity"),
+                "projects": sum(1 for u in members if keys[u][0] == "project"),
+                "weight": round(sum(mx.weights.get(u) or 0.0 for u in members), 2),
+                "interlinkage_ids": ils[:COMPONENT_IDS],
+                "truncated": len(ils) > COMPONENT_IDS,
+            })
+
+        metric = {"weighted_degree": mx.weighted, "degree": mx.degree, "betweenness": mx.betweenness}[sort]
+        ranked = sorted((u for u in mx.degree if keys[u][0] == kind), key=lambda u: (-metric[u], keys[u][1]))
+        page_nodes = ranked[(page - 1) * page_size: page * page_size]
+        Model = m.LegalEntity if kind == "entity" else m.Project
+        ids = [keys[u][1] for u in page_nodes]
+        names = dict(s.query(Model.id, Model.name).filter(Model.id.in_(ids)).all()) if ids else {}
+
+        return jsonify({
+            "params": {"weight": weight, "samples": samples, "kind": kind, "sort": sort,
+                       "components_limit": components_limit},
+            "graph": {
+                "nodes": len(mx.degree),
+                "edges": sum(mx.degree.values()) // 2,
+                "components": len(mx.components),
+                "isolated": sum(1 for c in mx.components if sum(keys[u][0] == "interlinkage" for u in c) == 1),
+                "unweighted": mx.unweighted,
+                "exact": mx.exact,
+            },
+            "components": components,
+            "items": [{
+                "id": keys[u][1],
+                "name": names.get(keys[u][1]),
+                "degree": mx.degree[u],
+                "weighted_degree": round(mx.weighted[u], 2),
+                "betweenness": round(mx.betweenness[u], 6),
+                "component": mx.component_of[u] + 1,
+            } for u in page_nodes],
+            "total": len(ranked),
+            "page": page,
+            "page_size": page_size,
+        }), 200
+
+
+# --- background analysis jobs (server/jobs.py) ---
+# kind -> (view, path it is served on synchronously, whether its answer depends on today's date)
+JOB_KINDS = {
+    "concentration":         (analysis_concentration_shared_dependencies, "/api/analysis/concentration/shared-dependencies", False),
+    "concentration.cluster": (analysis_concentration_cluster, "/api/analysis/concentration/shared-dependencies/cluster", False),
+    "expiry":                (analysis_expiry_monitoring, "/api/analysis/expiry-monitoring", True),
+    "exposure_rollup":       (analysis_exposure_rollup, "/api/analysis/exposure-rollup", False),
+    "network_metrics":       (analysis_network_metrics, "/api/analysis/network-metrics", False),
+}
+MAX_JOB_WAIT = 30  # seconds a status request may long-poll
+
+
+@api_bp.post("/jobs")
+def submit_job():
+    """
+    Run an analysis in the background.
+
+    POST JSON: {"kind": "concentration" | "concentration.cluster" | "expiry" | "exposure_rollup" | "network_metrics",
+                "params": {...the analysis endpoint's POST body...}}
+
+    202 with the job status (and a Location) for a new job; 200 with the existing one
+    when the same kind and params were submitted and the data has not changed since.
+    Status: {"id", "kind", "status": queued|running|done|failed, "status_code",
+             "error", "created_at", "started_at", "finished_at"}
+    """
+    body = request.get_json(force=True, silent=False) or {}
+    kind, params = body.get("kind"), body.get("params") or {}
+    if kind not in JOB_KINDS or not isinstance(params, dict):
+        return jsonify({"error": "invalid_args", "hint": f"kind ∈ {{{', '.join(JOB_KINDS)}}} and params is an object"}), 400
+    view, path, dated = JOB_KINDS[kind]
+    try:
+        status, created = job_runner.submit(current_app._get_current_object(), kind, params, view, path, dated)
+    except QueueFull:
+        return jsonify({"error": "busy", "hint": "too many pending jobs, retry later"}), 503
+    resp = jsonify(status)
+    resp.status_code = 202 if created else 200
+    resp.headers["Location"] = f"/api/jobs/{status['id']}"
+    return resp
+
+
+@api_bp.get("/jobs/<job_id>")
+def get_job(job_id):
+    """Job status; ?wait=<seconds> (at most MAX_JOB_WAIT) long-polls until it finishes."""
+    try:
+        wait = min(max(float(request.args.get("wait", 0)), 0), MAX_JOB_WAIT)
+    except ValueError:
+        return jsonify({"error": "invalid_args", "hint": "wait is a number of seconds"}), 400
+    status = job_runner.get(job_id, wait)
+    if status is None:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(status), 200
+
+
+@api_bp.get("/jobs/<job_id>/result")
+def get_job_result(job_id):
+    """The analysis response of a finished job, with its original status code."""
+    found = job_runner.result(job_id)
+    if found is None:
+        return jsonify({"error": "not_found"}), 404
+    status, status_code, result = found
+    if status["status"] == "failed":
+        return jsonify({"error": "job_failed", "message": status["error"]}), 500
+    if status["status"] != "done":
+        return jsonify({"error": "not_ready", "status": status["status"]}), 409
+    return current_app.response_class(result, status=status_code, mimetype="application/json")
@@ -0,0 +1,127 @@
+# server/cache.py
+"""
+Small process-local caches shared by the API layer.
+
+Everything here is invalidated by the generic write views in server/api/routes.py
+(see invalidate_for), and every entry also records the table_versions it was built
+at and is re-validated against them on access (one PK lookup), so cascaded deletes
+and writes from other processes or scripts are picked up too.
+"""
+import threading
+from collections import OrderedDict
+
+from . import models as m
+from . import schemas as sc
+from .versions import table_versions
+
+
+class CountCache:
+    """
+    Row counts keyed by (table, filter signature), used by list_items(total=estimate).
+    A count is reused only while the table's version is the one it was taken at.
+    Each table keeps at most `max_per_table` signatures (oldest evicted first).
+    """
+
+    def __init__(self, max_per_table: int = 256):
+        self.max_per_table = max_per_table
+        self._lock = threading.Lock()
+        self._tables = {}  # table -> OrderedDict(signature -> (version, count))
+
+    def count(self, s, table: str, signature, compute):
+        """The cached count for `signature`, or compute() stored at the current version."""
+        version = table_versions(s, [table]).get(table, 0)
+        with self._lock:
+            entries = self._tables.get(table)
+            if entries is not None and signature in entries and entries[signature][0] == version:
+                entries.move_to_end(signature)
+                return entries[signature][1]
+        n = compute()
+        with self._lock:
+            entries = self._tables.setdefault(table, OrderedDict())
+            entries[signature] = (version, n)
+            entries.move_to_end(signature)
+            while len(entries) > self.max_per_table:
+                entries.popitem(last=False)
+        return n
+
+    def invalidate(self, table: str = None):
+        with self._lock:
+            if table is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(table, None)
+
+
+count_cache = CountCache()
+
+
+class RefCache:
+    """
+    Snapshot of the small ref_* dictionaries, as dumped by their resource schemas.
+
+    Loaded at startup, dropped by the write views when they touch a ref model, and
+    re-validated on every access against `table_versions` (one PK lookup), so writes
+    from other processes or scripts are picked up too.
+    """
+
+    def __init__(self, schemas):
+        self.schemas = schemas          # Model -> schema class
+        self._lock = threading.Lock()
+        self._data = {}                 # Model -> (version, {id: dumped row})
+
+    def _load(self, s, Model, version):
+        schema = self.schemas[Model]()
+        rows = {r.id: schema.dump(r) for r in s.query(Model).order_by(Model.id)}
+        self._data[Model] = (version, rows)
+        return rows
+
+    def warm(self, s):
+        self.all(s, *self.schemas)
+
+    def all(self, s, *Models):
+        """{Model: {id: row}} for the requested ref models, reloading stale ones."""
+        versions = table_versions(s, [M.__tablename__ for M in Models])
+        out = {}
+        with self._lock:
+            for M in Models:
+                version = versions.get(M.__tablename__, 0)
+                cached = self._data.get(M)
+                if cached is not None and cached[0] == version:
+                    out[M] = cached[1]
+                else:
+                    out[M] = self._load(s, M, version)
+        return out
+
+    def rows(self, s, Model):
+        """{id: dumped row} for one ref model."""
+        return self.all(s, Model)[Model]
+
+    def pick(self, s, Model, ids):
+        """Dumped rows for `ids` (ascending id), like a filtered SELECT ... WHERE id IN (...)."""
+        rows = self.rows(s, Model)
+        return [rows[i] for i in sorted(ids) if i in rows]
+
+    def invalidate(self, Model=None):
+        with self._lock:
+            if Model is None:
+                self._data.clear()
+            else:
+                self._data.pop(Model, None)
+
+
+ref_cache = RefCache({
+    m.Currency:         sc.CurrencySchema,
+    m.Country:          sc.CountrySchema,
+    m.Sector:           sc.SectorSchema,
+    m.PraActivity:      sc.PraActivitySchema,
+    m.CounterpartyType: sc.CounterpartyTypeSchema,
+    m.InstrumentType:   sc.InstrumentTypeSchema,
+    m.FacilityType:     sc.FacilityTypeSchema,
+})
+
+
+def invalidate_for(Model):
+    """Drop every cache entry a write to `Model` can make stale (called by the write views)."""
+    count_cache.invalidate(Model.__tablename__)
+    if Model in ref_cache.schemas:
+        ref_cache.invalidate(Model)
@@ -1,11 +1,29 @@
+import base64
+import csv
+import io
+import json
+import time
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
 from typing import Type, Dict, Any
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only, MANYTOONE
 from marshmallow import Schema
 from .utils import parse_bool_param
+from .database import begin_sqlite_transaction, session_scope
+from .cache import count_cache, ref_cache
+from .search import search_filter
+from .loading import batched, loader_options
+from .explain import (
+    compile_sql, explain_plan, plan_warnings, predicate_shape, predicate_stats, suggest_index, unindexed,
+)
+from .serializers import dump_many, dump_one
 from sqlalchemy.exc import IntegrityError
-from flask import request, jsonify
-from sqlalchemy.sql.sqltypes import String, Date, DateTime
-from sqlalchemy import asc, desc, Column
+from flask import request, jsonify, Response, stream_with_context
+from sqlalchemy.sql.sqltypes import Boolean, Enum, Integer, String, Date, DateTime
+from sqlalchemy import asc, desc, func, type_coerce, Column, and_, or_, false, insert, update, delete
+from marshmallow import ValidationError
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 
 SAFE_ATTR_TYPES = (InstrumentedAttribute,)
@@ -51,6 +69,20 @@ def _coerce_value(col, raw):
         return None
     t = col.type
     # best-effort coercion (extend as needed)
+    if isinstance(raw, str) and isinstance(t, Boolean):
+        v = raw.strip().lower()
+        if v in ("1", "true", "yes", "y", "on"):
+            return True
+        if v in ("0", "false", "no", "n", "off"):
+            return False
+        return raw
+    if isinstance(raw, str) and isinstance(t, (Date, DateTime)):
+        try:
+            if isinstance(t, DateTime):
+                return datetime.fromisoformat(raw)
+            return date.fromisoformat(raw)
+        except ValueError:
+            return raw
     if hasattr(t, "python_type"):
         py = t.python_type
         try:
@@ -59,46 +91,282 @@ def _coerce_value(col, raw):
             return raw
     return raw
 
-def list_items(session, Model, schema, include_deleted=False):
-    cols = _model_columns(Model)
+# --- keyset (cursor) pagination helpers ---
+# A cursor is the urlsafe-base64 JSON of {"k": [[col, dir], ...], "v": [values]}:
+# the sort keys it was issued for and their values on the last row of the page.
 
-    # --- paging ---
-    try:
-        page = int(request.args.get("page", 1))
-        page_size = int(request.args.get("page_size", 25))
-        if page < 1: page = 1
-        if page_size < 1: page_size = 25
-    except ValueError:
-        page, page_size = 1, 25
+class InvalidCursor(ValueError):
+    pass
 
-    # --- sorting ---
+
+def _parse_sort_keys(cols):
+    """?sort=code:asc,deal_date:desc -> [("code", "asc"), ("deal_date", "desc")] (unknown columns dropped)"""
+    keys = []
     sort_arg = request.args.get("sort")  # e.g. "code:asc" or "deal_date:desc"
-    sort_clauses = []
     if sort_arg:
         for part in sort_arg.split(","):
             k, _, order = part.partition(":")
             k = k.strip()
-            order = (order or "asc").lower()
+            order = (order or "asc").strip().lower()
             if k in cols:
-                sort_clauses.append(asc(cols[k]) if order == "asc" else desc(cols[k]))
+                keys.append((k, "desc" if order == "desc" else "asc"))
+    return keys
+
+
+def _json_value(v):
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    return v
+
+
+def encode_cursor(keys, obj) -> str:
+    payload = {"k": [list(k) for k in keys], "v": [_json_value(getattr(obj, name)) for name, _ in keys]}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, keys, cols):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+        cur_keys = [tuple(k) for k in payload["k"]]
+        values = payload["v"]
+    except Exception:
+        raise InvalidCursor("malformed cursor")
+    if cur_keys != list(keys) or len(values) != len(keys):
+        raise InvalidCursor("cursor does not match sort")
+    return [_coerce_value(cols[name], v) if isinstance(v, str) else v for (name, _), v in zip(keys, values)]
+
+
+def _keyset_after(cols, keys, values):
+    """
+    Row-value comparison "(k1, k2, ...) > (v1, v2, ...)" honouring per-key direction,
+    expanded as  k1 > v1  OR  (k1 = v1 AND k2 > v2)  OR ...
+    NULLs follow SQLite ordering: smallest value (first on asc, last on desc).
+    """
+    def eq(col, v):
+        return col.is_(None) if v is None else col == v
+
+    def after(col, v, direction):
+        if direction == "asc":
+            return col.isnot(None) if v is None else col > v
+        return false() if v is None else or_(col < v, col.is_(None))
+
+    branches = []
+    for i, (name, direction) in enumerate(keys):
+        prefix = [eq(cols[n], values[j]) for j, (n, _) in enumerate(keys[:i])]
+        branches.append(and_(*prefix, after(cols[name], values[i], direction)))
+    return or_(*branches)
+
+
+# --- sparse fieldsets (?fields=id,name,status) ---
+
+class InvalidFields(ValueError):
+    def __init__(self, unknown):
+        super().__init__(f"unknown fields: {', '.join(unknown)}")
+        self.unknown = unknown
+
+
+@lru_cache(maxsize=256)
+def _schema_only(schema_cls, only):
+    return schema_cls(only=only)
+
+
+def _sparse_fieldset(Model, schema, extra_cols=()):
+    """
+    Returns (dump_schema, query_options) for the requested ?fields=.
+    Only the requested columns (+ id and `extra_cols`, e.g. cursor sort keys) are SELECTed.
+    """
+    raw = request.args.get("fields")
+    if not raw:
+        return schema, []
+    wanted = tuple(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    unknown = [f for f in wanted if f not in schema.dump_fields]
+    if unknown:
+        raise InvalidFields(unknown)
+    cols = _model_columns(Model)
+    load = {f for f in wanted if f in cols} | set(extra_cols) | {"id"}
+    return _schema_only(type(schema), wanted), [load_only(*(getattr(Model, c) for c in sorted(load)))]
+
+
+# --- relation expansion (?expand=sponsor,counterparty,currency) ---
+# Requested relationships are batch-loaded (selectinload: one IN query per relation)
+# and inlined under their relationship name. Many-to-one links to ref_* tables are
+# resolved from the reference cache and cost no query at all.
+
+class InvalidExpand(ValueError):
+    def __init__(self, unknown):
+        super().__init__(f"unknown relations: {', '.join(unknown)}")
+        self.unknown = unknown
+
+
+def parse_expand(Model, related_schemas):
+    """Relationship properties named in ?expand= (those whose target has a schema)."""
+    raw = request.args.get("expand")
+    if not raw or not related_schemas:
+        return []
+    rels = Model.__mapper__.relationships
+    names = list(dict.fromkeys(n.strip() for n in raw.split(",") if n.strip()))
+    unknown = [n for n in names if n not in rels or rels[n].mapper.class_ not in related_schemas]
+    if unknown:
+        raise InvalidExpand(unknown)
+    return [rels[n] for n in names]
+
+
+def expand_tables(Model, related_schemas):
+    """Tables an ?expand= response also reads from (for ETags); [] when invalid."""
+    try:
+        return [rel.mapper.local_table.name for rel in parse_expand(Model, related_schemas)]
+    except InvalidExpand:
+        return []
+
+
+def _from_ref_cache(rel):
+    return rel.direction is MANYTOONE and rel.mapper.class_ in ref_cache.schemas
 
-    # --- filters (fuzzy for text) ---
-    # collect all query args except reserved
-    reserved = {"page", "page_size", "sort", "include_deleted"}
+
+def _expand_columns(rels):
+    # FK columns the batched loads key on; they must survive a sparse ?fields=
+    return [c.key for rel in rels if rel.direction is MANYTOONE for c in rel.local_columns]
+
+
+def _expand_options(Model, rels):
+    return [batched(getattr(Model, rel.key)) for rel in rels if not _from_ref_cache(rel)]
+
+
+def _inline_expansions(session, objs, data, rels, related_schemas):
+    for rel in rels:
+        target = rel.mapper.class_
+        if _from_ref_cache(rel):
+            cached = ref_cache.rows(session, target)
+            fk = next(iter(rel.local_columns)).key
+            for obj, d in zip(objs, data):
+                d[rel.key] = cached.get(getattr(obj, fk))
+            continue
+        schema = related_schemas[target]
+        for obj, d in zip(objs, data):
+            value = getattr(obj, rel.key)
+            if rel.uselist:
+                d[rel.key] = dump_many(schema, value)
+            else:
+                d[rel.key] = dump_one(schema, value) if value is not None else None
+    return data
+
+
+# query params that are never column filters
+RESERVED_PARAMS = {"page", "page_size", "sort", "include_deleted", "cursor", "total", "fields", "format", "expand"}
+
+ListQuery = namedtuple("ListQuery", "query ordered schema cols sort_keys filter_sig")
+
+
+# --- filters (?name=acme, ?deal_date__gte=2024-01-01, ?status__in=draft,active) ---
+# A bare column does what it always did: fuzzy ilike for text, equality otherwise.
+# `col__op` compiles to a plain comparison on the column, so the column's index applies.
+
+FILTER_OPS = ("eq", "ne", "gt", "gte", "lt", "lte", "between", "in", "notin", "isnull")
+
+
+class InvalidFilter(ValueError):
+    def __init__(self, param, message):
+        super().__init__(f"{param}: {message}")
+        self.param = param
+
+
+def _coerce_filter(param, col, raw):
+    """_coerce_value, but a value that does not fit the column type is an error."""
+    v = _coerce_value(col, raw.strip())
+    if isinstance(v, str) and not isinstance(col.type, String):
+        raise InvalidFilter(param, f"{raw!r} is not a valid {col.type.__class__.__name__.lower()}")
+    if isinstance(col.type, Enum) and v not in col.type.enums:
+        raise InvalidFilter(param, f"{raw!r} is not one of {', '.join(col.type.enums)}")
+    return v
+
+
+def _operator_filter(param, col, op, raw):
+    if op == "isnull":
+        if raw.strip().lower() in ("1", "true", "yes", "y", "on"):
+            return col.is_(None)
+        if raw.strip().lower() in ("0", "false", "no", "n", "off"):
+            return col.isnot(None)
+        raise InvalidFilter(param, "expected true or false")
+    if op in ("in", "notin"):
+        values = [_coerce_filter(param, col, v) for v in raw.split(",") if v.strip()]
+        if not values:
+            raise InvalidFilter(param, "expected a comma-separated list")
+        return col.in_(values) if op == "in" else col.not_in(values)
+    if op == "between":
+        bounds = raw.split(",")
+        if len(bounds) != 2:
+            raise InvalidFilter(param, "expected two comma-separated bounds")
+        lo, hi = (_coerce_filter(param, col, b) for b in bounds)
+        return col.between(lo, hi)
+    v = _coerce_filter(param, col, raw)
+    return {
+        "eq": col.__eq__, "ne": col.__ne__,
+        "gt": col.__gt__, "gte": col.__ge__,
+        "lt": col.__lt__, "lte": col.__le__,
+    }[op](v)
+
+
+def parse_filters(Model, cols=None):
+    """
+    (SQL predicates, filter signature) for the column filters in request.args.
+    Unknown columns are ignored as before; a known column with an unknown operator
+    or a value of the wrong type raises InvalidFilter.
+    """
+    cols = cols if cols is not None else _model_columns(Model)
     filters = []
+    filter_sig = []
     for k, v in request.args.items():
-        if k in reserved or v is None or v == "":
+        if k in RESERVED_PARAMS or v is None or v == "":
             continue
-        if k in cols:
+        name, sep, op = k.rpartition("__")
+        if sep and name in cols:
+            if op not in FILTER_OPS:
+                raise InvalidFilter(k, f"unknown operator (expected one of {', '.join(FILTER_OPS)})")
+            filter_sig.append((k, v))
+            filters.append(_operator_filter(k, cols[name], op, v))
+        elif k in cols:
             col = cols[k]
+            filter_sig.append((k, v))
             if isinstance(col.type, (String, )):
-                # fuzzy match
-                filters.append(col.ilike(f"%{v}%"))
+                # fuzzy match, served by the trigram index when the column has one
+                flt = search_filter(Model, k, v)
+                # plain String comparison: Enum columns would reject the %-pattern as a value
+                filters.append(flt if flt is not None else type_coerce(col, String).ilike(f"%{v}%"))
             else:
                 # exact/coerced for non-strings
                 filters.append(col == _coerce_value(col, v))
+    return filters, filter_sig
+
+
+def build_list_query(session, Model, schema, include_deleted=False, tie_break=False, expand=()) -> ListQuery:
+    """
+    The filtered/sorted query behind the list endpoints, built from request.args.
+    `query` is unordered (for counts), `ordered` carries the sort; `schema` honours ?fields=.
+    `expand` (from parse_expand) adds the batched relationship loads.
+    Raises InvalidFields / InvalidFilter.
+    """
+    cols = _model_columns(Model)
+
+    # --- sorting ---
+    sort_keys = _parse_sort_keys(cols)
+    if tie_break and "id" in cols and "id" not in {k for k, _ in sort_keys}:
+        # keyset paging needs a unique, total order
+        sort_keys.append(("id", "asc"))
+    sort_clauses = [asc(cols[k]) if order == "asc" else desc(cols[k]) for k, order in sort_keys]
+
+    # --- filters (fuzzy for text, col__op=value for operators) ---
+    filters, filter_sig = parse_filters(Model, cols)
+
+    schema, load_opts = _sparse_fieldset(Model, schema, extra_cols=[k for k, _ in sort_keys] + _expand_columns(expand))
+    load_opts = loader_options("resource", Model) + load_opts + _expand_options(Model, expand)
 
     q = session.query(Model)
+    if load_opts:
+        q = q.options(*load_opts)
 
     # soft-delete behavior if your models have is_deleted
     if "is_deleted" in cols and not include_deleted:
@@ -108,20 +376,133 @@ def list_items(session, Model, schema, include_deleted=False):
         for flt in filters:
             q = q.filter(flt)
 
-    total = q.count()
-
     if sort_clauses:
-        q = q.order_by(*sort_clauses)
+        ordered = q.order_by(*sort_clauses)
     else:
         # deterministic fallback
-        if "id" in cols:
-            q = q.order_by(cols["id"].asc())
+        ordered = q.order_by(cols["id"].asc()) if "id" in cols else q
+
+    return ListQuery(q, ordered, schema, cols, sort_keys, (include_deleted, tuple(sorted(filter_sig))))
+
+
+def _parse_paging():
+    try:
+        page = int(request.args.get("page", 1))
+        page_size = int(request.args.get("page_size", 25))
+        if page < 1: page = 1
+        if page_size < 1: page_size = 25
+    except ValueError:
+        page, page_size = 1, 25
+    return page, page_size
+
+
+# ref_* listings with only these params are served from the reference cache
+REF_CACHE_PARAMS = {"page", "page_size", "sort", "total", "fields", "include_deleted"}
+# column types whose dumped values sort like the column does in SQL (dates and
+# decimals are dumped as strings, so a sort on them is left to SQL)
+REF_CACHE_SORT_TYPES = (Integer, String, Boolean)
+
+
+def _cached_sort_ok(Model):
+    cols = _model_columns(Model)
+    return all(isinstance(cols[k].type, REF_CACHE_SORT_TYPES) for k, _ in _parse_sort_keys(cols))
+
+
+def _list_cached_refs(session, Model, schema, page, page_size, total_mode):
+    """list_items over the cached ref rows: same sort (NULLs first on asc), paging and fields."""
+    try:
+        schema = _sparse_fieldset(Model, schema)[0]
+    except InvalidFields as e:
+        return jsonify({"error": "invalid_fields", "unknown": e.unknown}), 400
+    items = list(ref_cache.rows(session, Model).values())  # id order
+    for k, order in reversed(_parse_sort_keys(_model_columns(Model))):
+        items.sort(key=lambda r: (r.get(k) is not None, r.get(k)), reverse=(order == "desc"))
+    offset = (page - 1) * page_size
+    keys = list(schema.dump_fields)
+    data = [{k: r[k] for k in keys if k in r} for r in items[offset:offset + page_size]]
+    return jsonify({
+        "items": data,
+        "total": None if total_mode == "none" else len(items),
+        "page": page,
+        "page_size": page_size,
+    })
+
+
+def list_items(session, Model, schema, include_deleted=False, related_schemas=None):
+    """
+    Generic list endpoint.
+
+    Query params:
+      - page, page_size: offset paging (default)
+      - cursor: opt-in keyset paging; pass an empty value for the first page, then
+                the returned "next_cursor" (null once the last page is reached)
+      - sort: "col:asc,other:desc" (id is appended as tie-breaker in cursor mode)
+      - fields: "id,name,status" sparse fieldset (limits both the SELECT and the dump)
+      - expand: "sponsor,currency" relationships to batch-load and inline
+                (targets must be in `related_schemas`, Model -> schema)
+      - total: "exact" (default, COUNT(*) per call) | "estimate" (cached count per
+               filter signature, invalidated by the write views) | "none" (no count)
+      - <column>=<value>: fuzzy (ilike, FTS5 trigram index where available) for strings,
+                          exact for everything else
+      - <column>__<op>=<value>: op ∈ FILTER_OPS (between/in/notin take comma-separated values,
+                                isnull takes true/false)
+    """
+    page, page_size = _parse_paging()
+
+    cursor = request.args.get("cursor")
+    cursor_mode = cursor is not None
+
+    total_mode = (request.args.get("total") or "exact").lower()
+    if total_mode not in ("exact", "estimate", "none"):
+        return jsonify({"error": "invalid_args", "hint": "total ∈ {exact, estimate, none}"}), 400
+
+    if Model in ref_cache.schemas and set(request.args) <= REF_CACHE_PARAMS and _cached_sort_ok(Model):
+        return _list_cached_refs(session, Model, schema, page, page_size, total_mode)
+
+    try:
+        expand = parse_expand(Model, related_schemas)
+        lq = build_list_query(session, Model, schema, include_deleted, tie_break=cursor_mode, expand=expand)
+    except InvalidExpand as e:
+        return jsonify({"error": "invalid_expand", "unknown": e.unknown}), 400
+    except InvalidFields as e:
+        return jsonify({"error": "invalid_fields", "unknown": e.unknown}), 400
+    except InvalidFilter as e:
+        return jsonify({"error": "invalid_filter", "param": e.param, "message": str(e)}), 400
+    schema = lq.schema
+    predicate_stats.record(Model, predicate_shape(Model, lq.filter_sig[1], lq.sort_keys))
+
+    if total_mode == "none":
+        total = None
+    elif total_mode == "estimate":
+        total = count_cache.count(session, Model.__tablename__, lq.filter_sig, lq.query.count)
+    else:
+        total = lq.query.count()
+
+    q = lq.ordered
+
+    if cursor_mode:
+        if cursor:
+            try:
+                values = decode_cursor(cursor, lq.sort_keys, lq.cols)
+            except InvalidCursor as e:
+                return jsonify({"error": "invalid_cursor", "message": str(e)}), 400
+            q = q.filter(_keyset_after(lq.cols, lq.sort_keys, values))
+        # fetch one extra row to know whether another page exists
+        rows = q.limit(page_size + 1).all()
+        items = rows[:page_size]
+        next_cursor = encode_cursor(lq.sort_keys, items[-1]) if len(rows) > page_size else None
+        return jsonify({
+            "items": _inline_expansions(session, items, dump_many(schema, items), expand, related_schemas),
+            "total": total,
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+        })
 
     # correct offset formula
     offset = (page - 1) * page_size
     items = q.offset(offset).limit(page_size).all()
 
-    data = schema.dump(items, many=True)
+    data = _inline_expansions(session, items, dump_many(schema, items), expand, related_schemas)
     return jsonify({
         "items": data,
         "total": total,
@@ -130,15 +511,136 @@ def list_items(session, Model, schema, include_deleted=False):
     })
 
 
-def get_item(s: Session, model: Type, schema: Schema, item_id: int):
-    obj = s.get(model, item_id)
+def explain_list(session, Model, schema, include_deleted=False):
+    """
+    The queries list_items would run for the same request.args (count + page), with
+    their EXPLAIN QUERY PLAN, wall-clock timings and the predicates no index serves.
+    """
+    page, page_size = _parse_paging()
+    cursor = request.args.get("cursor")
+    try:
+        lq = build_list_query(session, Model, schema, include_deleted, tie_break=cursor is not None)
+    except InvalidFields as e:
+        return jsonify({"error": "invalid_fields", "unknown": e.unknown}), 400
+    except InvalidFilter as e:
+        return jsonify({"error": "invalid_filter", "param": e.param, "message": str(e)}), 400
+
+    page_q = lq.ordered
+    if cursor:
+        try:
+            page_q = page_q.filter(_keyset_after(lq.cols, lq.sort_keys, decode_cursor(cursor, lq.sort_keys, lq.cols)))
+        except InvalidCursor as e:
+            return jsonify({"error": "invalid_cursor", "message": str(e)}), 400
+        page_q = page_q.limit(page_size + 1)
+    else:
+        page_q = page_q.offset((page - 1) * page_size).limit(page_size)
+    # what Query.count() runs
+    count_q = session.query(func.count()).select_from(lq.query.enable_eagerloads(False).order_by(None).subquery())
+
+    out = {}
+    for label, q in (("count", count_q), ("page", page_q)):
+        plan = explain_plan(session, q)
+        started = time.perf_counter()
+        rows = q.all()
+        elapsed = time.perf_counter() - started
+        sql, params = compile_sql(session, q)
+        out[label] = dict({
+            "sql": sql,
+            "params": params,
+            "plan": plan,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "rows": rows[0][0] if label == "count" else len(rows),
+        }, **plan_warnings(plan))
+
+    shape = predicate_shape(Model, lq.filter_sig[1], lq.sort_keys)
+    missing = unindexed(Model, shape)
+    return jsonify({
+        "table": Model.__tablename__,
+        "queries": out,
+        "predicates": [{"column": c, "kind": k} for c, k in shape],
+        "unindexed": [{"column": c, "kind": k} for c, k in missing],
+        "suggested_index": suggest_index(Model.__tablename__, shape) if missing else None,
+    })
+
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_items(Model, schema, include_deleted=False):
+    """
+    Stream every row matching the list filters/sort/fields as NDJSON (default) or CSV.
+    Rows come from a server-side cursor (yield_per) and are dumped batch by batch,
+    so memory stays flat whatever the table size.
+    """
+    fmt = (request.args.get("format") or "ndjson").lower()
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "invalid_args", "hint": "format ∈ {ndjson, csv}"}), 400
+    try:
+        dump_schema = _sparse_fieldset(Model, schema)[0]
+        parse_filters(Model)  # fail before the response starts streaming
+    except InvalidFields as e:
+        return jsonify({"error": "invalid_fields", "unknown": e.unknown}), 400
+    except InvalidFilter as e:
+        return jsonify({"error": "invalid_filter", "param": e.param, "message": str(e)}), 400
+    columns = list(dump_schema.dump_fields)
+
+    def batches():
+        with session_scope() as s:
+            lq = build_list_query(s, Model, schema, include_deleted)
+            q = lq.ordered.yield_per(EXPORT_BATCH_SIZE)
+            batch = []
+            for obj in q:
+                batch.append(obj)
+                if len(batch) >= EXPORT_BATCH_SIZE:
+                    yield dump_many(lq.schema, batch)
+                    batch = []
+            if batch:
+                yield dump_many(lq.schema, batch)
+
+    def ndjson():
+        for rows in batches():
+            yield "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in rows)
+
+    def csv_rows():
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for rows in batches():
+            writer.writerows(rows)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        yield buf.getvalue()
+
+    filename = f"{Model.__tablename__}.{fmt}"
+    if fmt == "csv":
+        body, mimetype = csv_rows(), "text/csv"
+    else:
+        body, mimetype = ndjson(), "application/x-ndjson"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def get_item(s: Session, model: Type, schema: Schema, item_id: int, related_schemas=None):
+    try:
+        expand = parse_expand(model, related_schemas)
+        extra = (["is_deleted"] if hasattr(model, "is_deleted") else []) + _expand_columns(expand)
+        schema, load_opts = _sparse_fieldset(model, schema, extra_cols=extra)
+    except InvalidExpand as e:
+        return jsonify({"error": "invalid_expand", "unknown": e.unknown}), 400
+    except InvalidFields as e:
+        return jsonify({"error": "invalid_fields", "unknown": e.unknown}), 400
+    obj = s.get(model, item_id, options=loader_options("resource", model) + load_opts + _expand_options(model, expand))
     if not obj:
         return jsonify({"error": "not_found"}), 404
     # hide soft-deleted by default
     if getattr(obj, "is_deleted", False):
         if not parse_bool_param("include_deleted", False):
             return jsonify({"error": "not_found"}), 404
-    return jsonify(schema.dump(obj))
+    return jsonify(_inline_expansions(s, [obj], [dump_one(schema, obj)], expand, related_schemas)[0])
 
 
 def create_item(s: Session, model: Type, schema: Schema, payload: Dict[str, Any]):
@@ -168,6 +670,7 @@ def delete_item(s: Session, model: Type, item_id: int, soft=True):
     try:
         if soft and hasattr(obj, "is_deleted"):
             setattr(obj, "is_deleted", True)
+            setattr(obj, "deleted_at", datetime.utcnow())
             s.flush()
         else:
             s.delete(obj)
@@ -178,3 +681,133 @@ def delete_item(s: Session, model: Type, item_id: int, soft=True):
         # FK/unique prevents deletion
         return jsonify({"error":"integrity_error","message":str(e.orig)}), 409
 
+
+# --- bulk writes ---
+# One transaction per request; rows are written BULK_BATCH_SIZE at a time as a single
+# executemany inside a SAVEPOINT. A batch that hits an IntegrityError is replayed row by
+# row so only the offending rows fail. Every input row gets a result entry:
+#   {"index": i, "status": 201|200|204, "id": ...}  or
+#   {"index": i, "status": 400|404|409, "error": "...", ...}
+
+BULK_BATCH_SIZE = 500
+
+
+def _chunks(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _bulk_payload_rows(payload, key="items"):
+    rows = payload.get(key) if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        raise ValidationError({key: ["Must be a list."]})
+    return rows
+
+
+def _run_batched(s, entries, run, ok_status):
+    """entries: [(index, params)]; run(list_of_params) -> list of ids (same order)."""
+    results = {}
+    begin_sqlite_transaction(s)
+    for chunk in _chunks(entries, BULK_BATCH_SIZE):
+        try:
+            with s.begin_nested():
+                ids = run([p for _, p in chunk])
+            for (idx, _), obj_id in zip(chunk, ids):
+                results[idx] = {"index": idx, "status": ok_status, "id": obj_id}
+        except IntegrityError:
+            for idx, params in chunk:
+                try:
+                    with s.begin_nested():
+                        obj_id, = run([params])
+                    results[idx] = {"index": idx, "status": ok_status, "id": obj_id}
+                except IntegrityError as e:
+                    results[idx] = {"index": idx, "status": 409, "error": "integrity_error", "message": str(e.orig)}
+    return results
+
+
+def _existing_ids(s: Session, model: Type, ids):
+    found = set()
+    for chunk in _chunks(list(ids), BULK_BATCH_SIZE):
+        found.update(r[0] for r in s.query(model.id).filter(model.id.in_(chunk)))
+    return found
+
+
+def _bulk_response(results, count):
+    ordered = [results[i] for i in range(count)]
+    failed = sum(1 for r in ordered if r["status"] >= 400)
+    return jsonify({"results": ordered, "ok": count - failed, "failed": failed})
+
+
+def bulk_create_items(s: Session, model: Type, schema: Schema, payload):
+    rows = _bulk_payload_rows(payload)
+    results, entries = {}, []
+    for idx, row in enumerate(rows):
+        try:
+            entries.append((idx, schema.load(row)))
+        except ValidationError as e:
+            results[idx] = {"index": idx, "status": 400, "error": "validation_error", "messages": e.messages}
+
+    def run(params):
+        stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+        return s.execute(stmt, params).scalars().all()
+
+    results.update(_run_batched(s, entries, run, 201))
+    return _bulk_response(results, len(rows))
+
+
+def bulk_update_items(s: Session, model: Type, schema: Schema, payload):
+    rows = _bulk_payload_rows(payload)
+    results, entries = {}, []
+    for idx, row in enumerate(rows):
+        row_id = row.get("id") if isinstance(row, dict) else None
+        if type(row_id) is not int:  # bool is an int subclass: {"id": true} is not id 1
+            results[idx] = {"index": idx, "status": 400, "error": "validation_error", "messages": {"id": ["Missing or invalid id."]}}
+            continue
+        try:
+            data = schema.load({k: v for k, v in row.items() if k != "id"}, partial=True)
+        except ValidationError as e:
+            results[idx] = {"index": idx, "status": 400, "error": "validation_error", "messages": e.messages}
+            continue
+        entries.append((idx, dict(data, id=row_id)))
+
+    existing = _existing_ids(s, model, {p["id"] for _, p in entries})
+    for idx, params in entries:
+        if params["id"] not in existing:
+            results[idx] = {"index": idx, "status": 404, "error": "not_found", "id": params["id"]}
+    found = [(idx, p) for idx, p in entries if p["id"] in existing]
+
+    def run(params):
+        # ORM bulk UPDATE by primary key (executemany)
+        s.execute(update(model), params)
+        return [p["id"] for p in params]
+
+    results.update(_run_batched(s, [(idx, p) for idx, p in found if len(p) > 1], run, 200))
+    # rows that only carried an id: nothing to write
+    for idx, params in found:
+        if idx not in results:
+            results[idx] = {"index": idx, "status": 200, "id": params["id"]}
+    return _bulk_response(results, len(rows))
+
+
+def bulk_delete_items(s: Session, model: Type, payload, soft=True):
+    ids = _bulk_payload_rows(payload, key="ids")
+    results, entries = {}, []
+    existing = _existing_ids(s, model, {i for i in ids if type(i) is int})
+    for idx, item_id in enumerate(ids):
+        if type(item_id) is not int:
+            results[idx] = {"index": idx, "status": 400, "error": "validation_error", "messages": {"id": ["Not an integer."]}}
+        elif item_id not in existing:
+            results[idx] = {"index": idx, "status": 404, "error": "not_found", "id": item_id}
+        else:
+            entries.append((idx, item_id))
+
+    def run(chunk_ids):
+        if soft and hasattr(model, "is_deleted"):
+            stmt = update(model).where(model.id.in_(chunk_ids)).values(is_deleted=True, deleted_at=datetime.utcnow())
+        else:
+            stmt = delete(model).where(model.id.in_(chunk_ids))
+        s.execute(stmt.execution_options(synchronize_session=False))
+        return chunk_ids
+
+    results.update(_run_batched(s, entries, run, 204))
+    return _bulk_response(results, len(ids))
@@ -1,6 +1,6 @@
 from contextlib import contextmanager
 from sqlalchemy.orm import sessionmaker, scoped_session, Session
-from .extensions import ENGINE
+from . import extensions as ext
 
 _session_factory = None
 _scoped = None
@@ -8,9 +8,9 @@ _scoped = None
 
 def init_session_factory():
     global _session_factory, _scoped
-    if ENGINE is None:
+    if ext.ENGINE is None:
         raise RuntimeError("ENGINE is not set. Pass an Engine to create_app(engine).")
-    _session_factory = sessionmaker(bind=ENGINE, autoflush=False, expire_on_commit=False)
+    _session_factory = sessionmaker(bind=ext.ENGINE, autoflush=False, expire_on_commit=False)
     _scoped = scoped_session(_session_factory)
 
 
@@ -32,3 +32,14 @@ def session_scope() -> Session:
         raise
     finally:
         s.close()
+
+
+def begin_sqlite_transaction(s: Session):
+    """
+    pysqlite only opens a transaction lazily before DML, so a SAVEPOINT issued first
+    becomes the outer transaction and RELEASE commits it. Call this before using
+    s.begin_nested() to keep everything inside one real transaction.
+    """
+    conn = s.connection()
+    if conn.dialect.name == "sqlite" and not conn.connection.dbapi_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN")
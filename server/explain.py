@@ -0,0 +1,171 @@
+# server/explain.py
+"""
+Query-plan introspection for the generic list endpoints.
+
+explain_plan() runs SQLite's EXPLAIN QUERY PLAN on a built query, and PredicateStats keeps a running count of the filter/sort shapes that
+list_items serves without an index, e.g.
+
+    (("region", "like"), ("portfolio", "eq"), ("name", "sort"))
+
+Both feed the /api/_admin/explain endpoints, which turn the most frequent shapes
+into composite index suggestions (equality columns first, then the sort, then one
+range column — the order a B-tree can use all of them in).
+"""
+import threading
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+from sqlalchemy import String, UniqueConstraint
+
+from .search import indexed_columns
+
+# filter operator -> predicate kind
+_KINDS = {
+    "eq": "eq", "in": "eq", "isnull": "eq",
+    "gt": "range", "gte": "range", "lt": "range", "lte": "range", "between": "range",
+    "ne": "range", "notin": "range",
+}
+
+
+def compile_sql(session, query):
+    """(SQL text, positional params) of an ORM query, IN lists expanded."""
+    compiled = query.statement.compile(
+        dialect=session.get_bind().dialect,
+        compile_kwargs={"render_postcompile": True},
+    )
+    values = compiled.construct_params()
+    return str(compiled), [_plain(values[name]) for name in compiled.positiontup or ()]
+
+
+def _plain(v):
+    # the plan does not depend on bound values, but the driver must accept them
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    return v
+
+
+def explain_plan(session, query):
+    """EXPLAIN QUERY PLAN rows for `query` as [{"id", "parent", "detail"}]."""
+    sql, params = compile_sql(session, query)
+    rows = session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + sql, tuple(params))
+    return [{"id": r[0], "parent": r[1], "detail": r[3]} for r in rows]
+
+
+def plan_warnings(plan):
+    """Full table scans and temp B-tree sorts reported by a plan."""
+    scans, sorts = [], []
+    for step in plan:
+        detail = step["detail"]
+        if detail.startswith("SCAN ") and " USING " not in detail:
+            scans.append(detail[5:].split(" ")[0])
+        elif detail.startswith("USE TEMP B-TREE"):
+            sorts.append(detail)
+    return {"full_scans": scans, "temp_sorts": sorts}
+
+
+@lru_cache(maxsize=None)
+def leading_columns(table) -> frozenset:
+    """Columns that lead some index on `table` (primary key, unique, declared indexes)."""
+    leading = {c.name for c in table.primary_key.columns}
+    for ix in table.indexes:
+        leading.add(ix.columns[0].name)
+    for cons in table.constraints:
+        if isinstance(cons, UniqueConstraint) and len(cons.columns):
+            leading.add(list(cons.columns)[0].name)
+    return frozenset(leading)
+
+
+def predicate_shape(Model, filter_sig, sort_keys):
+    """((column, kind), ...) for a list query; kind ∈ eq | range | like | sort."""
+    cols = Model.__table__.columns
+    shape = []
+    for param, _ in filter_sig:
+        name, sep, op = param.rpartition("__")
+        if sep and name in cols:
+            shape.append((name, _KINDS.get(op, "eq")))
+        elif param in cols:
+            shape.append((param, "like" if isinstance(cols[param].type, String) else "eq"))
+    shape.extend((k, "sort") for k, _ in sort_keys)
+    return tuple(dict.fromkeys(shape))
+
+
+def unindexed(Model, shape):
+    """Entries of `shape` no index can serve (substring filters count as indexed when FTS covers them)."""
+    table = Model.__table__
+    leading = leading_columns(table)
+    out = []
+    for col, kind in shape:
+        if kind == "like":
+            if col in indexed_columns(Model):
+                continue
+            out.append((col, kind))
+        elif col not in leading:
+            out.append((col, kind))
+    return out
+
+
+def suggest_index(table_name, shape):
+    """Composite index for a shape (ESR order), or None when only substring filters are involved."""
+    eq = sorted(c for c, k in shape if k == "eq")
+    srt = [c for c, k in shape if k == "sort"]
+    rng = [c for c, k in shape if k == "range"][:1]
+    cols = list(dict.fromkeys(eq + srt + rng))
+    if not cols or cols == ["id"]:
+        return None
+    name = f"ix_{table_name}_{'_'.join(cols)}"
+    return {"name": name, "columns": cols, "sql": f"CREATE INDEX {name} ON {table_name} ({', '.join(cols)})"}
+
+
+class PredicateStats:
+    """
+    Hit counts for list-query shapes with at least one unindexed predicate.
+    Keeps the `max_shapes` most frequent shapes; the rest are evicted as new ones arrive.
+    """
+
+    def __init__(self, max_shapes: int = 500):
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        self._hits = Counter()  # (Model, shape) -> count
+
+    def record(self, Model, shape):
+        if not shape or not unindexed(Model, shape):
+            return
+        key = (Model, shape)
+        with self._lock:
+            self._hits[key] += 1
+            if len(self._hits) > self.max_shapes:
+                # drop the rarest shape other than the one just seen
+                rarest = min((k for k in self._hits if k != key), key=self._hits.__getitem__)
+                del self._hits[rarest]
+
+    def top(self, n: int = 20):
+        with self._lock:
+            return self._hits.most_common(n)
+
+    def reset(self):
+        with self._lock:
+            self._hits.clear()
+
+
+predicate_stats = PredicateStats()
+
+
+def predicate_report(n: int = 20):
+    """The `n` most frequent unindexed shapes, each with its index suggestion."""
+    report = []
+    for (Model, shape), hits in predicate_stats.top(n):
+        missing = unindexed(Model, shape)
+        report.append({
+            "table": Model.__tablename__,
+            "hits": hits,
+            "predicates": [{"column": c, "kind": k} for c, k in shape],
+            "unindexed": [{"column": c, "kind": k} for c, k in missing],
+            "suggested_index": suggest_index(Model.__tablename__, shape),
+            # substring filters need a trigram index (server/search.py), not a B-tree
+            "search_index": [c for c, k in missing if k == "like"],
+        })
+    return report
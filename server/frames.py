@@ -0,0 +1,59 @@
+# server/frames.py
+"""
+Framed encodings for responses streamed section by section
+(GET /api/focus-bundle?format=ndjson|msgpack).
+
+Every frame is one {"section": name, "items": rows} map. NDJSON writes one frame per
+line; MessagePack concatenates them (msgpack.Unpacker reads them back one at a time).
+
+MessagePack frames can also carry a section column by column, for the large numeric
+ones (exposure snapshots):
+
+    {"section": "exposures",
+     "columns": {"id": [...], "as_of_date": ["2024-03-31", ...], "ead": [1234567, ...], ...},
+     "scale": {"ead": 2, ..., "pd": 4, "fx_to_reporting": 8}}
+
+Numeric columns travel as integers scaled by 10**scale (ead 12345.67 -> 1234567):
+exact, since every Numeric(18, s) value fits an int64, and a fraction of the size
+of the decimal strings used in JSON.
+"""
+import json
+from datetime import date
+
+try:
+    import msgpack
+except ImportError:  # optional: only format=msgpack needs it
+    msgpack = None
+
+from sqlalchemy import Numeric
+
+MIMETYPES = {"ndjson": "application/x-ndjson", "msgpack": "application/x-msgpack"}
+
+
+def available(fmt: str) -> bool:
+    return fmt == "ndjson" or (fmt == "msgpack" and msgpack is not None)
+
+
+def encode(fmt: str, frame: dict):
+    """One frame in `fmt` (str for ndjson, bytes for msgpack)."""
+    if fmt == "msgpack":
+        return msgpack.packb(frame, use_bin_type=True)
+    return json.dumps(frame, separators=(",", ":")) + "\n"
+
+
+def columnar(Model, names, rows):
+    """{"columns": {name: [values]}, "scale": {name: scale}} for ORM `rows` of `Model`."""
+    table_cols = Model.__table__.columns
+    scale = {
+        n: table_cols[n].type.scale or 0
+        for n in names if n in table_cols and isinstance(table_cols[n].type, Numeric)
+    }
+    columns = {}
+    for n in names:
+        values = [getattr(r, n) for r in rows]
+        if n in scale:
+            values = [None if v is None else int(v.scaleb(scale[n]).to_integral_value()) for v in values]
+        else:
+            values = [v.isoformat() if isinstance(v, date) else v for v in values]
+        columns[n] = values
+    return {"columns": columns, "scale": scale}
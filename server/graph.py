@@ -0,0 +1,357 @@
+# server/graph.py
+"""
+Process-wide index of the interlinkage network, kept in memory.
+
+Legal entities, projects and interlinkages are integer nodes; every live interlinkage
+contributes a star of undirected edges to its sponsor, counterparty and booking
+entity, its project, and the project of each of its live interdependences. Adjacency
+is stored in compressed sparse row form, as flat typed arrays:
+
+    indptr[u] .. indptr[u + 1]    slice of node u's edges in
+    indices / roles / refs        neighbour node, role code (ROLES), interdependence id (or 0)
+
+so a neighbourhood is one slice and a walk touches no ORM object and runs no SQL.
+
+Every edge has exactly one interlinkage end, so the graph is the union of the
+interlinkage stars. The write views patch it incrementally (GraphIndex.patch with the
+ids they wrote): a rewritten interlinkage's star is masked out of the arrays and its
+new edges go to a small overlay, folded back into fresh arrays once it grows past
+COMPACT_EDGES (or an eighth of the graph). Soft-deleted entities and projects stay
+in the arrays but are skipped by traversals.
+
+The index remembers the table_versions it reflects. A patch applies only when the
+versions moved by exactly the rows it was handed; otherwise (seed scripts, other
+processes) it rebuilds from SQL, as does any read that finds the versions moved.
+"""
+import logging
+import threading
+from array import array
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from . import models as m
+from .database import session_scope
+from .versions import table_versions
+
+GRAPH_MODELS = (m.Interlinkage, m.Interdependence, m.LegalEntity, m.Project)
+GRAPH_TABLES = tuple(M.__tablename__ for M in GRAPH_MODELS)
+
+ROLES = ("sponsor", "counterparty", "booking", "project", "interdependence")
+_ROLE_CODE = {r: i for i, r in enumerate(ROLES)}
+_SPONSOR, _COUNTERPARTY, _BOOKING, _PROJECT, _INTERDEP = range(len(ROLES))
+
+COMPACT_EDGES = 4096  # overlay size that triggers a compaction
+
+log = logging.getLogger(__name__)
+
+
+def _live(Model):
+    return Model.is_deleted == False  # noqa: E712
+
+
+class GraphIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._versions = None          # table versions the index reflects; None = not built
+        self._reset()
+
+    def _reset(self):
+        self._index = {}               # (kind, id) -> node
+        self._keys = []                # node -> (kind, id)
+        self._hidden = set()           # soft-deleted entity/project nodes
+        self._dep_owner = {}           # interdependence id -> interlinkage id
+        self.indptr = array("q", [0])
+        self.indices = array("q")
+        self.roles = array("b")
+        self.refs = array("q")
+        self._stale = set()            # interlinkage nodes whose array edges are masked
+        self._extra = defaultdict(list)  # node -> [(neighbour, role, ref)] added since the last compaction
+        self._extra_edges = 0
+
+    # --- building ---
+
+    def _node(self, kind, node_id):
+        key = (kind, node_id)
+        u = self._index.get(key)
+        if u is None:
+            u = self._index[key] = len(self._keys)
+            self._keys.append(key)
+        return u
+
+    def _star(self, il, deps):
+        """[(neighbour, role, ref)] of interlinkage row `il` and its live interdependence rows."""
+        edges = [
+            (self._node("entity", il.sponsor_id), _SPONSOR, 0),
+            (self._node("entity", il.counterparty_id), _COUNTERPARTY, 0),
+            (self._node("project", il.project_id), _PROJECT, 0),
+        ]
+        if il.booking_entity_id is not None:
+            edges.append((self._node("entity", il.booking_entity_id), _BOOKING, 0))
+        for d in deps:
+            self._dep_owner[d.id] = il.id
+            if d.project_id is not None:
+                edges.append((self._node("project", d.project_id), _INTERDEP, d.id))
+        return edges
+
+    def _stars(self, s, il_ids=None):
+        """{interlinkage id: star} for the live interlinkages (all, or those in `il_ids`)."""
+        IL, D = m.Interlinkage, m.Interdependence
+        il_q = select(IL.id, IL.sponsor_id, IL.counterparty_id, IL.booking_entity_id, IL.project_id).where(_live(IL))
+        dep_q = (select(D.id, D.interlinkage_id, D.project_id)
+                 .join_from(D, IL, IL.id == D.interlinkage_id).where(_live(D), _live(IL)))
+        if il_ids is not None:
+            il_q = il_q.where(IL.id.in_(il_ids))
+            dep_q = dep_q.where(D.interlinkage_id.in_(il_ids))
+        deps = defaultdict(list)
+        for d in s.execute(dep_q):
+            deps[d.interlinkage_id].append(d)
+        return {il.id: self._star(il, deps[il.id]) for il in s.execute(il_q)}
+
+    def _hide(self, s, Model, kind, ids=None):
+        q = select(Model.id, Model.is_deleted)
+        if ids is not None:
+            q = q.where(Model.id.in_(ids))
+        for row_id, deleted in s.execute(q):
+            u = self._node(kind, row_id)
+            if deleted:
+                self._hidden.add(u)
+            else:
+                self._hidden.discard(u)
+
+    def build(self, s):
+        """(Re)load the whole graph from SQL."""
+        with self._lock:
+            self._reset()
+            versions = table_versions(s, GRAPH_TABLES)
+            self._hide(s, m.LegalEntity, "entity")
+            self._hide(s, m.Project, "project")
+            stars = self._stars(s)
+            self._compact({self._node("interlinkage", il_id): star for il_id, star in stars.items()})
+            self._versions = versions
+        return self
+
+    def _compact(self, stars):
+        """Rebuild the CSR arrays from {interlinkage node: star}, emptying the overlay."""
+        n = len(self._keys)
+        degree = [0] * (n + 1)
+        for u, star in stars.items():
+            degree[u + 1] += len(star)
+            for v, _, _ in star:
+                degree[v + 1] += 1
+        for u in range(n):
+            degree[u + 1] += degree[u]
+        size = degree[n]
+        indices, roles, refs = array("q", bytes(8 * size)), array("b", bytes(size)), array("q", bytes(8 * size))
+        pos = degree[:n]
+        for u, star in stars.items():
+            for v, role, ref in star:
+                for a, b in ((u, v), (v, u)):
+                    k = pos[a]
+                    indices[k], roles[k], refs[k] = b, role, ref
+                    pos[a] = k + 1
+        self.indptr, self.indices, self.roles, self.refs = array("q", degree), indices, roles, refs
+        self._stale.clear()
+        self._extra.clear()
+        self._extra_edges = 0
+
+    def _current_stars(self):
+        stars = {}
+        for u, (kind, _) in enumerate(self._keys):
+            if kind == "interlinkage":
+                star = list(self._edges(u))
+                if star:
+                    stars[u] = star
+        return stars
+
+    # --- incremental patches ---
+
+    def patch(self, Model, ids):
+        """
+        Reflect a committed write of `ids` rows of `Model` (called by the write views).
+
+        Each written row bumps its table's version once, so the patch applies only
+        when the graph tables moved by exactly that much since the index last synced.
+        Any other movement (another process, a seed script, a concurrent write)
+        triggers a full rebuild; none at all means a rebuild already picked the write up.
+        No-op before the first build. On error the index is dropped (and logged), and
+        the next read rebuilds it.
+        """
+        ids = [i for i in ids if isinstance(i, int)]
+        if not ids or Model not in GRAPH_MODELS:
+            return
+        with self._lock:
+            if self._versions is None:
+                return
+            try:
+                with session_scope() as s:
+                    # versions first: a write landing in between makes them look stale, not current
+                    versions = table_versions(s, GRAPH_TABLES)
+                    moved = {t: versions.get(t, 0) - self._versions.get(t, 0) for t in GRAPH_TABLES}
+                    if not any(moved.values()):
+                        return
+                    expected = dict.fromkeys(GRAPH_TABLES, 0)
+                    expected[Model.__tablename__] = len(ids)
+                    if moved != expected:
+                        self.build(s)
+                        return
+                    if Model is m.LegalEntity:
+                        self._hide(s, Model, "entity", ids)
+                    elif Model is m.Project:
+                        self._hide(s, Model, "project", ids)
+                    else:
+                        if Model is m.Interdependence:
+                            owners = {self._dep_owner.pop(i) for i in ids if i in self._dep_owner}
+                            owners |= set(s.scalars(select(m.Interdependence.interlinkage_id)
+                                                    .where(m.Interdependence.id.in_(ids))))
+                            ids = sorted(owners)
+                        self._restar(s, ids)
+                    self._versions = versions
+            except Exception:
+                log.exception("graph index patch of %s %s failed; dropping the index", Model.__tablename__, ids)
+                self._versions = None
+                self._reset()
+
+    def _restar(self, s, il_ids):
+        stars = self._stars(s, il_ids)
+        for il_id in il_ids:
+            u = self._node("interlinkage", il_id)
+            for v, role, ref in self._extra.pop(u, ()):
+                self._extra[v].remove((u, role, ref))
+                self._extra_edges -= 1
+                if ref:
+                    self._dep_owner.pop(ref, None)
+            if u < len(self.indptr) - 1 and u not in self._stale:
+                for k in range(self.indptr[u], self.indptr[u + 1]):
+                    self._dep_owner.pop(self.refs[k], None)
+                self._stale.add(u)
+            for v, role, ref in stars.get(il_id, ()):
+                self._extra[u].append((v, role, ref))
+                self._extra[v].append((u, role, ref))
+                self._extra_edges += 1
+            if ref_ids := [ref for _, _, ref in stars.get(il_id, ()) if ref]:
+                self._dep_owner.update(dict.fromkeys(ref_ids, il_id))
+        if self._extra_edges + len(self._stale) > max(COMPACT_EDGES, len(self.indices) // 16):
+            self._compact(self._current_stars())
+
+    # --- reads ---
+
+    def ensure(self, s):
+        """The index, rebuilt first when the graph tables moved since it was built or patched."""
+        with self._lock:
+            if self._versions is None or table_versions(s, GRAPH_TABLES) != self._versions:
+                self.build(s)
+        return self
+
+    def _edges(self, u):
+        """(neighbour, role, ref) of node `u`, overlay included, masked edges skipped."""
+        if u < len(self.indptr) - 1 and u not in self._stale:
+            stale = self._stale
+            for k in range(self.indptr[u], self.indptr[u + 1]):
+                v = self.indices[k]
+                if v not in stale:
+                    yield v, self.roles[k], self.refs[k]
+        extra = self._extra.get(u)
+        if extra:
+            yield from extra
+
+    def neighbours(self, s, kind, node_id, roles=None):
+        """
+        [(kind, id, role, interdependence id or None)] adjacent to a node, soft-deleted
+        entities/projects excluded; `roles` restricts to some of ROLES. None for an unknown node.
+        """
+        codes = None if roles is None else {_ROLE_CODE[r] for r in roles}
+        with self._lock:
+            self.ensure(s)
+            u = self._index.get((kind, node_id))
+            if u is None or u in self._hidden:
+                return None
+            edges = [(v, role, ref) for v, role, ref in self._edges(u) if v not in self._hidden]
+            if kind == "interlinkage" and not edges:
+                return None  # deleted: live interlinkages always have a sponsor, counterparty and project
+            return sorted(
+                self._keys[v] + (ROLES[role], ref or None)
+                for v, role, ref in edges if codes is None or role in codes
+            )
+
+    def reach(self, s, seeds, depth: int, max_nodes: int, max_edges: int):
+        """
+        ({(kind, id): hop}, truncated, {(kind, id): seeds}) for every node within
+        `depth` hops of `seeds` ((kind, id) pairs, hop 0). An entity/project at hop
+        h < depth pulls in its interlinkages at hop h, whose other ends sit at hop h + 1.
+        At most `max_nodes` nodes are kept (nearest first, then by kind and id) and
+        `max_edges` edges walked; `truncated` tells whether either budget was hit. The
+        seeds of a node are those it is nearest to: every seed with a shortest path to it.
+        """
+        with self._lock:
+            self.ensure(s)
+            hops, origins, frontier = {}, {}, []
+            for key in seeds:
+                u = self._index.get(key)
+                if u is not None and u not in hops:
+                    hops[u] = 0
+                    origins[u] = {key}
+                    frontier.append(u)
+            walked, truncated, keys = 0, False, self._keys
+            for hop in range(depth + 1):
+                # nodes at `hop` pull in their interlinkages at `hop`, whose other ends sit at hop + 1
+                ils = [u for u in frontier if keys[u][0] == "interlinkage"]
+                if hop < depth:
+                    for u in frontier:
+                        if keys[u][0] == "interlinkage":
+                            continue
+                        for v, _, _ in self._edges(u):
+                            walked += 1
+                            if v not in hops:
+                                hops[v] = hop
+                                origins[v] = set(origins[u])
+                                ils.append(v)
+                            elif hops[v] == hop:
+                                origins[v] |= origins[u]
+                nxt = []
+                for u in ils:
+                    for v, _, _ in self._edges(u):
+                        walked += 1
+                        if v not in hops and v not in self._hidden:
+                            hops[v] = hop + 1
+                            origins[v] = set(origins[u])
+                            nxt.append(v)
+                        elif hops.get(v) == hop + 1:
+                            origins[v] |= origins[u]
+                if walked >= max_edges:
+                    truncated = True
+                    break
+                frontier = nxt
+                if not frontier:
+                    break
+            ranked = sorted((h, keys[u], u) for u, h in hops.items())
+        truncated = truncated or len(ranked) > max_nodes
+        kept = ranked[:max_nodes]
+        return {key: h for h, key, _ in kept}, truncated, {key: frozenset(origins[u]) for _, key, u in kept}
+
+    def version(self, s):
+        """The table versions the (up to date) index reflects, as a hashable key."""
+        with self._lock:
+            self.ensure(s)
+            return tuple(sorted(self._versions.items()))
+
+    def snapshot(self, s):
+        """
+        (version, keys, hidden, indptr, indices) of the whole graph for batch
+        algorithms, overlay folded in first; the arrays are replaced, never mutated,
+        by later patches, so the caller may use them without the lock.
+        """
+        with self._lock:
+            self.ensure(s)
+            if self._extra_edges or self._stale:
+                self._compact(self._current_stars())
+            return (tuple(sorted(self._versions.items())), list(self._keys), frozenset(self._hidden),
+                    self.indptr, self.indices)
+
+    def invalidate(self):
+        with self._lock:
+            self._versions = None
+            self._reset()
+
+
+graph_index = GraphIndex()
@@ -0,0 +1,228 @@
+# server/jobs.py
+"""
+Background analysis jobs, with no broker: the analysis_jobs table is the queue
+record and result store, a bounded thread pool runs them.
+
+A job replays an analysis endpoint's POST body through the view function itself, in
+a request context of its own, and stores the status code and JSON body the view
+answered with. Submitting the same kind and body again while the tables it reads
+are unchanged (table_versions, see server/versions.py) returns the existing job, so
+finished results double as a cache (same day only, for analyses relative to today).
+
+Jobs of this process signal completion through an Event, so long-polls wake up
+immediately; jobs of other processes are polled. Each job records its owner
+("host:pid") and a heartbeat the owner refreshes while the job is pending;
+recover_jobs() (at startup) fails only the jobs whose owner is gone: a dead pid on
+this host, or a heartbeat older than STALE_AFTER. submit() applies the same test to
+the pending job it would reuse, and fails it and queues a new one if it is orphaned.
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from . import models as m
+from .database import session_scope
+from .versions import table_versions
+
+JOB_WORKERS = 2
+MAX_PENDING = 50                     # queued + running in this process
+JOB_RETENTION = timedelta(days=7)    # finished jobs older than this are purged
+POLL_INTERVAL = 0.25                 # seconds, for jobs of other processes
+HEARTBEAT_INTERVAL = 10              # seconds between heartbeats of pending jobs
+STALE_AFTER = timedelta(seconds=60)  # a pending job without heartbeat for this long is orphaned
+
+log = logging.getLogger(__name__)
+
+# tables an analysis result depends on
+JOB_TABLES = (
+    "interlinkages", "interdependences", "exposure_snapshots", "latest_exposures",
+    "projects", "legal_entities", "ref_currencies", "ref_sectors", "ref_countries",
+)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _cache_key(s, kind, params_json, dated=False):
+    versions = table_versions(s, JOB_TABLES)
+    h = hashlib.sha1(f"{kind}|{params_json}|".encode())
+    if dated:
+        # windows and buckets default to today: a result is only reusable the same day
+        h.update(f"today={date.today().isoformat()};".encode())
+    for t in JOB_TABLES:
+        h.update(f"{t}={versions.get(t, 0)};".encode())
+    return h.hexdigest()
+
+
+def _owner():
+    # per call: a forked worker has its own pid
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_gone(owner, host):
+    """Whether `owner` ("host:pid") is a process of this host that no longer runs."""
+    owner_host, _, pid = (owner or "").rpartition(":")
+    if owner_host != host or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False  # exists, owned by another user
+    return False
+
+
+def _fail_orphans(s, job_ids, now):
+    s.query(m.AnalysisJob).filter(m.AnalysisJob.id.in_(job_ids)).update(
+        {"status": "failed", "error": "interrupted (owner process gone)", "finished_at": now},
+        synchronize_session=False)
+
+
+def job_status(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "status_code": job.status_code,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobRunner:
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pool = None
+        self._heartbeat = None
+        self._events = {}  # job id -> Event, for the jobs of this process
+
+    def submit(self, app, kind, params, view, path, dated=False):
+        """
+        (job status, created) for `view` run on `params`: an existing queued, running
+        or done job when one matches, else a new queued job. `dated` views answer
+        relative to today's date, so their jobs only match on the same day.
+        """
+        params_json = json.dumps(params, sort_keys=True, separators=(",", ":"))
+        with session_scope() as s:
+            key = _cache_key(s, kind, params_json, dated)
+            job = (s.query(m.AnalysisJob)
+                   .filter(m.AnalysisJob.cache_key == key, m.AnalysisJob.status != "failed")
+                   .order_by(m.AnalysisJob.created_at.desc()).first())
+            if job is not None and self._orphaned(job.id, job.status, job.owner, job.heartbeat_at, job.created_at):
+                _fail_orphans(s, [job.id], datetime.utcnow())
+                job = None
+            if job is not None:
+                return job_status(job), False
+            with self._lock:
+                if len(self._events) >= self.max_pending:
+                    raise QueueFull()
+                job = m.AnalysisJob(id=uuid.uuid4().hex, kind=kind, params=params_json, cache_key=key, status="queued",
+                                    owner=_owner(), heartbeat_at=datetime.utcnow())
+                s.add(job)
+                s.flush()
+                self._events[job.id] = threading.Event()
+            s.query(m.AnalysisJob).filter(m.AnalysisJob.finished_at < datetime.utcnow() - JOB_RETENTION).delete()
+            status = job_status(job)
+        # submitted after commit, so the worker sees the row
+        self._executor().submit(self._run, app, job.id, params, view, path)
+        return status, True
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis-job")
+                self._heartbeat = threading.Thread(target=self._beat, name="analysis-job-heartbeat", daemon=True)
+                self._heartbeat.start()
+            return self._pool
+
+    def _beat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                pending = list(self._events)
+            if not pending:
+                continue
+            try:
+                with session_scope() as s:
+                    s.query(m.AnalysisJob).filter(m.AnalysisJob.id.in_(pending)) \
+                        .update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+            except Exception:
+                log.exception("analysis job heartbeat failed")  # next beat retries, well within STALE_AFTER
+
+    def _run(self, app, job_id, params, view, path):
+        now = datetime.utcnow()
+        self._update(job_id, status="running", started_at=now, heartbeat_at=now)
+        try:
+            with app.test_request_context(path, method="POST", json=params):
+                resp = app.make_response(view())
+            self._update(job_id, status="done", status_code=resp.status_code,
+                         result=resp.get_data(as_text=True), finished_at=datetime.utcnow())
+        except Exception as e:
+            self._update(job_id, status="failed", error=f"{type(e).__name__}: {e}", finished_at=datetime.utcnow())
+        finally:
+            with self._lock:
+                event = self._events.pop(job_id, None)
+            if event is not None:
+                event.set()
+
+    def _update(self, job_id, **values):
+        with session_scope() as s:
+            s.query(m.AnalysisJob).filter(m.AnalysisJob.id == job_id).update(values)
+
+    def get(self, job_id, wait: float = 0):
+        """The job's status (waiting up to `wait` seconds for it to finish), or None."""
+        deadline = time.monotonic() + wait
+        event = self._events.get(job_id)
+        if event is not None and wait > 0:
+            event.wait(wait)
+        while True:
+            with session_scope() as s:
+                job = s.get(m.AnalysisJob, job_id)
+                if job is None:
+                    return None
+                if job.status in ("done", "failed") or time.monotonic() >= deadline:
+                    return job_status(job)
+            time.sleep(min(POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+
+    def result(self, job_id):
+        """(status, status_code, result JSON text) of a job, or None."""
+        with session_scope() as s:
+            job = s.get(m.AnalysisJob, job_id)
+            if job is None:
+                return None
+            return job_status(job), job.status_code, job.result
+
+    def _orphaned(self, job_id, status, owner, beat, created):
+        """Whether a queued/running job is not this process's and its owner is gone."""
+        if status not in ("queued", "running"):
+            return False
+        with self._lock:
+            if job_id in self._events:
+                return False
+        return _owner_gone(owner, socket.gethostname()) or (beat or created) < datetime.utcnow() - STALE_AFTER
+
+    def recover_jobs(self):
+        """Fail the queued/running jobs whose owning process is gone (dead pid here, or no recent heartbeat)."""
+        with session_scope() as s:
+            pending = s.query(m.AnalysisJob.id, m.AnalysisJob.status, m.AnalysisJob.owner,
+                              m.AnalysisJob.heartbeat_at, m.AnalysisJob.created_at) \
+                .filter(m.AnalysisJob.status.in_(("queued", "running"))).all()
+            orphans = [row.id for row in pending if self._orphaned(*row)]
+            if orphans:
+                _fail_orphans(s, orphans, datetime.utcnow())
+
+
+job_runner = JobRunner()
@@ -0,0 +1,43 @@
+# server/loading.py
+"""
+Relationship loading profiles, one per endpoint.
+
+Some mappings carry eager defaults (Interlinkage.interdependences / .analysis are
+lazy="selectin", InterlinkageAnalysis.interlinkage and Interdependence.project are
+lazy="joined"), so any query for those models pays for relations nobody asked for.
+Endpoints instead apply their profile: every relationship is switched to lazy
+loading, and only the relations the endpoint actually reads are batch-loaded
+(selectinload, itself without further eager loads).
+
+    s.query(m.Interlinkage).options(*loader_options("focus_bundle", m.Interlinkage))
+"""
+from sqlalchemy.orm import lazyload, selectinload
+
+from . import models as m
+
+# profile -> {Model: relationships the endpoint reads}; unlisted models load columns only
+LOADER_PROFILES = {
+    # generic list/get/export (server/crud.py); ?expand= adds its own batched loads
+    "resource": {},
+    "focus_bundle": {
+        m.Interlinkage: ("interdependences", "attachments", "notes", "workflow_events", "analysis"),
+    },
+    "analysis.concentration": {},
+    "analysis.expiry": {},
+}
+
+
+def batched(attr):
+    """selectinload of one relationship attribute, with the target's own eager defaults off."""
+    return selectinload(attr).lazyload("*")
+
+
+def loader_options(profile: str, Model, without=()):
+    """Query options for `Model` under `profile`, minus the relationships in `without`."""
+    rels = [r for r in LOADER_PROFILES[profile].get(Model, ()) if r not in without]
+    return columns_only() + [batched(getattr(Model, r)) for r in rels]
+
+
+def columns_only():
+    """Options for a query that reads no relationship at all."""
+    return [lazyload("*")]
@@ -7,7 +7,7 @@ from typing import Optional
 
 from sqlalchemy import (
     Column, Integer, String, Date, DateTime, Numeric, Text, Enum, ForeignKey,
-    UniqueConstraint, Index, CheckConstraint, Boolean
+    UniqueConstraint, Index, CheckConstraint, Boolean, text
 )
 from sqlalchemy.orm import relationship, validates
 from server.extensions import Base
@@ -410,3 +410,101 @@ class InterlinkageSourceMap(Base):
     raw_payload_ref = Column(String(1024), nullable=True)  # pointer to full raw message/file
 
     __table_args__ = (UniqueConstraint("interlinkage_id", "import_batch_id", name="uq_interlinkage_batch"),)
+
+
+# -----------------------------------------------------------------------------
+# Background analysis jobs (see server/jobs.py)
+# -----------------------------------------------------------------------------
+JOB_STATUS = ("queued", "running", "done", "failed")
+
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String(32), primary_key=True)             # uuid4 hex
+    kind = Column(String(64), nullable=False, index=True)
+    params = Column(Text, nullable=False)                  # canonical JSON of the request body
+    cache_key = Column(String(40), nullable=False, index=True)  # kind + params + data versions
+
+    status = Column(Enum(*JOB_STATUS, name="analysis_job_status_enum", validate_strings=True), nullable=False, default="queued", index=True)
+    status_code = Column(Integer)                          # HTTP status the analysis answered with
+    result = Column(Text)                                  # JSON body it answered with
+    error = Column(Text)
+
+    owner = Column(String(128))                            # "host:pid" of the process that queued it
+    heartbeat_at = Column(DateTime)                        # refreshed by that process while pending
+
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime, index=True)
+
+
+# -----------------------------------------------------------------------------
+# Read models (maintained by SQLite triggers, see server/readmodels.py)
+# -----------------------------------------------------------------------------
+class LatestExposure(Base):
+    """
+    The most recent live ExposureSnapshot of each interlinkage (by as_of_date).
+    """
+    __tablename__ = "latest_exposures"
+
+    interlinkage_id = Column(Integer, primary_key=True)
+    snapshot_id = Column(Integer, ForeignKey("exposure_snapshots.id", ondelete="CASCADE"), nullable=False, unique=True)
+    as_of_date = Column(Date, nullable=False)
+
+
+class ExposureDaily(Base):
+    """
+    Live snapshots of live interlinkages summed per (as_of_date, project, currency), in
+    reporting-currency cents (measure * fx_to_reporting, rounded per snapshot);
+    <measure>_n counts the rows that had both an amount and a rate.
+    """
+    __tablename__ = "exposure_daily"
+
+    as_of_date = Column(Date, primary_key=True)
+    project_id = Column(Integer, primary_key=True)
+    currency_id = Column(Integer, primary_key=True)
+    snapshots = Column(Integer, nullable=False, default=0)
+    unconverted = Column(Integer, nullable=False, default=0)  # snapshots without fx_to_reporting
+    ead_cents = Column(Integer)
+    ead_n = Column(Integer, nullable=False, default=0)
+    undrawn_cents = Column(Integer)
+    undrawn_n = Column(Integer, nullable=False, default=0)
+    mtm_cents = Column(Integer)
+    mtm_n = Column(Integer, nullable=False, default=0)
+    pnl_cents = Column(Integer)
+    pnl_n = Column(Integer, nullable=False, default=0)
+    rwa_cents = Column(Integer)
+    rwa_n = Column(Integer, nullable=False, default=0)
+
+
+# -----------------------------------------------------------------------------
+# Change tracking (maintained by SQLite triggers, see server/versions.py)
+# -----------------------------------------------------------------------------
+class TableVersion(Base):
+    """
+    Monotonic per-table write counter; bumped on every INSERT/UPDATE/DELETE.
+    """
+    __tablename__ = "table_versions"
+
+    table_name = Column(String(128), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class ChangeLog(Base):
+    """
+    One row per INSERT/UPDATE/DELETE on a change-tracked table, numbered in commit order.
+    """
+    __tablename__ = "change_log"
+
+    seq = Column(Integer, primary_key=True)
+    table_name = Column(String(128), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    op = Column(String(1), nullable=False)       # I / U / D
+    scope = Column(Text)                         # D only: JSON of the deleted row's parent keys
+    changed_at = Column(DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+
+    __table_args__ = (
+        Index("ix_change_log_table_seq", "table_name", "seq"),
+        {"sqlite_autoincrement": True},  # seq never goes back, even once the log is pruned
+    )
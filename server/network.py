@@ -0,0 +1,156 @@
+# server/network.py
+"""
+Book-wide network metrics over the graph index (server/graph.py), for
+POST /api/analysis/network-metrics:
+
+  - connected components (breadth-first over the CSR arrays),
+  - degree and weighted degree of each legal entity / project (distinct live
+    interlinkages, weighted by count, converted notional or latest EAD),
+  - approximate betweenness centrality: Brandes' accumulation from `samples`
+    sources drawn with a fixed seed, scaled by n / samples (exact when every node
+    is a source).
+
+Soft-deleted entities and projects are left out, and parallel edges (an entity
+that is both sponsor and counterparty) count once. Results are cached per
+(graph version, weight versions, weight, samples, seed), so repeated calls on an
+unchanged book cost one version lookup.
+"""
+import random
+import threading
+from collections import OrderedDict, deque
+
+from .graph import graph_index
+from .queries import interlinkage_weights
+from .versions import table_versions
+
+DEFAULT_SAMPLES = 64
+MAX_SAMPLES = 2048
+SAMPLE_SEED = 0
+CACHE_SIZE = 8
+
+# tables the weighted degree reads besides the graph
+WEIGHT_TABLES = ("exposure_snapshots", "latest_exposures")
+
+
+class NetworkMetrics:
+    """Metrics of one graph snapshot; nodes are the index's integer nodes."""
+
+    def __init__(self, version, keys, components, degree, weights, weighted, betweenness, exact):
+        self.version = version
+        self.keys = keys                # node -> (kind, id)
+        self.components = components    # [[node, ...]] largest first
+        self.component_of = {u: c for c, members in enumerate(components) for u in members}
+        self.degree = degree            # node -> distinct live neighbours (nodes without any are left out)
+        self.weights = weights          # interlinkage node -> weight (None: no amount/rate)
+        self.weighted = weighted        # entity/project node -> summed weight of its interlinkages
+        self.betweenness = betweenness  # node -> estimated betweenness
+        self.unweighted = sum(1 for w in weights.values() if w is None)
+        self.exact = exact
+
+
+def _simple_adjacency(keys, hidden, indptr, indices):
+    """{node: sorted distinct live neighbours} for the nodes that have any."""
+    adj = {}
+    for u in range(len(indptr) - 1):
+        if u in hidden:
+            continue
+        nbrs = {indices[k] for k in range(indptr[u], indptr[u + 1])} - hidden
+        if nbrs:
+            adj[u] = sorted(nbrs)
+    return adj
+
+
+def _components(adj):
+    seen, out = set(), []
+    for root in adj:
+        if root in seen:
+            continue
+        seen.add(root)
+        members, queue = [root], deque([root])
+        while queue:
+            for v in adj[queue.popleft()]:
+                if v not in seen:
+                    seen.add(v)
+                    members.append(v)
+                    queue.append(v)
+        out.append(members)
+    out.sort(key=lambda c: (-len(c), min(c)))
+    return out
+
+
+def _betweenness(adj, sources):
+    """Brandes' dependency accumulation from each source (unweighted shortest paths)."""
+    bc = dict.fromkeys(adj, 0.0)
+    for src in sources:
+        order, preds = [], {src: []}
+        sigma, dist = {src: 1}, {src: 0}
+        queue = deque([src])
+        while queue:
+            u = queue.popleft()
+            order.append(u)
+            for v in adj[u]:
+                if v not in dist:
+                    dist[v] = dist[u] + 1
+                    sigma[v] = 0
+                    preds[v] = []
+                    queue.append(v)
+                if dist[v] == dist[u] + 1:
+                    sigma[v] += sigma[u]
+                    preds[v].append(u)
+        delta = dict.fromkeys(order, 0.0)
+        for w in reversed(order):
+            for u in preds[w]:
+                delta[u] += sigma[u] / sigma[w] * (1 + delta[w])
+            if w != src:
+                bc[w] += delta[w]
+    return bc
+
+
+def compute(snapshot, weights, samples: int, seed: int = SAMPLE_SEED):
+    version, keys, hidden, indptr, indices = snapshot
+    adj = _simple_adjacency(keys, hidden, indptr, indices)
+    nodes = sorted(adj)
+    exact = samples >= len(nodes)
+    sources = nodes if exact else random.Random(seed).sample(nodes, samples)
+    bc = _betweenness(adj, sources)
+    # undirected: every path is found from both ends when all nodes are sources
+    scale = 0.5 * (len(nodes) / len(sources) if sources else 0)
+    weight_of = {u: weights.get(keys[u][1]) for u in nodes if keys[u][0] == "interlinkage"}
+    weighted = {u: sum(weight_of[v] or 0.0 for v in adj[u]) for u in nodes if u not in weight_of}
+    return NetworkMetrics(
+        version, keys, _components(adj), {u: len(adj[u]) for u in nodes}, weight_of, weighted,
+        {u: bc[u] * scale for u in nodes}, exact,
+    )
+
+
+class MetricsCache:
+    """The last CACHE_SIZE computed metrics, keyed by graph/weight versions and parameters."""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, s, weight: str, samples: int, seed: int = SAMPLE_SEED):
+        weight_versions = () if weight == "count" else tuple(sorted(table_versions(s, WEIGHT_TABLES).items()))
+        key = (graph_index.version(s), weight_versions, weight, samples, seed)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        snapshot = graph_index.snapshot(s)
+        if weight == "count":
+            weights = {i: 1.0 for kind, i in snapshot[1] if kind == "interlinkage"}
+        else:
+            weights = dict(interlinkage_weights(s, weight))
+        metrics = compute(snapshot, weights, samples, seed)
+        key = (snapshot[0],) + key[1:]
+        with self._lock:
+            self._entries[key] = metrics
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return metrics
+
+
+metrics_cache = MetricsCache()
@@ -0,0 +1,337 @@
+# server/queries.py
+"""
+Query helpers shared by the bundle and analysis endpoints.
+
+IN lists are bound one parameter per value, and SQLite caps the number of bound
+parameters per statement (999 before 3.32, 32766 since; lower on some builds), so
+id sets of unbounded size are sent IN_CHUNK_SIZE at a time and the results merged.
+
+latest_exposures() returns the last N snapshots of each interlinkage with
+
+    SELECT ... FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY interlinkage_id
+                                      ORDER BY as_of_date DESC) AS rn
+        FROM exposure_snapshots WHERE interlinkage_id IN (...)
+    ) ranked JOIN exposure_snapshots ON ... WHERE rn <= N
+
+which SQLite answers with one interlinkage_id index seek per id, instead of pulling
+every (interlinkage_id, as_of_date) pair of the scope back into Python. The latest
+snapshot alone (n=1) comes from the latest_exposures read model instead
+(server/readmodels.py).
+
+dependency_clusters() groups the interdependences of the whole book by identifier /
+type / level with GROUP BY ... HAVING COUNT(DISTINCT interlinkage_id) >= N, one
+page of clusters at a time; cluster_interlinkage_ids() pages through one cluster.
+
+exposure_rollup() sums converted snapshot amounts by date x dimension from the
+exposure_daily read model (one row per date, project and currency, kept current by
+triggers), falling back to aggregating exposure_snapshots when it is not installed;
+either way only the aggregated cells cross the driver.
+
+expiry_totals() / expiry_page() bucket interlinkages by maturity with a SQL CASE
+(maturity_bucket()) for the book-wide expiry scopes: exact per-currency totals
+(integer cents) and one page of items at a time.
+
+interlinkage_weights() gives every live interlinkage one reporting-currency amount
+(latest EAD or converted notional) for the weighted network metrics.
+"""
+from datetime import timedelta
+
+from sqlalchemy import Float, Integer, String, case, cast, func, select, type_coerce
+
+from . import models as m
+from .loading import columns_only
+from .readmodels import DAILY_UNIT, exposure_daily_active, latest_exposures_active
+
+IN_CHUNK_SIZE = 500
+
+
+def id_chunks(ids, size: int = IN_CHUNK_SIZE):
+    """Sorted, de-duplicated ids in lists of at most `size`."""
+    ids = sorted({i for i in ids if i is not None})
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def all_in(query, column, ids, size: int = IN_CHUNK_SIZE):
+    """query.filter(column.in_(ids)).all(), one statement per chunk of ids."""
+    rows = []
+    for chunk in id_chunks(ids, size):
+        rows.extend(query.filter(column.in_(chunk)).all())
+    return rows
+
+
+def latest_exposures(s, interlinkage_ids, n: int = 1, include_deleted: bool = False, chunk_size: int = IN_CHUNK_SIZE):
+    """
+    The `n` most recent ExposureSnapshot rows of each interlinkage (by as_of_date),
+    ordered by interlinkage_id then as_of_date descending.
+    """
+    ES = m.ExposureSnapshot
+    if n < 1:
+        return []
+    if n == 1 and not include_deleted and latest_exposures_active():
+        # maintained read model: one primary-key lookup per interlinkage, then per snapshot
+        LE = m.LatestExposure
+        q = s.query(ES).options(*columns_only()).join(LE, LE.snapshot_id == ES.id).order_by(ES.interlinkage_id)
+        return all_in(q, LE.interlinkage_id, interlinkage_ids, chunk_size)
+    rows = []
+    for chunk in id_chunks(interlinkage_ids, chunk_size):
+        ranked = select(
+            ES.id,
+            func.row_number().over(partition_by=ES.interlinkage_id, order_by=ES.as_of_date.desc()).label("rn"),
+        ).where(ES.interlinkage_id.in_(chunk))
+        if not include_deleted:
+            # IS NOT 1 rather than = 0: keeps the planner on the interlinkage_id index
+            ranked = ranked.where(ES.is_deleted.isnot(True))
+        ranked = ranked.subquery()
+        rows.extend(
+            s.query(ES).options(*columns_only())
+            .join(ranked, ranked.c.id == ES.id)
+            .filter(ranked.c.rn <= n)
+            .order_by(ES.interlinkage_id, ES.as_of_date.desc())
+            .all()
+        )
+    return rows
+
+
+# --- shared-dependency clusters (portfolio concentration) ---
+# A cluster is the set of live interdependences sharing a key (identifier, type, ...);
+# keys are built in SQL exactly like the per-POV endpoint builds them in Python
+# (NULL -> "", parts joined with " | ").
+
+CLUSTER_KEYS = {
+    "identifier": ("interdependence_identifier",),
+    "type":       ("type",),
+    "id_type":    ("interdependence_identifier", "type"),
+    "type_level": ("type", "level"),
+}
+
+
+def _cluster_part(name):
+    return type_coerce(getattr(m.Interdependence, name), String)
+
+
+def cluster_key(group_by: str):
+    """SQL expression of the cluster key for `group_by`."""
+    parts = [func.coalesce(_cluster_part(n), "") for n in CLUSTER_KEYS[group_by]]
+    return parts[0] if len(parts) == 1 else parts[0] + " | " + parts[1]
+
+
+def _live_dependencies(stmt, levels):
+    D, IL = m.Interdependence, m.Interlinkage
+    stmt = stmt.join_from(D, IL, IL.id == D.interlinkage_id).where(
+        D.is_deleted == False, IL.is_deleted == False,  # noqa: E712
+    )
+    if levels:
+        stmt = stmt.where(D.level.in_(levels))
+    return stmt
+
+
+def dependency_clusters(s, group_by: str, levels=(), min_cluster: int = 2, limit: int = 50, offset: int = 0):
+    """
+    (rows, total) for clusters of at least `min_cluster` distinct live interlinkages,
+    largest first; each row has key, il_count, dep_count, levels, types (sorted lists).
+    """
+    D = m.Interdependence
+    key = cluster_key(group_by).label("key")
+    il_count = func.count(D.interlinkage_id.distinct())
+    dep_count = func.count()
+    stmt = _live_dependencies(
+        select(key, il_count.label("il_count"), dep_count.label("dep_count"),
+               func.group_concat(D.level.distinct()).label("levels"),
+               func.group_concat(D.type.distinct()).label("types")),
+        levels,
+    ).group_by(key).having(il_count >= min_cluster)
+    total = s.execute(select(func.count()).select_from(stmt.subquery())).scalar()
+    rows = s.execute(stmt.order_by(il_count.desc(), dep_count.desc(), key).limit(limit).offset(offset)).all()
+    return [{
+        "key": r.key,
+        "il_count": r.il_count,
+        "dep_count": r.dep_count,
+        "levels": sorted(set((r.levels or "").split(",")) - {""}),
+        "types": sorted(set((r.types or "").split(",")) - {""}),
+    } for r in rows], total
+
+
+def cluster_interlinkage_ids(s, group_by: str, key: str, levels=(), limit: int = 50, offset: int = 0):
+    """(ids, total): the distinct live interlinkages of one cluster, ascending, one page of them."""
+    D = m.Interdependence
+    names = CLUSTER_KEYS[group_by]
+    if len(names) == 1:
+        values = [key]
+    else:
+        # the type never contains " | ", so split on the separator next to it
+        head, sep, tail = key.rpartition(" | ") if group_by == "id_type" else key.partition(" | ")
+        if not sep:
+            return [], 0
+        values = [head, tail]
+    # per-column equality (rather than cluster_key(...) == key) keeps the column indexes usable
+    conds = [
+        _cluster_part(n) == v if v else (getattr(D, n).is_(None) | (_cluster_part(n) == ""))
+        for n, v in zip(names, values)
+    ]
+    stmt = _live_dependencies(select(D.interlinkage_id).distinct(), levels).where(*conds)
+    total = s.execute(select(func.count()).select_from(stmt.subquery())).scalar()
+    ids = s.execute(stmt.order_by(D.interlinkage_id).limit(limit).offset(offset)).scalars().all()
+    return ids, total
+
+
+# --- exposure rollup (reporting-currency sums by date x dimension) ---
+
+ROLLUP_DIMENSIONS = {
+    # group_by -> (key column, needs the projects join); exposure_daily has the
+    # project_id / currency_id columns under the same names
+    "project":       (m.Interlinkage.project_id, False),
+    "sector":        (m.Project.sector_id, True),
+    "country":       (m.Project.country_id, True),
+    "currency":      (m.ExposureSnapshot.currency_id, False),
+    "business_line": (m.Project.business_line, True),
+}
+# additive amounts; pd / lgd are ratios and do not sum
+ROLLUP_MEASURES = ("ead", "undrawn", "mtm", "pnl", "rwa")
+ROLLUP_UNIT = DAILY_UNIT
+
+
+def exposure_rollup(s, group_by: str, measures, date_from=None, date_to=None):
+    """
+    One row per (as_of_date, key) over live snapshots of live interlinkages:
+    as_of_date, key, rows, unconverted (rows without fx_to_reporting) and, per measure,
+    the sum of measure * fx_to_reporting in integer cents (1 / ROLLUP_UNIT), each
+    snapshot rounded once as in exposure_daily (NULL-rate rows contribute nothing;
+    NULL when no row does).
+    """
+    ES, IL = m.ExposureSnapshot, m.Interlinkage
+    key, via_project = ROLLUP_DIMENSIONS[group_by]
+    if exposure_daily_active():
+        ED = m.ExposureDaily
+        key = key if via_project else getattr(ED, key.key)
+        stmt = select(
+            ED.as_of_date,
+            key.label("key"),
+            func.sum(ED.snapshots).label("rows"),
+            func.sum(ED.unconverted).label("unconverted"),
+            *[case((func.sum(getattr(ED, f"{ms}_n")) > 0, func.sum(getattr(ED, f"{ms}_cents")))).label(ms)
+              for ms in measures],
+        )
+        if via_project:
+            stmt = stmt.join_from(ED, m.Project, m.Project.id == ED.project_id)
+        if date_from is not None:
+            stmt = stmt.where(ED.as_of_date >= date_from)
+        if date_to is not None:
+            stmt = stmt.where(ED.as_of_date <= date_to)
+        return s.execute(stmt.group_by(ED.as_of_date, key).order_by(ED.as_of_date, key)).all()
+    stmt = select(
+        ES.as_of_date,
+        key.label("key"),
+        func.count().label("rows"),
+        (func.count() - func.count(ES.fx_to_reporting)).label("unconverted"),
+        *[func.sum(cast(func.round(getattr(ES, ms) * ES.fx_to_reporting * ROLLUP_UNIT), Integer)).label(ms)
+          for ms in measures],
+    ).join_from(ES, IL, IL.id == ES.interlinkage_id)
+    if via_project:
+        stmt = stmt.join(m.Project, m.Project.id == IL.project_id)
+    stmt = stmt.where(ES.is_deleted == False, IL.is_deleted == False)  # noqa: E712
+    if date_from is not None:
+        stmt = stmt.where(ES.as_of_date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(ES.as_of_date <= date_to)
+    return s.execute(stmt.group_by(ES.as_of_date, key).order_by(ES.as_of_date, key)).all()
+
+
+# --- expiry monitoring (portfolio / business line / project portfolio scopes) ---
+
+EXPIRY_SCOPES = {
+    # pov_kind -> Project column the scope value is matched against (None: whole book)
+    "portfolio":         None,
+    "business_line":     m.Project.business_line,
+    "project_portfolio": m.Project.portfolio,
+}
+
+
+def maturity_bucket(bucket_defs, today):
+    """
+    CASE over Interlinkage.maturity_date giving each interlinkage its bucket label.
+    bucket_defs are (label, lo, hi) in days from `today` (hi None: open-ended; the
+    "Overdue" entry means before today), first match wins; else "Outside window".
+    Bounds are turned into dates so the comparison can use the maturity_date index.
+    """
+    col = m.Interlinkage.maturity_date
+    whens = []
+    for label, lo, hi in bucket_defs:
+        if label == "Overdue":
+            whens.append((col < today, label))
+        elif hi is None:
+            whens.append((col >= today + timedelta(days=lo), label))
+        else:
+            whens.append((col.between(today + timedelta(days=lo), today + timedelta(days=hi)), label))
+    return case(*whens, else_="Outside window")
+
+
+def _expiry_scope(stmt, pov_kind, value):
+    IL = m.Interlinkage
+    stmt = stmt.where(IL.is_deleted == False, IL.maturity_date.isnot(None))  # noqa: E712
+    scope_col = EXPIRY_SCOPES[pov_kind]
+    if scope_col is not None:
+        stmt = stmt.join(m.Project, m.Project.id == IL.project_id).where(
+            scope_col == value, m.Project.is_deleted == False,  # noqa: E712
+        )
+    return stmt
+
+
+def expiry_totals(s, pov_kind, value, bucket):
+    """
+    Rows of (bucket, currency_id, count, cents): interlinkages with a maturity per
+    bucket and currency, notional summed exactly as integer cents.
+    """
+    IL = m.Interlinkage
+    unit = 10 ** IL.notional_amount.type.scale
+    label = bucket.label("bucket")
+    stmt = _expiry_scope(select(
+        label, IL.currency_id, func.count(IL.id).label("count"),
+        func.sum(cast(func.round(IL.notional_amount * unit), Integer)).label("cents"),
+    ), pov_kind, value)
+    return s.execute(stmt.group_by(label, IL.currency_id)).all()
+
+
+def expiry_page(s, pov_kind, value, bucket, limit: int, offset: int):
+    """([(id, maturity_date, bucket)], total): one page of the scope, soonest maturity first."""
+    IL = m.Interlinkage
+    stmt = _expiry_scope(select(IL.id, IL.maturity_date, bucket.label("bucket")), pov_kind, value)
+    total = s.execute(select(func.count()).select_from(stmt.subquery())).scalar()
+    rows = s.execute(stmt.order_by(IL.maturity_date, IL.id).limit(limit).offset(offset)).all()
+    return rows, total
+
+
+# --- network metrics weights ---
+
+NETWORK_WEIGHTS = ("count", "notional", "ead")
+
+
+def interlinkage_weights(s, weight: str):
+    """
+    (interlinkage id, value) for every live interlinkage, in reporting currency:
+    "ead" is the latest snapshot's ead * fx_to_reporting, "notional" the notional
+    converted at that snapshot's rate when it is in the same currency. Value is None
+    when there is no snapshot, amount or rate.
+    """
+    IL, ES = m.Interlinkage, m.ExposureSnapshot
+    if latest_exposures_active():
+        LE = m.LatestExposure
+        latest = select(LE.interlinkage_id, LE.snapshot_id.label("id")).subquery()
+    else:
+        ranked = select(
+            ES.interlinkage_id, ES.id,
+            func.row_number().over(partition_by=ES.interlinkage_id, order_by=ES.as_of_date.desc()).label("rn"),
+        ).where(ES.is_deleted.isnot(True)).subquery()
+        latest = select(ranked.c.interlinkage_id, ranked.c.id).where(ranked.c.rn == 1).subquery()
+    if weight == "ead":
+        value = ES.ead * ES.fx_to_reporting
+    else:
+        value = case((ES.currency_id == IL.currency_id, IL.notional_amount * ES.fx_to_reporting))
+    stmt = (
+        select(IL.id, type_coerce(value, Float).label("value"))
+        .outerjoin(latest, latest.c.interlinkage_id == IL.id)
+        .outerjoin(ES, ES.id == latest.c.id)
+        .where(IL.is_deleted == False)  # noqa: E712
+    )
+    return s.execute(stmt).all()
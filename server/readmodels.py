@@ -0,0 +1,200 @@
+# server/readmodels.py
+"""
+Trigger-maintained read models.
+
+latest_exposures holds, per interlinkage, the id and as_of_date of its most recent
+live ExposureSnapshot. AFTER INSERT/UPDATE/DELETE triggers on exposure_snapshots
+recompute the affected interlinkage's row (one seek on uq_exposure_timeseries), so
+it stays current for every writer, soft deletes included:
+
+    DELETE FROM latest_exposures WHERE interlinkage_id = new.interlinkage_id;
+    INSERT INTO latest_exposures SELECT interlinkage_id, id, as_of_date
+    FROM exposure_snapshots WHERE interlinkage_id = new.interlinkage_id AND is_deleted IS NOT 1
+    ORDER BY as_of_date DESC LIMIT 1;
+
+Readers (queries.latest_exposures with n=1) then fetch the latest snapshot of an
+interlinkage by primary key. rebuild_latest_exposures() recomputes the whole table
+in one statement, e.g. after loading snapshots with the triggers bypassed.
+
+exposure_daily holds the converted measure sums of live snapshots of live
+interlinkages per (as_of_date, project, currency), for queries.exposure_rollup, as
+integer cents (each snapshot's measure * fx_to_reporting rounded once), so repeated
+deltas never drift from a fresh SUM. Its triggers apply deltas rather than
+recompute: a snapshot write subtracts the old row's contribution and adds the new
+one's (an upsert on the primary key), and an interlinkage whose is_deleted or
+project_id changes moves all of its snapshots. An interlinkage delete subtracts them
+BEFORE the row goes, as the cascaded snapshot deletes then no longer find it. Cells
+whose snapshot count drops to 0 are deleted. rebuild_exposure_daily() recomputes the
+table with one GROUP BY.
+"""
+from sqlalchemy import event, inspect
+
+from . import models as m
+from .extensions import Base
+
+_LATEST = m.LatestExposure.__table__
+_DAILY = m.ExposureDaily.__table__
+DAILY_MEASURES = ("ead", "undrawn", "mtm", "pnl", "rwa")
+DAILY_UNIT = 10 ** m.ExposureSnapshot.ead.type.scale  # measures are stored in units of 1 / DAILY_UNIT
+
+_active = set()  # read model tables kept current on the bound database
+
+
+def _refresh(row: str) -> str:
+    return (
+        f"DELETE FROM latest_exposures WHERE interlinkage_id = {row}.interlinkage_id; "
+        f"INSERT INTO latest_exposures (interlinkage_id, snapshot_id, as_of_date) "
+        f"SELECT interlinkage_id, id, as_of_date FROM exposure_snapshots "
+        f"WHERE interlinkage_id = {row}.interlinkage_id AND is_deleted IS NOT 1 "
+        f"ORDER BY as_of_date DESC LIMIT 1; "
+    )
+
+
+_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS le_exposure_ai AFTER INSERT ON exposure_snapshots BEGIN "
+    + _refresh("new") + "END",
+    # measures do not move the latest snapshot; only these columns can
+    "CREATE TRIGGER IF NOT EXISTS le_exposure_au AFTER UPDATE OF interlinkage_id, as_of_date, is_deleted "
+    "ON exposure_snapshots BEGIN " + _refresh("old") + _refresh("new") + "END",
+    "CREATE TRIGGER IF NOT EXISTS le_exposure_ad AFTER DELETE ON exposure_snapshots BEGIN "
+    + _refresh("old") + "END",
+]
+
+
+def _cents(es: str, ms: str) -> str:
+    return f"CAST(ROUND({es}.{ms} * {es}.fx_to_reporting * {DAILY_UNIT}) AS INTEGER)"
+
+
+def _daily(es: str, il: str, source: str, sign: str) -> str:
+    """Add (sign "") or subtract (sign "-") the contribution of snapshot row `es` of
+    interlinkage row `il`, read from `source`, when both are live."""
+    values = ", ".join(f"{sign}{_cents(es, ms)}, {sign}({_cents(es, ms)} IS NOT NULL)" for ms in DAILY_MEASURES)
+    columns = ", ".join(f"{ms}_cents, {ms}_n" for ms in DAILY_MEASURES)
+    sums = ", ".join(f"{ms}_cents = coalesce({ms}_cents, 0) + coalesce(excluded.{ms}_cents, 0), "
+                     f"{ms}_n = {ms}_n + excluded.{ms}_n" for ms in DAILY_MEASURES)
+    return (
+        f"INSERT INTO exposure_daily (as_of_date, project_id, currency_id, snapshots, unconverted, {columns}) "
+        f"SELECT {es}.as_of_date, {il}.project_id, {es}.currency_id, {sign}1, {sign}({es}.fx_to_reporting IS NULL), "
+        f"{values} FROM {source} AND {es}.is_deleted IS NOT 1 AND {il}.is_deleted IS NOT 1 "
+        f"ON CONFLICT (as_of_date, project_id, currency_id) DO UPDATE SET snapshots = snapshots + excluded.snapshots, "
+        f"unconverted = unconverted + excluded.unconverted, {sums}; "
+    )
+
+
+def _snapshot(row: str, sign: str) -> str:
+    return _daily(row, "il", f"interlinkages AS il WHERE il.id = {row}.interlinkage_id", sign)
+
+
+def _interlinkage(row: str, sign: str) -> str:
+    return _daily("es", row, f"exposure_snapshots AS es WHERE es.interlinkage_id = {row}.id", sign)
+
+
+def _drop_empty_snapshot_cell(row: str) -> str:
+    # a primary-key lookup; finds nothing once the interlinkage is gone (it emptied the cell itself)
+    return (
+        f"DELETE FROM exposure_daily WHERE as_of_date = {row}.as_of_date AND currency_id = {row}.currency_id "
+        f"AND project_id = (SELECT project_id FROM interlinkages WHERE id = {row}.interlinkage_id) AND snapshots = 0; "
+    )
+
+
+def _drop_empty_interlinkage_cells(row: str) -> str:
+    return (
+        f"DELETE FROM exposure_daily WHERE project_id = {row}.project_id AND snapshots = 0 "
+        f"AND (as_of_date, currency_id) IN (SELECT as_of_date, currency_id FROM exposure_snapshots "
+        f"WHERE interlinkage_id = {row}.id); "
+    )
+
+
+# (name, statement); replaced on install, so existing databases pick up changed bodies
+_DAILY_TRIGGERS = [
+    ("ed_exposure_ai", "AFTER INSERT ON exposure_snapshots BEGIN " + _snapshot("new", "") + "END"),
+    ("ed_exposure_au", "AFTER UPDATE OF interlinkage_id, as_of_date, currency_id, is_deleted, "
+     + ", ".join(DAILY_MEASURES) + ", fx_to_reporting ON exposure_snapshots BEGIN "
+     + _snapshot("old", "-") + _drop_empty_snapshot_cell("old") + _snapshot("new", "") + "END"),
+    ("ed_exposure_ad", "AFTER DELETE ON exposure_snapshots BEGIN "
+     + _snapshot("old", "-") + _drop_empty_snapshot_cell("old") + "END"),
+    ("ed_interlinkage_au", "AFTER UPDATE OF is_deleted, project_id ON interlinkages BEGIN "
+     + _interlinkage("old", "-") + _drop_empty_interlinkage_cells("old") + _interlinkage("new", "") + "END"),
+    ("ed_interlinkage_bd", "BEFORE DELETE ON interlinkages BEGIN "
+     + _interlinkage("old", "-") + _drop_empty_interlinkage_cells("old") + "END"),
+]
+
+_DAILY_REBUILD = (
+    "INSERT INTO exposure_daily (as_of_date, project_id, currency_id, snapshots, unconverted, "
+    + ", ".join(f"{ms}_cents, {ms}_n" for ms in DAILY_MEASURES) + ") "
+    "SELECT es.as_of_date, il.project_id, es.currency_id, count(*), count(*) - count(es.fx_to_reporting), "
+    + ", ".join(f"sum({_cents('es', ms)}), count({_cents('es', ms)})" for ms in DAILY_MEASURES)
+    + " FROM exposure_snapshots AS es JOIN interlinkages AS il ON il.id = es.interlinkage_id "
+    "WHERE es.is_deleted IS NOT 1 AND il.is_deleted IS NOT 1 "
+    "GROUP BY es.as_of_date, il.project_id, es.currency_id"
+)
+
+_REBUILD = (
+    "INSERT INTO latest_exposures (interlinkage_id, snapshot_id, as_of_date) "
+    "SELECT interlinkage_id, id, as_of_date FROM ("
+    "SELECT interlinkage_id, id, as_of_date, ROW_NUMBER() OVER ("
+    "PARTITION BY interlinkage_id ORDER BY as_of_date DESC) AS rn "
+    "FROM exposure_snapshots WHERE is_deleted IS NOT 1) WHERE rn = 1"
+)
+
+
+def _install(connection, rebuild=()):
+    if connection.dialect.name != "sqlite":
+        return
+    for stmt in _TRIGGERS:
+        connection.exec_driver_sql(stmt)
+    for name, body in _DAILY_TRIGGERS:
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        connection.exec_driver_sql(f"CREATE TRIGGER {name} {body}")
+    if _LATEST.name in rebuild:
+        rebuild_latest_exposures(connection)
+    if _DAILY.name in rebuild:
+        rebuild_exposure_daily(connection)
+    _active.update((_LATEST.name, _DAILY.name))
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _after_create(target, connection, **kw):
+    tables = set(inspect(connection).get_table_names())
+    if {_LATEST.name, _DAILY.name, m.ExposureSnapshot.__tablename__, m.Interlinkage.__tablename__} <= tables:
+        _install(connection)
+
+
+@event.listens_for(Base.metadata, "after_drop")
+def _after_drop(target, connection, **kw):
+    _active.difference_update((_LATEST.name, _DAILY.name))
+
+
+def install_read_models(engine):
+    """Create the read model tables and their triggers on a database that predates them (back-filled)."""
+    with engine.begin() as conn:
+        existing = set(inspect(conn).get_table_names())
+        if not {m.ExposureSnapshot.__tablename__, m.Interlinkage.__tablename__} <= existing:
+            return
+        if _DAILY.name in existing and "ead_cents" not in {c["name"] for c in inspect(conn).get_columns(_DAILY.name)}:
+            # the first layout summed floats; rebuilt in cents
+            _DAILY.drop(conn)
+            existing.discard(_DAILY.name)
+        _LATEST.create(conn, checkfirst=True)
+        _DAILY.create(conn, checkfirst=True)
+        _install(conn, rebuild={_LATEST.name, _DAILY.name} - existing)
+
+
+def rebuild_latest_exposures(connection):
+    """Recompute every latest_exposures row from exposure_snapshots."""
+    connection.exec_driver_sql("DELETE FROM latest_exposures")
+    connection.exec_driver_sql(_REBUILD)
+
+
+def rebuild_exposure_daily(connection):
+    """Recompute every exposure_daily row from exposure_snapshots and interlinkages."""
+    connection.exec_driver_sql("DELETE FROM exposure_daily")
+    connection.exec_driver_sql(_DAILY_REBUILD)
+
+
+def latest_exposures_active() -> bool:
+    return _LATEST.name in _active
+
+
+def exposure_daily_active() -> bool:
+    return _DAILY.name in _active
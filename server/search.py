@@ -0,0 +1,126 @@
+# server/search.py
+"""
+Substring search indexes (SQLite FTS5, trigram tokenizer).
+
+Each indexed table gets an external-content FTS5 table "<table>_fts" holding only
+the searchable String columns, kept in sync by AFTER INSERT/UPDATE/DELETE triggers.
+The trigram tokenizer answers `col LIKE '%frag%'` from the index (case-insensitive,
+same wildcard semantics as ilike), so list_items can swap its fuzzy filters for
+
+    id IN (SELECT rowid FROM <table>_fts WHERE <col> LIKE '%v%')
+
+Indexes are created with the schema (metadata after_create) and, for databases
+created before this module existed, by install_search_indexes() at app start.
+"""
+from sqlalchemy import event, inspect, select, table, column
+from sqlalchemy.exc import OperationalError
+
+from . import models as m
+
+# Model -> searchable String columns
+SEARCH_INDEXES = {
+    m.LegalEntity:            ("name", "rmpm_code", "rmpm_type", "lei_code"),
+    m.Project:                ("name", "code", "region", "business_line", "portfolio"),
+    m.Facility:               ("reference",),
+    m.Instrument:             ("reference",),
+    m.Interdependence:        ("interdependence_identifier", "project_name"),
+    m.EntityIdentifier:       ("scheme", "value"),
+    m.InterlinkageAttachment: ("filename",),
+    m.InterlinkageNote:       ("title",),
+}
+
+# trigram tokens are 3 chars; shorter fragments cannot use the index
+MIN_FRAGMENT = 3
+
+_active = set()  # table names whose FTS index exists on the bound database
+
+
+def fts_name(tablename: str) -> str:
+    return f"{tablename}_fts"
+
+
+def _ddl(tablename: str, columns):
+    fts = fts_name(tablename)
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{c}" for c in columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{tablename}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tablename} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tablename} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {tablename} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+    ]
+
+
+def _create_index(connection, tablename: str, columns, rebuild: bool = False) -> bool:
+    if connection.dialect.name != "sqlite":
+        return False
+    try:
+        for stmt in _ddl(tablename, columns):
+            connection.exec_driver_sql(stmt)
+        if rebuild:
+            fts = fts_name(tablename)
+            connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    except OperationalError:
+        # SQLite built without FTS5 / trigram (< 3.34): keep plain ilike filters
+        return False
+    _active.add(tablename)
+    return True
+
+
+def _drop_index(connection, tablename: str):
+    if connection.dialect.name != "sqlite":
+        return
+    # triggers go away with their base table; the virtual table does not
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {fts_name(tablename)}")
+    _active.discard(tablename)
+
+
+for _model, _columns in SEARCH_INDEXES.items():
+    _tbl = _model.__table__
+
+    def _after_create(target, connection, _columns=_columns, **kw):
+        _create_index(connection, target.name, _columns)
+
+    def _after_drop(target, connection, **kw):
+        _drop_index(connection, target.name)
+
+    event.listen(_tbl, "after_create", _after_create)
+    event.listen(_tbl, "after_drop", _after_drop)
+
+
+def install_search_indexes(engine):
+    """Create any missing FTS index (and back-fill it) on an existing database."""
+    with engine.begin() as conn:
+        existing = set(inspect(conn).get_table_names())
+        for model, columns in SEARCH_INDEXES.items():
+            tablename = model.__tablename__
+            if tablename not in existing:
+                continue
+            _create_index(conn, tablename, columns, rebuild=fts_name(tablename) not in existing)
+
+
+def indexed_columns(Model) -> tuple:
+    """Columns of `Model` whose substring filters the FTS index serves on the bound database."""
+    if Model.__tablename__ not in _active:
+        return ()
+    return SEARCH_INDEXES.get(Model, ())
+
+
+def search_filter(Model, colname: str, value: str):
+    """
+    Indexed equivalent of `Model.<colname>.ilike('%value%')`, or None when the
+    column is not indexed (or the fragment is too short to use the trigram index).
+    """
+    if colname not in indexed_columns(Model):
+        return None
+    if len(value) < MIN_FRAGMENT:
+        return None
+    fts = table(fts_name(Model.__tablename__), column("rowid"), column(colname))
+    matches = select(fts.c.rowid).where(fts.c[colname].like(f"%{value}%"))
+    return Model.__table__.c.id.in_(matches)
@@ -0,0 +1,138 @@
+# server/serializers.py
+"""
+Compiled dump functions for the Marshmallow schemas on hot read paths.
+
+schema.dump() walks every field of every object through several layers of generic
+dispatch (get_value -> accessor -> Field.serialize -> _serialize). For the flat
+schemas in server/schemas.py that is pure overhead, so each schema (class + field
+selection) is compiled once into straight-line Python:
+
+    def dump_row(obj):
+        d = {}
+        od = obj.__dict__
+        v = od.get("id", MISSING)
+        if v is MISSING: v = getattr(obj, "id", MISSING)
+        if v is None: d["id"] = None
+        elif v.__class__ is int: d["id"] = v
+        elif v is not MISSING: d["id"] = F0._serialize(v, "id", obj)
+        else: ...  # F0.serialize() -> dump_default / omitted
+        ...
+        return d
+
+Values of the expected Python type take an inlined fast path that reproduces the
+field's own formatting (Decimal as plain string, ISO dates, ...); anything else goes
+through the field's own _serialize, so output is identical to schema.dump().
+Schemas with pre/post-dump hooks and non-object rows (dicts) are left to Marshmallow.
+"""
+import datetime as dt
+import decimal
+import threading
+
+from marshmallow import fields, missing
+
+_lock = threading.Lock()
+_compiled = {}  # (schema class, dump field names) -> function(obj) -> dict
+
+
+def _fast_path(field):
+    """(python type, expression over `v`) for the inlined path, or None."""
+    if isinstance(field, fields.Boolean):
+        return bool, "v"
+    if isinstance(field, fields.Decimal):
+        if field.places is None and field.as_string:
+            return decimal.Decimal, 'format(v, "f") if v.is_finite() else {f}._serialize(v, {a!r}, obj)'
+        return None
+    if isinstance(field, fields.Integer):
+        return int, "v"
+    if isinstance(field, fields.String):
+        return str, "v"
+    if type(field) is fields.DateTime:
+        if (field.format or field.DEFAULT_FORMAT) in ("iso", "iso8601"):
+            return dt.datetime, "v.isoformat()"
+        return None
+    if type(field) is fields.Date:
+        if (field.format or field.DEFAULT_FORMAT) in ("iso", "iso8601"):
+            return dt.date, "v.isoformat()"
+        return None
+    return None
+
+
+def _compile(schema):
+    ns = {"MISSING": missing, "EMPTY": {}}
+    lines = ["def dump_row(obj):", "    d = {}", "    od = getattr(obj, '__dict__', EMPTY)"]
+    for i, (name, field) in enumerate(schema.dump_fields.items()):
+        f = f"F{i}"
+        ns[f] = field
+        attr = field.attribute or name
+        key = field.data_key if field.data_key is not None else name
+        if "." in attr:
+            # nested attribute path: keep Marshmallow's accessor
+            ns[f"S{i}"] = schema
+            lines += [
+                f"    v = {f}.serialize({attr!r}, obj, accessor=S{i}.get_attribute)",
+                f"    if v is not MISSING: d[{key!r}] = v",
+            ]
+            continue
+        fast = _fast_path(field)
+        # loaded ORM column values sit in __dict__; anything else goes through the descriptor
+        lines += [
+            f"    v = od.get({attr!r}, MISSING)",
+            f"    if v is MISSING: v = getattr(obj, {attr!r}, MISSING)",
+        ]
+        if fast is not None:
+            # every built-in field with a fast path dumps None as None
+            py_type, expr = fast
+            ns[f"T{i}"] = py_type
+            lines += [
+                f"    if v is None: d[{key!r}] = None",
+                f"    elif v.__class__ is T{i}: d[{key!r}] = {expr.format(f=f, a=attr)}",
+            ]
+        else:
+            lines.append(f"    if v is None: d[{key!r}] = {f}._serialize(None, {attr!r}, obj)")
+        lines += [
+            f"    elif v is not MISSING: d[{key!r}] = {f}._serialize(v, {attr!r}, obj)",
+            f"    else:",
+            f"        v = {f}.serialize({attr!r}, obj)",
+            f"        if v is not MISSING: d[{key!r}] = v",
+        ]
+    lines.append("    return d")
+    exec(compile("\n".join(lines), f"<serializer {type(schema).__name__}>", "exec"), ns)
+    return ns["dump_row"]
+
+
+def _has_dump_hooks(schema) -> bool:
+    return any(hooks and "dump" in str(tag) for tag, hooks in schema._hooks.items())
+
+
+def serializer_for(schema):
+    """Compiled row -> dict function for a schema instance (or class), cached."""
+    key = (schema, None) if isinstance(schema, type) else (type(schema), tuple(schema.dump_fields))
+    fn = _compiled.get(key)
+    if fn is None:
+        if isinstance(schema, type):
+            schema = schema()
+        if _has_dump_hooks(schema):
+            fn = lambda obj, _schema=schema: _schema.dump(obj, many=False)  # noqa: E731
+        else:
+            fn = _compile(schema)
+        with _lock:
+            _compiled[key] = fn
+    return fn
+
+
+def dump_many(schema, objs):
+    """Drop-in for schema.dump(objs, many=True) on ORM rows."""
+    objs = list(objs)
+    if objs and isinstance(objs[0], dict):
+        if isinstance(schema, type):
+            schema = schema()
+        return schema.dump(objs, many=True)
+    row = serializer_for(schema)
+    return [row(o) for o in objs]
+
+
+def dump_one(schema, obj):
+    """Drop-in for schema.dump(obj) on an ORM row."""
+    if isinstance(obj, dict):
+        return (schema() if isinstance(schema, type) else schema).dump(obj)
+    return serializer_for(schema)(obj)
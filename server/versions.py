@@ -0,0 +1,182 @@
+# server/versions.py
+"""
+Per-table version counters and conditional GETs.
+
+Every mapped table gets AFTER INSERT/UPDATE/DELETE triggers that bump its row in
+`table_versions`, so the counter moves for any writer (API, bulk endpoints, seed
+scripts, other worker processes). GET endpoints derive their ETag from the versions
+of the tables they read plus the request URL, and answer If-None-Match with a 304
+after a single primary-key lookup, before any ORM query runs.
+
+Change tokens (focus-bundle ?since=) work per row instead. The tables in CHANGE_TABLES
+also get triggers appending to `change_log` (table, row id, I/U/D); a token is the
+highest `seq` a response could see, and the next request returns only the rows logged
+after it. SQLite has a single writer, so seqs are handed out in commit order: a long
+bulk transaction that commits after a token was issued is logged after it too.
+Updates and deletes are logged with the parent keys the row had before (`scope`), so
+a row that was soft- or hard-deleted, or re-pointed away from a focus, can still be
+matched to that focus and sent as a tombstone. The log keeps CHANGE_RETENTION of
+history (pruned at start-up and then at most every CHANGE_PRUNE_INTERVAL, as tokens
+are issued); older tokens are refused.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from flask import request, Response
+from sqlalchemy import event, func, inspect, select
+
+from .extensions import Base
+from . import models as m
+
+_VERSIONS = m.TableVersion.__table__
+_CHANGES = m.ChangeLog.__table__
+
+# tables logged row by row in change_log -> the parent keys a deleted row is logged with
+CHANGE_TABLES = {
+    "projects": (),
+    "legal_entities": (),
+    "entity_identifiers": ("entity_id",),
+    "facilities": (),
+    "instruments": (),
+    "interlinkages": ("sponsor_id", "counterparty_id", "booking_entity_id", "project_id"),
+    "interdependences": ("interlinkage_id",),
+    "exposure_snapshots": ("interlinkage_id",),
+    "interlinkage_attachments": ("interlinkage_id",),
+    "interlinkage_notes": ("interlinkage_id",),
+    "workflow_events": ("interlinkage_id",),
+    "interlinkage_analyses": ("interlinkage_id",),
+}
+CHANGE_RETENTION = timedelta(days=30)
+CHANGE_PRUNE_INTERVAL = timedelta(hours=1)
+_pruned_at = None
+
+
+def _versioned_tables(names=None):
+    return [t.name for t in Base.metadata.sorted_tables
+            if t not in (_VERSIONS, _CHANGES) and (names is None or t.name in names)]
+
+
+def _install(connection, tables):
+    if connection.dialect.name != "sqlite":
+        return
+    for t in tables:
+        connection.exec_driver_sql(
+            "INSERT OR IGNORE INTO table_versions (table_name, version) VALUES (?, 0)", (t,)
+        )
+        for suffix, op in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE")):
+            connection.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS tv_{t}_{suffix} AFTER {op} ON {t} BEGIN "
+                f"UPDATE table_versions SET version = version + 1 WHERE table_name = '{t}'; END"
+            )
+        if t not in CHANGE_TABLES:
+            continue
+        scope = ", ".join(f"'{c}', OLD.{c}" for c in CHANGE_TABLES[t])
+        scope = f"json_object({scope})" if scope else "NULL"
+        for suffix, op, row, extra in (
+            ("ai", "INSERT", "NEW", "NULL"), ("au", "UPDATE", "NEW", scope), ("ad", "DELETE", "OLD", scope),
+        ):
+            # replaced rather than kept: older databases have triggers without the update scope
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS cl_{t}_{suffix}")
+            connection.exec_driver_sql(
+                f"CREATE TRIGGER cl_{t}_{suffix} AFTER {op} ON {t} BEGIN "
+                f"INSERT INTO change_log (table_name, row_id, op, scope) "
+                f"VALUES ('{t}', {row}.id, '{op[0]}', {extra}); END"
+            )
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _after_create(target, connection, **kw):
+    _install(connection, _versioned_tables())
+
+
+def install_table_versions(engine):
+    """Create table_versions, change_log and their triggers on a database that predates
+    them, and prune change_log entries older than CHANGE_RETENTION."""
+    with engine.begin() as conn:
+        _VERSIONS.create(conn, checkfirst=True)
+        _CHANGES.create(conn, checkfirst=True)
+        _install(conn, _versioned_tables(set(inspect(conn).get_table_names())))
+        prune_change_log(conn)
+
+
+def prune_change_log(conn):
+    """Drop change_log entries older than CHANGE_RETENTION (on a connection or session)."""
+    global _pruned_at
+    _pruned_at = datetime.utcnow()
+    # the newest entry stays: MIN(seq) - 1 is where the log's history starts
+    newest = conn.execute(select(func.max(_CHANGES.c.seq))).scalar()
+    if newest is not None:
+        conn.execute(_CHANGES.delete().where(
+            _CHANGES.c.changed_at < _pruned_at - CHANGE_RETENTION, _CHANGES.c.seq < newest))
+
+
+def table_versions(s, tables):
+    rows = s.execute(select(_VERSIONS.c.table_name, _VERSIONS.c.version)
+                     .where(_VERSIONS.c.table_name.in_(tables)))
+    return dict(rows.all())
+
+
+def make_etag(s, tables, *parts) -> str:
+    """ETag over the current versions of `tables`, the request URL and any extra parts."""
+    versions = table_versions(s, tables)
+    h = hashlib.sha1()
+    for t in sorted(tables):
+        h.update(f"{t}={versions.get(t, 0)};".encode())
+    h.update(request.full_path.encode())
+    for p in parts:
+        h.update(f"|{p}".encode())
+    return h.hexdigest()[:32]
+
+
+def not_modified(etag: str):
+    """304 response when If-None-Match matches `etag`, else None."""
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+    return None
+
+
+def with_etag(resp, etag: str):
+    """Attach the ETag to successful (plain 200) responses; pass anything else through."""
+    if isinstance(resp, Response) and resp.status_code == 200:
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+def change_token(s) -> str:
+    """Token for "now" (the last committed change_log seq), to hand back as ?since=.
+    Prunes the log first when the last prune is CHANGE_PRUNE_INTERVAL old."""
+    if _pruned_at is None or datetime.utcnow() - _pruned_at >= CHANGE_PRUNE_INTERVAL:
+        prune_change_log(s)
+    return str(s.execute(select(func.coalesce(func.max(_CHANGES.c.seq), 0))).scalar())
+
+
+def parse_change_token(raw):
+    """The seq rows must be logged after for token `raw`, or None when malformed."""
+    if raw is None or not raw.isdigit():
+        return None
+    return int(raw)
+
+
+def change_token_expired(s, since) -> bool:
+    """True when entries after `since` have been pruned from change_log."""
+    oldest = s.execute(select(func.min(_CHANGES.c.seq))).scalar()
+    return oldest is not None and since < oldest - 1
+
+
+def changed_since(Model, since):
+    """Rows of a CHANGE_TABLES model inserted or updated (soft deletes included) after `since`."""
+    return Model.id.in_(select(_CHANGES.c.row_id).where(
+        _CHANGES.c.table_name == Model.__tablename__, _CHANGES.c.op != "D", _CHANGES.c.seq > since))
+
+
+def left_since(s, Model, since):
+    """[(id, parent keys before)] of the rows of `Model` updated or deleted after `since`:
+    the rows that may have left a scope they were in."""
+    rows = s.execute(select(_CHANGES.c.row_id, _CHANGES.c.scope).where(
+        _CHANGES.c.table_name == Model.__tablename__, _CHANGES.c.op != "I", _CHANGES.c.seq > since))
+    return [(row_id, json.loads(scope) if scope else {}) for row_id, scope in rows]
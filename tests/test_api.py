@@ -1,4 +1,7 @@
+import json
 import unittest
+from datetime import date, timedelta
+from decimal import Decimal
 
 from sqlalchemy.orm import Session
 from sqlalchemy.pool import StaticPool
@@ -57,6 +60,34 @@ class APITestCase(unittest.TestCase):
 
     # ---------- Helper methods ----------
 
+    def count_queries(self, fn):
+        statements = []
+
+        def _on_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(self.engine, "before_cursor_execute", _on_execute)
+        try:
+            result = fn()
+        finally:
+            event.remove(self.engine, "before_cursor_execute", _on_execute)
+        return result, [st for st in statements if st.lstrip().upper().startswith("SELECT")]
+
+    def make_interlinkages(self, n, **extra):
+        sponsor_id = self.get_first_id("/api/legal-entities?name=Sponsor%20SA")
+        cpty_id = self.get_first_id("/api/legal-entities?name=Counterparty%20Ltd")
+        project_id = self.get_first_id("/api/projects?name=Project%20Neptune")
+        rows = []
+        for _ in range(n):
+            APITestCase._il_day = getattr(APITestCase, "_il_day", 0) + 1
+            rows.append(dict({
+                "sponsor_id": sponsor_id, "counterparty_id": cpty_id, "project_id": project_id, "status": "draft",
+                "deal_date": (date(2000, 1, 1) + timedelta(days=APITestCase._il_day)).isoformat(),
+            }, **extra))
+        rv = self.client.post("/api/interlinkages/bulk", json=rows)
+        self.assertEqual(rv.get_json()["failed"], 0, rv.get_json())
+        return [r["id"] for r in rv.get_json()["results"]]
+
     def get_first_id(self, url: str) -> int:
         rv = self.client.get(url)
         self.assertEqual(rv.status_code, 200, rv.get_json())
@@ -193,6 +224,1006 @@ class APITestCase(unittest.TestCase):
             msg = (body.get("message") or "").lower()
             self.assertTrue("foreign key" in msg or "constraint" in msg or rv.status_code in (400, 409))
 
+    def test_cursor_pagination_walks_all_rows_once(self):
+        for i, name in enumerate(["Cursor B", "Cursor A", "Cursor C", "Cursor A", "Cursor B"]):
+            rv = self.client.post("/api/legal-entities", json={"rmpm_code": f"CUR{i:02d}", "rmpm_type": "TEST", "name": name})
+            self.assertEqual(rv.status_code, 201, rv.get_json())
+
+        seen, cursor = [], ""
+        while cursor is not None:
+            rv = self.client.get(f"/api/legal-entities?name=Cursor&sort=name:desc&page_size=2&cursor={cursor}")
+            self.assertEqual(rv.status_code, 200, rv.get_json())
+            data = rv.get_json()
+            self.assertLessEqual(len(data["items"]), 2)
+            seen.extend((it["name"], it["id"]) for it in data["items"])
+            cursor = data["next_cursor"]
+
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len({i for _, i in seen}), 5)
+        # name desc, id asc as tie-breaker
+        self.assertEqual(seen, sorted(seen, key=lambda t: (-ord(t[0][-1]), t[1])))
+
+        rv = self.client.get("/api/legal-entities?sort=name:desc&cursor=not-a-cursor")
+        self.assertEqual(rv.status_code, 400)
+        self.assertEqual(rv.get_json()["error"], "invalid_cursor")
+
+    def test_total_modes(self):
+        url = "/api/legal-entities?name=Totals"
+        self.client.post("/api/legal-entities", json={"rmpm_code": "TOT01", "rmpm_type": "TEST", "name": "Totals One"})
+
+        rv = self.client.get(url + "&total=estimate")
+        self.assertEqual(rv.get_json()["total"], 1)
+
+        # a write through the generic views invalidates the cached count
+        self.client.post("/api/legal-entities", json={"rmpm_code": "TOT02", "rmpm_type": "TEST", "name": "Totals Two"})
+        rv = self.client.get(url + "&total=estimate")
+        self.assertEqual(rv.get_json()["total"], 2)
+
+        # so does one behind the API's back (another worker, a cascaded delete): table_versions moved
+        with Session(self.engine) as s, s.begin():
+            s.add(m.LegalEntity(rmpm_code="TOT03", rmpm_type="TEST", name="Totals Three"))
+        rv = self.client.get(url + "&total=estimate")
+        self.assertEqual(rv.get_json()["total"], 3)
+        with Session(self.engine) as s, s.begin():
+            s.query(m.LegalEntity).filter_by(rmpm_code="TOT03").delete()
+
+        rv = self.client.get(url + "&total=none")
+        self.assertIsNone(rv.get_json()["total"])
+        self.assertEqual(len(rv.get_json()["items"]), 2)
+
+        rv = self.client.get(url + "&total=bogus")
+        self.assertEqual(rv.status_code, 400)
+
+    def test_fuzzy_filter_uses_search_index(self):
+        from server.search import search_filter
+        self.assertIsNotNone(search_filter(m.LegalEntity, "name", "abc"))
+
+        rv = self.client.post("/api/legal-entities", json={"rmpm_code": "ZEB01", "rmpm_type": "TEST", "name": "Zebra Holdings"})
+        le_id = rv.get_json()["id"]
+
+        # case-insensitive substring, through the trigram index
+        rv = self.client.get("/api/legal-entities?name=EBRA%20hold")
+        self.assertEqual([it["id"] for it in rv.get_json()["items"]], [le_id])
+
+        # index follows updates
+        self.client.post(f"/api/legal-entities/{le_id}/update", json={"name": "Okapi Holdings"})
+        rv = self.client.get("/api/legal-entities?name=zebra")
+        self.assertEqual(rv.get_json()["total"], 0)
+        rv = self.client.get("/api/legal-entities?name=okapi")
+        self.assertEqual([it["id"] for it in rv.get_json()["items"]], [le_id])
+
+        # fragments shorter than a trigram fall back to ilike
+        rv = self.client.get("/api/legal-entities?name=ok")
+        self.assertIn(le_id, [it["id"] for it in rv.get_json()["items"]])
+
+    def test_sparse_fieldsets(self):
+        rv = self.client.get("/api/legal-entities?name=Sponsor&fields=id,name")
+        self.assertEqual(rv.status_code, 200, rv.get_json())
+        items = rv.get_json()["items"]
+        self.assertTrue(items)
+        self.assertEqual(set(items[0]), {"id", "name"})
+
+        le_id = items[0]["id"]
+        rv = self.client.get(f"/api/legal-entities/{le_id}?fields=rmpm_code")
+        self.assertEqual(rv.get_json(), {"rmpm_code": "SPN001"})
+
+        rv = self.client.get("/api/legal-entities?fields=id,no_such_field")
+        self.assertEqual(rv.status_code, 400)
+        self.assertEqual(rv.get_json()["unknown"], ["no_such_field"])
+
+    def test_bulk_create_update_delete(self):
+        rows = [
+            {"rmpm_code": "BLK01", "rmpm_type": "TEST", "name": "Bulk One"},
+            {"rmpm_code": "BLK02", "rmpm_type": "TEST"},                       # missing name
+            {"rmpm_code": "BLK01", "rmpm_type": "TEST", "name": "Bulk Dup"},   # unique clash
+            {"rmpm_code": "BLK03", "rmpm_type": "TEST", "name": "Bulk Three"},
+        ]
+        rv = self.client.post("/api/legal-entities/bulk", json={"items": rows})
+        self.assertEqual(rv.status_code, 200, rv.get_json())
+        body = rv.get_json()
+        self.assertEqual([r["status"] for r in body["results"]], [201, 400, 409, 201])
+        self.assertEqual((body["ok"], body["failed"]), (2, 2))
+        id1, id3 = body["results"][0]["id"], body["results"][3]["id"]
+
+        rv = self.client.post("/api/legal-entities/bulk/update", json=[
+            {"id": id1, "name": "Bulk One Renamed"},
+            {"id": 999999, "name": "Nobody"},
+        ])
+        self.assertEqual([r["status"] for r in rv.get_json()["results"]], [200, 404])
+        self.assertEqual(self.client.get(f"/api/legal-entities/{id1}").get_json()["name"], "Bulk One Renamed")
+
+        # rows without a usable id fail on their own; the rest of the batch still applies
+        rv = self.client.post("/api/legal-entities/bulk/update", json=[
+            {"name": "No id"}, "junk", {"id": id3, "name": "Bulk Three Renamed"}, {"id": id1},
+            {"id": True, "name": "Not entity 1"},
+        ])
+        self.assertEqual(rv.status_code, 200, rv.get_json())
+        self.assertEqual([r["status"] for r in rv.get_json()["results"]], [400, 400, 200, 200, 400])
+        self.assertEqual(self.client.get(f"/api/legal-entities/{id3}").get_json()["name"], "Bulk Three Renamed")
+
+        rv = self.client.post("/api/legal-entities/bulk/delete", json={"ids": [id1, id3, 999999, True]})
+        self.assertEqual([r["status"] for r in rv.get_json()["results"]], [204, 204, 404, 400])
+        self.assertEqual(self.client.get("/api/legal-entities/1").status_code, 200)
+        self.assertEqual(self.client.get(f"/api/legal-entities/{id3}").status_code, 404)
+
+    def test_export_streams_ndjson_and_csv(self):
+        import csv, io, json
+        rv = self.client.get("/api/legal-entities/export?format=ndjson&name=Sponsor&fields=id,name")
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.mimetype, "application/x-ndjson")
+        rows = [json.loads(line) for line in rv.get_data(as_text=True).splitlines()]
+        self.assertEqual([r["name"] for r in rows], ["Sponsor SA"])
+        self.assertEqual(set(rows[0]), {"id", "name"})
+
+        rv = self.client.get("/api/legal-entities/export?format=csv&sort=name:asc&fields=rmpm_code,name")
+        self.assertEqual(rv.mimetype, "text/csv")
+        rows = list(csv.DictReader(io.StringIO(rv.get_data(as_text=True))))
+        self.assertIn({"rmpm_code": "CPTY01", "name": "Counterparty Ltd"}, rows)
+        self.assertEqual([r["name"] for r in rows], sorted(r["name"] for r in rows))
+
+        rv = self.client.get("/api/legal-entities/export?format=xml")
+        self.assertEqual(rv.status_code, 400)
+
+    def test_etag_and_not_modified(self):
+        url = "/api/legal-entities?name=Sponsor"
+        rv = self.client.get(url)
+        etag = rv.headers.get("ETag")
+        self.assertTrue(etag)
+
+        rv = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(rv.status_code, 304)
+        self.assertEqual(rv.headers.get("ETag"), etag)
+
+        # any write to the table moves its version
+        self.client.post("/api/legal-entities", json={"rmpm_code": "ETG01", "rmpm_type": "TEST", "name": "Etag Co"})
+        rv = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(rv.status_code, 200)
+        self.assertNotEqual(rv.headers.get("ETag"), etag)
+
+        le_id = rv.get_json()["items"][0]["id"]
+        item_etag = self.client.get(f"/api/legal-entities/{le_id}").headers["ETag"]
+        rv = self.client.get(f"/api/legal-entities/{le_id}", headers={"If-None-Match": item_etag})
+        self.assertEqual(rv.status_code, 304)
+
+    def test_reference_cache_follows_writes(self):
+        rv = self.client.get("/api/currencies?sort=code:desc&page_size=500")
+        codes = [c["code"] for c in rv.get_json()["items"]]
+        self.assertEqual(codes, sorted(codes, reverse=True))
+        self.assertNotIn("JPY", codes)
+
+        # through the write views
+        self.client.post("/api/currencies", json={"code": "JPY", "name": "Yen"})
+        rv = self.client.get("/api/currencies?page_size=500&fields=code")
+        self.assertIn({"code": "JPY"}, rv.get_json()["items"])
+
+        # behind the API's back: picked up through table_versions
+        with Session(self.engine) as s, s.begin():
+            s.query(m.Currency).filter_by(code="JPY").update({"name": "Japanese Yen"})
+        rv = self.client.get("/api/currencies?page_size=500")
+        self.assertIn("Japanese Yen", [c["name"] for c in rv.get_json()["items"]])
+
+        # dumped decimals and dates are strings: a sort on them is answered by SQL, not the cache
+        from unittest import mock
+        from server.cache import ref_cache
+        from server.schemas import ExposureSnapshotSchema
+        il, = self.make_interlinkages(1)
+        eur_id = self.get_first_id("/api/currencies?code=EUR")
+        self.client.post("/api/exposures/bulk", json=[
+            {"interlinkage_id": il, "currency_id": eur_id, "as_of_date": d, "ead": ead}
+            for d, ead in (("2017-01-31", "9.00"), ("2017-02-28", "100.00"), ("2017-03-31", "25.50"))])
+        url = "/api/exposures?sort=ead:desc&page_size=500"
+        expected = self.client.get(url).get_json()
+        with mock.patch.dict(ref_cache.schemas, {m.ExposureSnapshot: ExposureSnapshotSchema}):
+            rv = self.client.get(url)
+        self.assertEqual(rv.get_json(), expected)
+        eads = [Decimal(e["ead"]) for e in expected["items"] if e["interlinkage_id"] == il]
+        self.assertEqual(eads, [Decimal("100.00"), Decimal("25.50"), Decimal("9.00")])
+
+    def test_expand_inlines_relations_with_fixed_query_count(self):
+        eur_id = self.get_first_id("/api/currencies?code=EUR")
+        ids = self.make_interlinkages(4, currency_id=eur_id)
+        query = "&sort=id:desc&expand=sponsor,counterparty,project,currency"
+
+        rv, small = self.count_queries(lambda: self.client.get("/api/interlinkages?page_size=1" + query))
+        rv, large = self.count_queries(lambda: self.client.get("/api/interlinkages?page_size=4" + query))
+        self.assertEqual(len(small), len(large), large)
+
+        items = rv.get_json()["items"]
+        self.assertEqual([it["id"] for it in items], sorted(ids, reverse=True))
+        self.assertEqual(items[0]["sponsor"]["name"], "Sponsor SA")
+        self.assertEqual(items[0]["counterparty"]["name"], "Counterparty Ltd")
+        self.assertEqual(items[0]["project"]["name"], "Project Neptune")
+        self.assertEqual(items[0]["currency"]["code"], "EUR")
+
+        rv = self.client.get(f"/api/interlinkages/{ids[0]}?expand=project&fields=id,project_id")
+        self.assertEqual(rv.get_json()["project"]["name"], "Project Neptune")
+        self.assertEqual(set(rv.get_json()), {"id", "project_id", "project"})
+
+        rv = self.client.get("/api/interlinkages?expand=nope")
+        self.assertEqual(rv.status_code, 400)
+        self.assertEqual(rv.get_json()["unknown"], ["nope"])
+
+    def test_operator_filters(self):
+        ids = self.make_interlinkages(3, status="validated")
+        terms = [("5000000", "2030-01-01"), ("15000000", "2031-06-30"), ("25000000", None)]
+        rv = self.client.post("/api/interlinkages/bulk/update", json=[
+            {"id": i, "notional_amount": notional, "maturity_date": maturity}
+            for i, (notional, maturity) in zip(ids, terms)
+        ])
+        self.assertEqual(rv.get_json()["failed"], 0, rv.get_json())
+        scope = "id__in=" + ",".join(map(str, ids))
+
+        def ids_for(query):
+            rv = self.client.get(f"/api/interlinkages?{scope}&{query}")
+            self.assertEqual(rv.status_code, 200, rv.get_json())
+            return [it["id"] for it in rv.get_json()["items"]]
+
+        self.assertEqual(ids_for("notional_amount__gt=10000000"), ids[1:])
+        self.assertEqual(ids_for("notional_amount__between=1000000,20000000"), ids[:2])
+        self.assertEqual(ids_for("maturity_date__gte=2031-01-01&notional_amount__gte=10000000"), [ids[1]])
+        self.assertEqual(ids_for("maturity_date__isnull=true"), [ids[2]])
+        self.assertEqual(ids_for("maturity_date__isnull=false&notional_amount__lt=10000000"), [ids[0]])
+        self.assertEqual(ids_for("status__in=draft,validated"), ids)
+        self.assertEqual(ids_for("status=valid"), ids)
+        self.assertEqual(ids_for(f"id__ne={ids[0]}&status__eq=validated"), ids[1:])
+
+        for query in ("deal_date__gte=soon", "id__between=1", "id__like=3", "maturity_date__isnull=maybe", "status__in=open"):
+            rv = self.client.get(f"/api/interlinkages?{query}")
+            self.assertEqual(rv.status_code, 400, query)
+            self.assertEqual(rv.get_json()["error"], "invalid_filter")
+            self.assertEqual(self.client.get(f"/api/interlinkages/export?{query}").status_code, 400)
+
+    def test_admin_explain_and_index_advice(self):
+        rv = self.client.get("/api/_admin/explain/interlinkages?status__eq=draft&deal_date__gte=2020-01-01&sort=deal_date:desc")
+        self.assertEqual(rv.status_code, 200, rv.get_json())
+        body = rv.get_json()
+        page = body["queries"]["page"]
+        self.assertIn("ORDER BY interlinkages.deal_date DESC", page["sql"])
+        self.assertTrue(any("USING INDEX" in step["detail"] for step in page["plan"]))
+        self.assertGreaterEqual(page["elapsed_ms"], 0)
+        self.assertEqual(body["queries"]["count"]["rows"], self.client.get(
+            "/api/interlinkages?status__eq=draft&deal_date__gte=2020-01-01").get_json()["total"])
+        self.assertEqual(body["unindexed"], [])
+
+        # remarks is neither indexed nor covered by a search index
+        rv = self.client.get("/api/_admin/explain/interlinkages?remarks=late&sort=notional_amount:asc")
+        body = rv.get_json()
+        self.assertIn("interlinkages", body["queries"]["page"]["full_scans"])
+        self.assertTrue(body["queries"]["page"]["temp_sorts"])
+        self.assertEqual(body["unindexed"], [{"column": "remarks", "kind": "like"},
+                                             {"column": "notional_amount", "kind": "sort"}])
+
+        self.client.get("/api/_admin/explain?reset=1")
+        for _ in range(3):
+            self.client.get("/api/projects?description=solar&sector_id=1&country_id__in=1,2&sort=region")
+        self.client.get("/api/projects?name=Nep")  # served by the search index: not tracked
+        items = self.client.get("/api/_admin/explain").get_json()["items"]
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]["hits"], 3)
+        self.assertEqual(items[0]["suggested_index"]["columns"], ["country_id", "sector_id", "region"])
+        self.assertEqual(items[0]["search_index"], ["description"])
+
+        self.assertEqual(self.client.get("/api/_admin/explain/nope").status_code, 404)
+        self.assertEqual(self.client.get("/api/_admin/explain/interlinkages?id__foo=1").status_code, 400)
+
+    def test_endpoint_query_counts(self):
+        project_id = self.get_first_id("/api/projects?name=Project%20Neptune")
+        ids = self.make_interlinkages(2, maturity_date="2031-01-01")
+        for il_id in ids:
+            self.client.post("/api/interdependences", json={
+                "interlinkage_id": il_id, "interdependence_identifier": "GRID-1", "type": "technical", "level": "high",
+            })
+            self.client.post("/api/interlinkage-analyses", json={"interlinkage_id": il_id, "content": "ok"})
+
+        # ETag lookup + page (+ count unless total=none); no relationship loads
+        expected = {
+            "/api/interlinkages?total=none": 2,
+            "/api/interlinkages": 3,
+            f"/api/interlinkages/{ids[0]}": 2,
+            "/api/interlinkage-analyses?total=none": 2,
+            "/api/interdependences?total=none": 2,
+            "/api/interlinkages?total=none&expand=project,analysis": 4,
+        }
+        for url, count in expected.items():
+            with self.subTest(url=url):
+                self.client.get(url)  # warm the reference cache
+                rv, selects = self.count_queries(lambda: self.client.get(url))
+                self.assertEqual(rv.status_code, 200)
+                self.assertEqual(len(selects), count, selects)
+
+        analyses = {
+            "/api/analysis/concentration/shared-dependencies": ({"pov_kind": "project", "pov_id": project_id}, 5),
+            "/api/analysis/expiry-monitoring": ({"pov_id": project_id}, 3),
+        }
+        for url, (body, count) in analyses.items():
+            with self.subTest(url=url):
+                self.client.post(url, json=body)
+                rv, selects = self.count_queries(lambda: self.client.post(url, json=body))
+                self.assertEqual(rv.status_code, 200)
+                self.assertEqual(len(selects), count, selects)
+
+        # focus bundle: the focus interlinkage's collections are batch-loaded once; nothing else is
+        rv, selects = self.count_queries(
+            lambda: self.client.get(f"/api/focus-bundle?kind=interlinkage&id={ids[0]}&exposures_mode=none&include_notes=0"))
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(len(rv.get_json()["interdependences"]), 1)
+        self.assertFalse([st for st in selects if "exposure_snapshots" in st or "FROM interlinkage_notes" in st])
+        self.assertFalse([st for st in selects if " JOIN " in st])
+        self.assertEqual(len([st for st in selects if "FROM interdependences" in st]), 2)
+
+    def test_focus_bundle_batch_mode(self):
+        project_id = self.get_first_id("/api/projects?name=Project%20Neptune")
+        sponsor_id = self.client.post("/api/legal-entities", json={
+            "rmpm_code": "BATCH1", "rmpm_type": "INTERNAL", "name": "Batch Sponsor"}).get_json()["id"]
+        other = self.client.post("/api/projects", json={"name": "Project Triton", "code": "TRI"}).get_json()["id"]
+        il_other = self.make_interlinkages(1, project_id=other, sponsor_id=sponsor_id)[0]
+        il_nep = self.make_interlinkages(1, sponsor_id=sponsor_id)[0]
+
+        single = self.client.get(f"/api/focus-bundle?kind=project&id={other}").get_json()
+        self.assertEqual(single["focus"], {"kind": "project", "id": other})
+        self.assertEqual([i["id"] for i in single["interlinkages"]], [il_other])
+
+        foci = f"project:{other},entity:{sponsor_id},interlinkage:{il_nep},project:999999"
+        rv = self.client.get(f"/api/focus-bundle?foci={foci}")
+        self.assertEqual(rv.status_code, 200)
+        body = rv.get_json()
+        self.assertEqual(body["missing"], [{"kind": "project", "id": 999999}])
+        self.assertEqual(len(body["foci"]), 3)
+        self.assertNotIn("focus", body)
+
+        # the sponsor is on both interlinkages: each row is returned once
+        il_ids = [i["id"] for i in body["interlinkages"]]
+        self.assertEqual(len(il_ids), len(set(il_ids)))
+        self.assertIn(il_other, il_ids)
+        self.assertEqual(len({e["id"] for e in body["legal_entities"]}), len(body["legal_entities"]))
+        self.assertEqual({p["id"] for p in body["projects"]}, {project_id, other})
+
+        by_il = {e["interlinkage_id"]: e["foci"] for e in body["edges"] if e["type"] == "interlinkage-project"}
+        self.assertEqual(by_il[il_other], [f"project:{other}", f"entity:{sponsor_id}"])
+        self.assertEqual(by_il[il_nep], [f"interlinkage:{il_nep}", f"entity:{sponsor_id}"])
+
+        # one payload costs the queries of a single focus, plus one existence check per extra focus kind
+        _, one = self.count_queries(lambda: self.client.get(f"/api/focus-bundle?kind=project&id={other}"))
+        _, many = self.count_queries(lambda: self.client.get(f"/api/focus-bundle?foci={foci}"))
+        self.assertEqual(len(many), len(one) + 1)
+
+        self.assertEqual(self.client.get("/api/focus-bundle?foci=project:x").status_code, 400)
+        self.assertEqual(self.client.get("/api/focus-bundle?foci=team:1").status_code, 400)
+        self.assertEqual(self.client.get("/api/focus-bundle?kind=project&id=999999").status_code, 404)
+
+    def test_latest_exposures_window(self):
+        from server.queries import latest_exposures
+
+        ids = self.make_interlinkages(3)
+        eur_id = self.get_first_id("/api/currencies?code=EUR")
+        rows = [
+            {"interlinkage_id": il_id, "currency_id": eur_id, "as_of_date": f"2024-{month:02d}-28", "ead": str(month)}
+            for il_id in ids[:2] for month in range(1, 6)
+        ]
+        rv = self.client.post("/api/exposures/bulk", json=rows)
+        self.assertEqual(rv.get_json()["failed"], 0, rv.get_json())
+        # soft-deleted snapshots are skipped: the latest of ids[1] becomes April
+        may = self.get_first_id(f"/api/exposures?interlinkage_id={ids[1]}&as_of_date=2024-05-28")
+        self.client.post(f"/api/exposures/{may}/delete")
+
+        body = self.client.get(f"/api/focus-bundle?foci=interlinkage:{ids[0]},interlinkage:{ids[1]},interlinkage:{ids[2]}"
+                               "&exposures_mode=last_n&exposures_n=2").get_json()
+        self.assertEqual([(e["interlinkage_id"], e["as_of_date"]) for e in body["exposures"]], [
+            (ids[0], "2024-05-28"), (ids[0], "2024-04-28"),
+            (ids[1], "2024-04-28"), (ids[1], "2024-03-28"),
+        ])
+        body = self.client.get(f"/api/focus-bundle?kind=interlinkage&id={ids[1]}").get_json()
+        self.assertEqual([e["ead"] for e in body["exposures"]], ["4.00"])
+
+        with Session(self.engine) as s:
+            # chunked: one statement per 2 ids, same rows
+            chunked = latest_exposures(s, ids, n=3, chunk_size=2)
+            self.assertEqual([(e.interlinkage_id, e.as_of_date.month) for e in chunked],
+                             [(ids[0], 5), (ids[0], 4), (ids[0], 3), (ids[1], 4), (ids[1], 3), (ids[1], 2)])
+            self.assertEqual(len(latest_exposures(s, ids, n=1, include_deleted=True)), 2)
+            self.assertEqual(latest_exposures(s, ids, n=0), [])
+
+    def test_latest_exposures_read_model(self):
+        from server.queries import latest_exposures
+        from server.readmodels import rebuild_latest_exposures
+
+        ids = self.make_interlinkages(3)
+        eur_id = self.get_first_id("/api/currencies?code=EUR")
+        created = self.client.post("/api/exposures/bulk", json=[
+            {"interlinkage_id": il_id, "currency_id": eur_id, "as_of_date": f"2024-0{month}-28", "ead": str(month)}
+            for il_id in ids[:2] for month in (1, 2, 3)
+        ]).get_json()["results"]
+        snap = [r["id"] for r in created]  # ids[0]: snap[0:3], ids[1]: snap[3:6]
+
+        def latest():
+            with Session(self.engine) as s:
+                rows = s.query(m.LatestExposure).filter(m.LatestExposure.interlinkage_id.in_(ids)).all()
+                return {r.interlinkage_id: r.snapshot_id for r in rows}
+
+        self.assertEqual(latest(), {ids[0]: snap[2], ids[1]: snap[5]})
+        # soft delete, back-dating and hard delete all move it; measure updates do not matter
+        self.client.post(f"/api/exposures/{snap[2]}/delete")
+        self.client.post("/api/exposures/bulk/update", json=[{"id": snap[3], "as_of_date": "2024-06-28"}])
+        self.client.post("/api/exposures/bulk/delete", json={"ids": [snap[3]]})
+        self.assertEqual(latest(), {ids[0]: snap[1], ids[1]: snap[5]})
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(f"DELETE FROM exposure_snapshots WHERE id = {snap[5]}")
+        self.assertEqual(latest(), {ids[0]: snap[1], ids[1]: snap[4]})
+
+        with self.engine.begin() as conn:
+            rebuild_latest_exposures(conn)
+        self.assertEqual(latest(), {ids[0]: snap[1], ids[1]: snap[4]})
+        with Session(self.engine) as s:
+            rows, selects = self.count_queries(lambda: latest_exposures(s, ids))
+            self.assertEqual([r.id for r in rows], [snap[1], snap[4]])
+            self.assertEqual(len(selects), 1)
+            self.assertIn("latest_exposures", selects[0])
+            # same rows as the window query
+            first = {}
+            for r in latest_exposures(s, ids, n=2):
+                first.setdefault(r.interlinkage_id, r.id)
+            self.assertEqual([r.id for r in latest_exposures(s, ids, chunk_size=2)], list(first.values()))
+
+    def test_focus_bundle_streaming_formats(self):
+        from server import frames
+
+        ids = self.make_interlinkages(2)
+        eur_id = self.get_first_id("/api/currencies?code=EUR")
+        rv = self.client.post("/api/exposures/bulk", json=[
+            {"interlinkage_id": ids[0], "currency_id": eur_id, "as_of_date": "2024-06-30",
+             "ead": "12345678901234.56", "pd": "0.0125"},
+        ])
+        self.assertEqual(rv.get_json()["failed"], 0, rv.get_json())
+        url = f"/api/focus-bundle?foci=interlinkage:{ids[0]},interlinkage:{ids[1]}"
+        whole = self.client.get(url).get_json()
+
+        rv = self.client.get(url + "&format=ndjson")
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.mimetype, "application/x-ndjson")
+        lines = [json.loads(line) for line in rv.get_data(as_text=True).splitlines()]
+        self.assertEqual(lines[0]["section"], "meta")
+        self.assertEqual(lines[-1]["section"], "edges")
+        # same content as the single JSON document, one frame per section
+        streamed = dict(lines[0]["items"])
+        streamed.update({f["section"]: f["items"] for f in lines[1:]})
+        self.assertLessEqual(whole.pop("token"), streamed.pop("token"))
+        self.assertEqual(streamed, whole)
+
+        self.assertEqual(self.client.get(url + "&format=xml").status_code, 400)
+        self.assertEqual(self.client.get("/api/focus-bundle?kind=project&id=999999&format=ndjson").status_code, 404)
+
+        # exposures as scaled-integer columns: exact, whatever the magnitude
+        cols = frames.columnar(m.ExposureSnapshot, ["as_of_date", "ead", "pd", "lgd"], [
+            m.ExposureSnapshot(as_of_date=date(2024, 6, 30), ead=Decimal("12345678901234.56"), pd=Decimal("0.0125")),
+        ])
+        self.assertEqual(cols, {
+            "columns": {"as_of_date": ["2024-06-30"], "ead": [1234567890123456], "pd": [125], "lgd": [None]},
+            "scale": {"ead": 2, "pd": 4, "lgd": 4},
+        })
+        rv = self.client.get(url + "&format=msgpack")
+        if frames.msgpack is None:
+            self.assertEqual(rv.status_code, 406)
+            return
+        unpacker = frames.msgpack.Unpacker(raw=False)
+        unpacker.feed(rv.get_data())
+        exposures = next(f for f in unpacker if f["section"] == "exposures")
+        self.assertEqual(exposures["columns"]["ead"], [1234567890123456])
+
+    def test_focus_bundle_since_delta(self):
+        from datetime import datetime
+
+        project = self.client.post("/api/projects", json={"name": "Project Delta", "code": "DLT"}).get_json()["id"]
+        il1, il2 = self.make_interlinkages(2, project_id=project)
+        notes = self.client.post("/api/interlinkage-notes/bulk", json=[
+            {"interlinkage_id": il, "title": "n", "body": "b"} for il in (il1, il2)]).get_json()
+        note1 = notes["results"][0]["id"]
+        url = f"/api/focus-bundle?kind=project&id={project}"
+        full = self.client.get(url).get_json()
+        self.assertEqual({i["id"] for i in full["interlinkages"]}, {il1, il2})
+        self.assertNotIn("deleted", full)
+
+        delta = self.client.get(f"{url}&since={full['token']}").get_json()
+        self.assertEqual(delta["since"], full["token"])
+        for section in ("interlinkages", "projects", "legal_entities", "notes", "exposures", "edges"):
+            self.assertEqual(delta[section], [], section)
+        self.assertTrue(all(ids == [] for ids in delta["deleted"].values()))
+
+        self.client.post("/api/interlinkage-notes/bulk/update", json=[{"id": note1, "body": "edited"}])
+        self.client.post(f"/api/interlinkages/{il2}/delete")
+        eur_id = self.get_first_id("/api/currencies?code=EUR")
+        self.client.post("/api/exposures", json={"interlinkage_id": il1, "currency_id": eur_id, "as_of_date": "2024-01-31"})
+        sponsor = self.client.post("/api/legal-entities", json={
+            "rmpm_code": "DLT1", "rmpm_type": "INTERNAL", "name": "Delta Sponsor"}).get_json()["id"]
+        il3 = self.make_interlinkages(1, project_id=project, sponsor_id=sponsor)[0]
+
+        delta = self.client.get(f"{url}&since={delta['token']}").get_json()
+        self.assertEqual([n["body"] for n in delta["notes"]], ["edited"])
+        self.assertEqual(delta["deleted"]["interlinkages"], [il2])
+        self.assertEqual([e["interlinkage_id"] for e in delta["exposures"]], [il1])
+        # the new interlinkage comes with what it points at, and only its own edges
+        self.assertEqual([i["id"] for i in delta["interlinkages"]], [il3])
+        self.assertIn(sponsor, {e["id"] for e in delta["legal_entities"]})
+        self.assertEqual({e["interlinkage_id"] for e in delta["edges"]}, {il3})
+
+        # hard deletes are tombstoned too, and rows stamped before the token (a long
+        # transaction committing late) still count: tokens follow commit order, not clocks
+        event = self.client.post("/api/workflow-events", json={
+            "interlinkage_id": il1, "to_status": "validated"}).get_json()["id"]
+        ident = self.client.post("/api/entity-identifiers", json={
+            "entity_id": sponsor, "scheme": "LEI", "value": "DLT-LEI"}).get_json()["id"]
+        token = self.client.get(url).get_json()["token"]
+        self.client.post(f"/api/workflow-events/{event}/delete")
+        self.client.post(f"/api/interlinkage-notes/{note1}/delete?soft=0")
+        self.client.post("/api/entity-identifiers", json={"entity_id": sponsor, "scheme": "LEI", "value": "DLT-LEI-2"})
+        self.client.post(f"/api/entity-identifiers/{ident}/delete")
+        with Session(self.engine) as s, s.begin():
+            s.add(m.InterlinkageNote(interlinkage_id=il1, title="late", body="late", created_at=datetime(2000, 1, 1)))
+        delta = self.client.get(f"{url}&since={token}").get_json()
+        self.assertEqual(delta["deleted"]["workflow_events"], [event])
+        self.assertEqual(delta["deleted"]["notes"], [note1])
+        self.assertEqual(delta["deleted"]["entity_identifiers"], [ident])
+        self.assertEqual([i["value"] for i in delta["entity_identifiers"]], ["DLT-LEI-2"])
+        self.assertEqual([n["title"] for n in delta["notes"]], ["late"])
+        self.assertEqual(delta["interlinkages"], [])
+
+        # re-pointed away from a focus: a tombstone there, unless another focus still reaches it
+        cpty = self.client.post("/api/legal-entities", json={
+            "rmpm_code": "DLT2", "rmpm_type": "INTERNAL", "name": "Delta Counterparty"}).get_json()["id"]
+        il4, = self.make_interlinkages(1, sponsor_id=sponsor, counterparty_id=cpty)
+        one, both = f"/api/focus-bundle?kind=entity&id={cpty}", f"/api/focus-bundle?foci=entity:{cpty},entity:{sponsor}"
+        tokens = [self.client.get(u).get_json()["token"] for u in (one, both, url)]
+        other = self.get_first_id("/api/legal-entities?name=Counterparty%20Ltd")
+        self.client.post(f"/api/interlinkages/{il4}/update", json={"counterparty_id": other})
+        self.client.post(f"/api/interlinkages/{il1}/update", json={
+            "project_id": self.get_first_id("/api/projects?name=Project%20Neptune")})
+        delta = self.client.get(f"{one}&since={tokens[0]}").get_json()
+        self.assertEqual((delta["interlinkages"], delta["deleted"]["interlinkages"]), ([], [il4]))
+        delta = self.client.get(f"{both}&since={tokens[1]}").get_json()
+        self.assertEqual(([i["id"] for i in delta["interlinkages"]], delta["deleted"]["interlinkages"]), ([il4], []))
+        delta = self.client.get(f"{url}&since={tokens[2]}").get_json()
+        self.assertEqual(delta["deleted"]["interlinkages"], [il1])
+        self.assertNotIn(il1, {e["interlinkage_id"] for e in delta["edges"]})
+        token = tokens[2]
+
+        self.assertEqual(self.client.get(f"{url}&since=yesterday").status_code, 400)
+        # a token whose history has been pruned from the change log (issuing a token prunes
+        # once the last prune is CHANGE_PRUNE_INTERVAL old)
+        from unittest import mock
+        import server.versions as versions
+        with Session(self.engine) as s, s.begin():
+            s.query(m.ChangeLog).filter(m.ChangeLog.seq <= int(token) + 1).update({"changed_at": datetime(2000, 1, 1)})
+        with mock.patch.object(versions, "_pruned_at", datetime(2000, 1, 1)):
+            self.client.get(url)
+        self.assertEqual(self.client.get(f"{url}&since={token}").status_code, 410)
+        self.assertEqual(self.client.get(f"{url}&since={int(token) + 1}").status_code, 200)
+
+    def test_portfolio_concentration(self):
+        ids = self.make_interlinkages(4)
+        deps = [(il, "PF-SHARED", "high") for il in ids] + [(ids[0], "PF-PAIR", "low"), (ids[1], "PF-PAIR", "medium"),
+                                                            (ids[2], "PF-ONE", "low")]
+        rv = self.client.post("/api/interdependences/bulk", json=[
+            {"interlinkage_id": il, "interdependence_identifier": ident, "type": "technical", "level": level}
+            for il, ident, level in deps])
+        self.assertEqual(rv.get_json()["failed"], 0, rv.get_json())
+        self.client.post(f"/api/interlinkages/{ids[3]}/delete")
+        url = "/api/analysis/concentration/shared-dependencies"
+
+        body = self.client.post(url, json={"pov_kind": "portfolio", "page_size": 500}).get_json()
+        clusters = {c["key"]: c for c in body["clusters"]}
+        self.assertEqual(body["total"], len(body["clusters"]))
+        self.assertNotIn("PF-ONE", clusters)
+        # the deleted interlinkage does not count
+        self.assertEqual(clusters["PF-SHARED"], {
+            "key": "PF-SHARED", "label": "PF-SHARED", "by": "identifier",
+            "il_count": 3, "dep_count": 3, "levels": ["high"], "types": ["technical"]})
+        self.assertEqual(clusters["PF-PAIR"]["levels"], ["low", "medium"])
+        self.assertNotIn("interlinkages", clusters["PF-PAIR"])
+        il_counts = [c["il_count"] for c in body["clusters"]]
+        self.assertEqual(il_counts, sorted(il_counts, reverse=True))
+
+        page = self.client.post(url, json={"pov_kind": "portfolio", "page": 2, "page_size": 1}).get_json()
+        self.assertEqual(page["clusters"][0]["key"], body["clusters"][1]["key"])
+        self.assertEqual(self.client.post(url, json={"pov_kind": "portfolio", "group_by": "x"}).status_code, 400)
+
+        # composite keys are split back into per-column filters for the lazy interlinkage lists
+        body = self.client.post(url, json={"pov_kind": "portfolio", "group_by": "type_level", "page_size": 500,
+                                           "levels": ["low"]}).get_json()
+        self.assertIn("technical | low", {c["key"] for c in body["clusters"]})
+        cluster_url = url + "/cluster"
+        rv = self.client.post(cluster_url, json={"group_by": "id_type", "key": "PF-SHARED | technical",
+                                                 "page_size": 2, "measure": "ead"})
+        self.assertEqual(rv.status_code, 200, rv.get_json())
+        first = rv.get_json()
+        self.assertEqual((first["total"], [i["id"] for i in first["items"]]), (3, ids[:2]))
+        self.assertEqual(first["links"][0], {"from": f"il:{ids[0]}", "to": "cluster:PF-SHARED | technical",
+                                             "label": "shared-dependency"})
+        second = self.client.post(cluster_url, json={"group_by": "id_type", "key": "PF-SHARED | technical",
+                                                     "page": 2, "page_size": 2}).get_json()
+        self.assertEqual([i["id"] for i in second["items"]], [ids[2]])
+        pair = self.client.post(cluster_url, json={"group_by": "id_type", "key": "PF-PAIR | technical",
+                                                   "levels": ["low"]}).get_json()
+        self.assertEqual([i["id"] for i in pair["items"]], [ids[0]])
+        self.assertEqual(self.client.post(cluster_url, json={"group_by": "type"}).status_code, 400)
+
+    def test_exposure_rollup(self):
+        fin = self.get_first_id("/api/sectors?code=FIN")
+        project = self.client.post("/api/projects", json={
+            "name": "Project Rollup", "code": "ROL", "sector_id": fin, "business_line": "Rollup BL"}).get_json()["id"]
+        il1, il2 = self.make_interlinkages(2, project_id=project)
+        eur_id = self.get_first_id("/api/currencies?code=EUR")
+        rv = self.client.post("/api/exposures/bulk", json=[
+            {"interlinkage_id": il1, "currency_id": eur_id, "as_of_date": "2019-01-31", "ead": "100.00", "rwa": "10.00",
+             "fx_to_reporting": "1.10000000"},
+            {"interlinkage_id": il2, "currency_id": eur_id, "as_of_date": "2019-01-31", "ead": "50.00", "rwa": "5.00",
+             "fx_to_reporting": "2.00000000"},
+            {"interlinkage_id": il1, "currency_id": eur_id, "as_of_date": "2019-02-28", "ead": "80.00",
+             "fx_to_reporting": "1.00000000"},
+            # no rate: counted, not summed
+            {"interlinkage_id": il2, "currency_id": eur_id, "as_of_date": "2019-02-28", "ead": "999.00"},
+        ])
+        self.assertEqual(rv.get_json()["failed"], 0, rv.get_json())
+        url = "/api/analysis/exposure-rollup"
+        window = {"date_from": "2019-01-01", "date_to": "2019-12-31"}
+
+        body = self.client.post(url, json={"group_by": "business_line", "measures": ["ead", "rwa"], **window}).get_json()
+        self.assertEqual(body["dates"], ["2019-01-31", "2019-02-28"])
+        self.assertEqual(body["groups"], [{"key": "Rollup BL", "label": "Rollup BL"}])
+        self.assertEqual(body["values"], {"ead": [["210.00", "80.00"]], "rwa": [["21.00", None]]})
+        self.assertEqual((body["rows"], body["unconverted"]), (4, 1))
+
+        body = self.client.post(url, json={"group_by": "sector", **window}).get_json()
+        self.assertEqual(body["groups"], [{"key": fin, "label": "Financials"}])
+        body = self.client.post(url, json={"group_by": "project", **window}).get_json()
+        self.assertEqual(body["groups"], [{"key": project, "label": "Project Rollup"}])
+        self.assertEqual(body["values"]["ead"], [["210.00", "80.00"]])
+
+        # the exposure_daily read model follows every kind of write, and matches the raw aggregate
+        from unittest import mock
+        other = self.client.post("/api/projects", json={"name": "Project Rollup 2", "code": "ROL2"}).get_json()["id"]
+        il3, = self.make_interlinkages(1, project_id=project)
+        snaps = self.client.post("/api/exposures/bulk", json=[
+            {"interlinkage_id": il3, "currency_id": eur_id, "as_of_date": d, "ead": "7.00", "fx_to_reporting": "1.00000000"}
+            for d in ("2019-01-31", "2019-03-31")]).get_json()
+        march = snaps["results"][1]["id"]
+        self.client.post(f"/api/exposures/{march}/update", json={"ead": "9.00"})
+        self.client.post(f"/api/interlinkages/{il2}/update", json={"project_id": other})
+        self.client.post(f"/api/interlinkages/{il1}/delete")
+        params = {"group_by": "project", "measures": ["ead", "rwa"], **window}
+        body = self.client.post(url, json=params).get_json()
+        self.assertEqual(body["groups"], [{"key": project, "label": "Project Rollup"},
+                                          {"key": other, "label": "Project Rollup 2"}])
+        self.assertEqual(body["values"]["ead"], [["7.00", None, "9.00"], ["100.00", None, None]])
+        self.assertEqual((body["rows"], body["unconverted"]), (4, 1))
+        self.assertEqual(self.client.post(f"/api/interlinkages/{il3}/delete?soft=0").status_code, 204)
+        for group_by in ("project", "sector", "country", "currency", "business_line"):
+            params = {"group_by": group_by, "measures": ["ead", "rwa"], **window}
+            with mock.patch("server.queries.exposure_daily_active", return_value=False):
+                raw = self.client.post(url, json=params).get_json()
+            self.assertEqual(self.client.post(url, json=params).get_json(), raw, group_by)
+
+        # update / delete churn with awkward rates: the cells equal a fresh GROUP BY exactly,
+        # and cells that lost their last snapshot are gone
+        from server.readmodels import rebuild_exposure_daily
+        il4, = self.make_interlinkages(1, project_id=project)
+        snaps = self.client.post("/api/exposures/bulk", json=[
+            {"interlinkage_id": il4, "currency_id": eur_id, "as_of_date": f"2019-04-{d:02d}", "ead": "0.10",
+             "rwa": "0.07", "fx_to_reporting": "1.23456789"} for d in range(1, 21)]).get_json()
+        snap_ids = [r["id"] for r in snaps["results"]]
+        for round_ in range(3):
+            self.client.post("/api/exposures/bulk/update", json=[
+                {"id": i, "ead": f"{k + round_}.33", "fx_to_reporting": f"0.{k + 1}7654321"} for k, i in enumerate(snap_ids)])
+        self.client.post("/api/exposures/bulk/delete", json=snap_ids[:5])
+        self.client.post("/api/exposures/bulk/delete?soft=0", json=snap_ids[5:10])
+
+        def cells():
+            with Session(self.engine) as s:
+                return sorted(tuple(r) for r in s.query(m.ExposureDaily.__table__).all())
+        maintained = cells()
+        self.assertFalse([c for c in maintained if c[3] == 0])
+        self.assertEqual(len([c for c in maintained if str(c[0]).startswith("2019-04")]), 10)
+        with self.engine.begin() as conn:
+            rebuild_exposure_daily(conn)
+        self.assertEqual(maintained, cells())
+
+        self.assertEqual(self.client.post(url, json={"group_by": "desk"}).status_code, 400)
+        self.assertEqual(self.client.post(url, json={"measures": ["pd"]}).status_code, 400)
+        self.assertEqual(self.client.post(url, json={"date_from": "31/01/2019"}).status_code, 400)
+
+    def test_analysis_jobs(self):
+        il, = self.make_interlinkages(1)
+        eur_id = self.get_first_id("/api/currencies?code=EUR")
+        rv = self.client.post("/api/exposures", json={
+            "interlinkage_id": il, "currency_id": eur_id, "as_of_date": "2018-06-30", "ead": "12.50",
+            "fx_to_reporting": "1.00000000"})
+        self.assertEqual(rv.status_code, 201, rv.get_json())
+        params = {"group_by": "project", "date_from": "2018-01-01", "date_to": "2018-12-31"}
+
+        rv = self.client.post("/api/jobs", json={"kind": "exposure_rollup", "params": params})
+        self.assertEqual(rv.status_code, 202, rv.get_json())
+        job = rv.get_json()
+        self.assertEqual(rv.headers["Location"], f"/api/jobs/{job['id']}")
+        status = self.client.get(f"/api/jobs/{job['id']}?wait=10").get_json()
+        self.assertEqual((status["status"], status["status_code"]), ("done", 200), status)
+        rv = self.client.get(f"/api/jobs/{job['id']}/result")
+        self.assertEqual(rv.get_json(), self.client.post("/api/analysis/exposure-rollup", json=params).get_json())
+
+        # same kind and params on unchanged data: the finished job is reused
+        rv = self.client.post("/api/jobs", json={"kind": "exposure_rollup", "params": params})
+        self.assertEqual((rv.status_code, rv.get_json()["id"]), (200, job["id"]))
+
+        # the analysis' own validation error is the job's result
+        rv = self.client.post("/api/jobs", json={"kind": "exposure_rollup", "params": {"group_by": "desk"}})
+        bad = rv.get_json()["id"]
+        self.assertEqual(self.client.get(f"/api/jobs/{bad}?wait=10").get_json()["status_code"], 400)
+        self.assertEqual(self.client.get(f"/api/jobs/{bad}/result").status_code, 400)
+
+        # analyses relative to today are not reused on a later day
+        from unittest import mock
+        import server.jobs as jobs
+
+        class Tomorrow(date):
+            @classmethod
+            def today(cls):
+                return date.today() + timedelta(days=1)
+
+        expiry = {"kind": "expiry", "params": {"pov_kind": "portfolio"}}
+        first = self.client.post("/api/jobs", json=expiry).get_json()["id"]
+        self.client.get(f"/api/jobs/{first}?wait=10")
+        self.assertEqual(self.client.post("/api/jobs", json=expiry).get_json()["id"], first)
+        with mock.patch.object(jobs, "date", Tomorrow):
+            rv = self.client.post("/api/jobs", json=expiry)
+        self.assertEqual(rv.status_code, 202)
+        self.assertNotEqual(rv.get_json()["id"], first)
+        self.client.get(f"/api/jobs/{rv.get_json()['id']}?wait=10")
+
+        self.assertEqual(self.client.post("/api/jobs", json={"kind": "pricing", "params": {}}).status_code, 400)
+        self.assertEqual(self.client.get("/api/jobs/nope").status_code, 404)
+        self.assertEqual(self.client.get("/api/jobs/nope/result").status_code, 404)
+
+    def test_graph_index_neighbours(self):
+        from unittest import mock
+        from server import graph
+
+        def entity(code):
+            return self.client.post("/api/legal-entities", json={
+                "rmpm_code": code, "rmpm_type": "INTERNAL", "name": f"Graph {code}"}).get_json()["id"]
+
+        a, b, c = entity("GRA"), entity("GRB"), entity("GRC")
+        p1 = self.client.post("/api/projects", json={"name": "Graph project 1", "code": "GRP1"}).get_json()["id"]
+        p2 = self.client.post("/api/projects", json={"name": "Graph project 2", "code": "GRP2"}).get_json()["id"]
+        il, = self.make_interlinkages(1, sponsor_id=a, counterparty_id=b, project_id=p1)
+
+        def neighbours(kind, node_id, query=""):
+            rv = self.client.get(f"/api/graph/neighbours?kind={kind}&id={node_id}{query}")
+            self.assertEqual(rv.status_code, 200, rv.get_json())
+            return {(n["kind"], n["id"], n["role"], n["interdependence_id"]) for n in rv.get_json()["neighbours"]}
+
+        self.assertEqual(neighbours("interlinkage", il), {
+            ("entity", a, "sponsor", None), ("entity", b, "counterparty", None), ("project", p1, "project", None)})
+        self.assertEqual(neighbours("entity", a), {("interlinkage", il, "sponsor", None)})
+
+        # a write to the same table outside the API is not absorbed by the next patch
+        with Session(self.engine) as s, s.begin():
+            outside = m.Interlinkage(sponsor_id=a, counterparty_id=b, project_id=p2, status="draft",
+                                     deal_date=date(1999, 12, 31))
+            s.add(outside)
+            s.flush()
+            outside_id = outside.id
+        self.client.post(f"/api/interlinkages/{il}/update", json={"remarks": "touched"})
+        self.assertIn(("interlinkage", outside_id, "sponsor", None), neighbours("entity", a))
+        self.client.post(f"/api/interlinkages/{outside_id}/delete")
+
+        # writes patch the index in place: reads after them cost one version lookup
+        self.client.post(f"/api/interlinkages/{il}/update", json={"counterparty_id": c, "booking_entity_id": b})
+        dep = self.client.post("/api/interdependences", json={
+            "interlinkage_id": il, "interdependence_identifier": "GR-P2", "type": "technical", "project_id": p2}).get_json()["id"]
+        found, selects = self.count_queries(lambda: neighbours("interlinkage", il))
+        self.assertEqual(found, {("entity", a, "sponsor", None), ("entity", c, "counterparty", None),
+                                 ("entity", b, "booking", None), ("project", p1, "project", None),
+                                 ("project", p2, "interdependence", dep)})
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(neighbours("interlinkage", il, "&roles=sponsor,booking"),
+                         {("entity", a, "sponsor", None), ("entity", b, "booking", None)})
+
+        self.client.post(f"/api/interdependences/{dep}/delete")
+        self.client.post(f"/api/legal-entities/{c}/delete")
+        self.assertEqual(neighbours("interlinkage", il), {
+            ("entity", a, "sponsor", None), ("entity", b, "booking", None), ("project", p1, "project", None)})
+
+        # folding the overlay back into the arrays changes nothing
+        with mock.patch.object(graph, "COMPACT_EDGES", 0):
+            self.client.post(f"/api/interlinkages/{il}/update", json={"booking_entity_id": None})
+        self.assertEqual(neighbours("entity", b), set())
+        self.assertEqual(neighbours("interlinkage", il), {("entity", a, "sponsor", None), ("project", p1, "project", None)})
+
+        self.client.post(f"/api/interlinkages/{il}/delete")
+        self.assertEqual(self.client.get(f"/api/graph/neighbours?kind=interlinkage&id={il}").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/graph/neighbours?kind=entity&id={c}").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/graph/neighbours?kind=entity&id={a}&roles=owner").status_code, 400)
+
+    def test_network_metrics(self):
+        def entity(code):
+            return self.client.post("/api/legal-entities", json={
+                "rmpm_code": code, "rmpm_type": "INTERNAL", "name": f"Net {code}"}).get_json()["id"]
+
+        def project(code):
+            return self.client.post("/api/projects", json={"name": f"Net project {code}", "code": code}).get_json()["id"]
+
+        # hub h deals with x, y and z, each on a project of its own
+        h, x, y, z = entity("NETH"), entity("NETX"), entity("NETY"), entity("NETZ")
+        ils = [self.make_interlinkages(1, sponsor_id=h, counterparty_id=c, project_id=project(f"NP{c}"))[0]
+               for c in (x, y, z)]
+        eur_id = self.get_first_id("/api/currencies?code=EUR")
+        self.client.post("/api/exposures/bulk", json=[
+            {"interlinkage_id": il, "currency_id": eur_id, "as_of_date": "2017-12-31", "ead": ead,
+             "fx_to_reporting": "2.00000000"}
+            for il, ead in zip(ils[:2], ("100.00", "50.00"))
+        ])
+        url = "/api/analysis/network-metrics"
+
+        def metrics(**params):
+            rv = self.client.post(url, json={"samples": 2048, "page_size": 500, "components_limit": 500, **params})
+            self.assertEqual(rv.status_code, 200, rv.get_json())
+            body = rv.get_json()
+            return body, {i["id"]: i for i in body["items"]}
+
+        body, items = metrics(sort="betweenness")
+        self.assertTrue(body["graph"]["exact"])
+        self.assertEqual((items[h]["degree"], items[h]["weighted_degree"], items[x]["betweenness"]), (3, 3.0, 0.0))
+        self.assertGreater(items[h]["betweenness"], items[y]["betweenness"])
+        self.assertEqual(items[h]["name"], "Net NETH")
+        component = body["components"][items[h]["component"] - 1]
+        self.assertEqual((component["interlinkages"], component["entities"], component["projects"]), (3, 4, 3))
+        self.assertEqual(component["interlinkage_ids"], sorted(ils))
+
+        _, items = metrics(weight="ead")
+        self.assertEqual((items[h]["weighted_degree"], items[x]["weighted_degree"], items[z]["weighted_degree"]),
+                         (300.0, 200.0, 0.0))
+
+        # unchanged book: served from the cache; a write moves the graph version
+        _, selects = self.count_queries(lambda: metrics(weight="ead"))
+        self.assertLessEqual(len(selects), 3)
+        self.make_interlinkages(1, sponsor_id=h, counterparty_id=x, project_id=project("NPX2"))
+        _, items = metrics()
+        self.assertEqual((items[h]["degree"], items[x]["degree"]), (4, 2))
+
+        self.assertEqual(self.client.post(url, json={"weight": "rwa"}).status_code, 400)
+        self.assertEqual(self.client.post(url, json={"sort": "pagerank"}).status_code, 400)
+        self.assertEqual(self.client.post(url, json={"samples": 10 ** 6}).status_code, 400)
+
+    def test_analysis_jobs_recovery(self):
+        import os
+        import socket
+        from datetime import datetime
+        from server.jobs import STALE_AFTER, job_runner
+
+        host, now = socket.gethostname(), datetime.utcnow()
+        dead_pid = 2 ** 22 + 1  # above pid_max
+        jobs = {
+            "live_elsewhere": ("otherhost:1", now),
+            "live_here":      (f"{host}:{os.getpid()}", now),
+            "dead_pid":       (f"{host}:{dead_pid}", now),
+            "stale":          ("otherhost:2", now - STALE_AFTER * 2),
+        }
+        with Session(self.engine) as s, s.begin():
+            for job_id, (owner, beat) in jobs.items():
+                s.add(m.AnalysisJob(id=job_id, kind="exposure_rollup", params="{}", cache_key=job_id,
+                                    status="running", owner=owner, heartbeat_at=beat))
+        job_runner.recover_jobs()
+        with Session(self.engine) as s:
+            status = dict(s.query(m.AnalysisJob.id, m.AnalysisJob.status).filter(m.AnalysisJob.id.in_(jobs)))
+        self.assertEqual(status, {"live_elsewhere": "running", "live_here": "running",
+                                  "dead_pid": "failed", "stale": "failed"})
+
+        # resubmitting on unchanged data does not hand back a job whose owner is gone
+        from server.jobs import _cache_key
+        params = {"group_by": "currency", "date_from": "2016-01-01", "date_to": "2016-12-31"}
+        with Session(self.engine) as s, s.begin():
+            key = _cache_key(s, "exposure_rollup", json.dumps(params, sort_keys=True, separators=(",", ":")))
+            s.add(m.AnalysisJob(id="stale_dup", kind="exposure_rollup", params="{}", cache_key=key, status="running",
+                                owner="otherhost:3", heartbeat_at=now - STALE_AFTER * 2))
+        rv = self.client.post("/api/jobs", json={"kind": "exposure_rollup", "params": params})
+        self.assertEqual(rv.status_code, 202, rv.get_json())
+        job = rv.get_json()["id"]
+        self.assertNotEqual(job, "stale_dup")
+        self.assertEqual(self.client.get(f"/api/jobs/{job}?wait=10").get_json()["status"], "done")
+        self.assertEqual(self.client.get("/api/jobs/stale_dup").get_json()["status"], "failed")
+
+    def test_expiry_monitoring_scopes(self):
+        project = self.client.post("/api/projects", json={
+            "name": "Project Expiry", "code": "EXP", "business_line": "Expiry BL", "portfolio": "Expiry PF"}).get_json()["id"]
+        eur_id = self.get_first_id("/api/currencies?code=EUR")
+        today = date.today()
+        ids = [
+            self.make_interlinkages(1, project_id=project, currency_id=eur_id, notional_amount=amount,
+                                    maturity_date=(today + timedelta(days=days)).isoformat())[0]
+            for days, amount in ((-10, "0.10"), (5, "0.20"), (5, "1234567890123.55"), (45, "7.00"), (1000, "1.00"))
+        ]
+        url = "/api/analysis/expiry-monitoring"
+        by_project = self.client.post(url, json={"pov_id": project}).get_json()
+
+        rv = self.client.post(url, json={"pov_kind": "business_line", "pov_id": "Expiry BL", "page_size": 2})
+        self.assertEqual(rv.status_code, 200, rv.get_json())
+        body = rv.get_json()
+        # same buckets as the per-project path, totals exact
+        self.assertEqual(body["buckets"], by_project["buckets"])
+        totals = {b["label"]: (b["count"], b["total_notional"]) for b in body["buckets"]}
+        self.assertEqual(totals["Overdue"], (1, [{"currency_code": "EUR", "amount": "0.10"}]))
+        self.assertEqual(totals["1-30"], (2, [{"currency_code": "EUR", "amount": "1234567890123.75"}]))
+        self.assertEqual(totals[">365"][0], 1)
+        # paged, soonest maturity first
+        self.assertEqual((body["total"], [i["id"] for i in body["items"]]), (5, ids[:2]))
+        self.assertEqual([i["bucket"] for i in body["items"]], ["Overdue", "1-30"])
+        page3 = self.client.post(url, json={"pov_kind": "project_portfolio", "pov_id": "Expiry PF",
+                                            "page": 3, "page_size": 2}).get_json()
+        self.assertEqual([i["id"] for i in page3["items"]], ids[4:])
+        self.assertEqual(page3["items"][0]["days_to_maturity"], 1000)
+
+        book = self.client.post(url, json={"pov_kind": "portfolio", "page_size": 500}).get_json()
+        self.assertTrue(set(ids) <= {i["id"] for i in book["items"]})
+        self.assertEqual(self.client.post(url, json={"pov_kind": "business_line"}).status_code, 400)
+        self.assertEqual(self.client.post(url, json={"pov_kind": "desk", "pov_id": 1}).status_code, 400)
+
+    def test_focus_bundle_depth_traversal(self):
+        def entity(code):
+            return self.client.post("/api/legal-entities", json={
+                "rmpm_code": code, "rmpm_type": "INTERNAL", "name": f"Hop {code}"}).get_json()["id"]
+
+        def project(code):
+            return self.client.post("/api/projects", json={"name": f"Hop project {code}", "code": code}).get_json()["id"]
+
+        a, b, c, d = entity("HOPA"), entity("HOPB"), entity("HOPC"), entity("HOPD")
+        p1, p2, p3 = project("HP1"), project("HP2"), project("HP3")
+        # a -[il1 @ p1]- b -[il2 @ p2]- c ; il2 has an interdependence on p3 ; d -[il3 @ p3]
+        il1 = self.make_interlinkages(1, sponsor_id=a, counterparty_id=b, project_id=p1)[0]
+        il2 = self.make_interlinkages(1, sponsor_id=b, counterparty_id=c, project_id=p2)[0]
+        il3 = self.make_interlinkages(1, sponsor_id=d, counterparty_id=d, project_id=p3)[0]
+        self.client.post("/api/interdependences", json={
+            "interlinkage_id": il2, "interdependence_identifier": "HOP-P3", "type": "technical", "project_id": p3})
+
+        def bundle(query):
+            rv = self.client.get(f"/api/focus-bundle?kind=entity&id={a}&exposures_mode=none&{query}")
+            self.assertEqual(rv.status_code, 200, rv.get_json())
+            body = rv.get_json()
+            hops = {("entity", r["id"]): r["hop"] for r in body["legal_entities"]}
+            hops.update({("project", r["id"]): r["hop"] for r in body["projects"]})
+            hops.update({("interlinkage", r["id"]): r["hop"] for r in body["interlinkages"]})
+            return body, hops
+
+        body, hops = bundle("depth=1")
+        self.assertEqual(hops, {("entity", a): 0, ("interlinkage", il1): 0, ("entity", b): 1, ("project", p1): 1})
+        self.assertNotIn("truncated", body)
+
+        body, hops = bundle("depth=2")
+        self.assertEqual(hops[("interlinkage", il2)], 1)
+        self.assertEqual({hops[("entity", c)], hops[("project", p2)], hops[("project", p3)]}, {2})
+        self.assertNotIn(("interlinkage", il3), hops)
+        self.assertIn({"type": "interdep-project", "interdep_id": body["interdependences"][0]["id"],
+                       "interlinkage_id": il2, "project_id": p3, "foci": [f"entity:{a}"]}, body["edges"])
+        self.assertFalse(body["truncated"])
+        # edges beyond the first hop name the focus that pulled them in (the nearest one)
+        self.assertTrue(all(e["foci"] == [f"entity:{a}"] for e in body["edges"]), body["edges"])
+        rv = self.client.get(f"/api/focus-bundle?foci=entity:{a},entity:{c}&depth=2&exposures_mode=none")
+        foci = {(e["type"], e["interlinkage_id"]): e["foci"] for e in rv.get_json()["edges"]}
+        self.assertEqual(foci[("interlinkage-project", il1)], [f"entity:{a}"])
+        self.assertEqual(foci[("interlinkage-project", il2)], [f"entity:{c}"])
+        self.assertEqual(foci[("interdep-project", il2)], [f"entity:{c}"])
+
+        body, hops = bundle("depth=3")
+        self.assertEqual(hops[("interlinkage", il3)], 2)
+        self.assertEqual(hops[("entity", d)], 3)
+
+        # the whole walk is a single statement, whatever the depth
+        _, two = self.count_queries(lambda: self.client.get(f"/api/focus-bundle?kind=entity&id={a}&depth=2"))
+        _, three = self.count_queries(lambda: self.client.get(f"/api/focus-bundle?kind=entity&id={a}&depth=3"))
+        self.assertEqual(len(two), len(three))
+
+        body, hops = bundle("depth=3&max_nodes=3")
+        self.assertTrue(body["truncated"])
+        self.assertEqual([r["id"] for r in body["interlinkages"]], [il1])
+
+        self.assertEqual(self.client.get(f"/api/focus-bundle?kind=entity&id={a}&depth=9").status_code, 400)
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
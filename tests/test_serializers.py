@@ -0,0 +1,45 @@
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+
+import server.models as m
+from server.api.routes import RESOURCES
+from server.schemas import InterlinkageSchema, ExposureSnapshotSchema, LegalEntitySchema
+from server.serializers import dump_many, dump_one
+
+
+class CompiledSerializerTestCase(unittest.TestCase):
+    def assertSameDump(self, schema, objs):
+        self.assertEqual(dump_many(schema, objs), schema.dump(objs, many=True))
+        for obj in objs:
+            self.assertEqual(dump_one(schema, obj), schema.dump(obj))
+
+    def test_matches_marshmallow_for_every_resource(self):
+        for model, name, schema in RESOURCES:
+            with self.subTest(resource=name):
+                self.assertSameDump(schema, [model(id=1), model(id=2)])
+
+    def test_decimal_date_and_dump_only_fields(self):
+        il = m.Interlinkage(
+            id=7, sponsor_id=1, counterparty_id=2, project_id=3,
+            deal_date=date(2024, 12, 31), notional_amount=Decimal("1000000.50"),
+            status="draft", is_deleted=False, created_at=datetime(2025, 1, 2, 3, 4, 5, 6),
+        )
+        exp = m.ExposureSnapshot(
+            id=1, interlinkage_id=7, as_of_date=date(2025, 1, 31), currency_id=1,
+            ead=Decimal("12.30"), pd=Decimal("0.0125"), lgd=Decimal("1E+1"), rwa=None,
+            fx_to_reporting=1.5,  # float coming from a non-Decimal source goes through the field
+        )
+        self.assertSameDump(InterlinkageSchema(), [il])
+        self.assertSameDump(ExposureSnapshotSchema(), [exp])
+        self.assertEqual(dump_one(ExposureSnapshotSchema(), exp)["lgd"], "10")
+
+    def test_only_and_many_instances(self):
+        le = m.LegalEntity(id=3, name="Acme", rmpm_code="X", rmpm_type="Y", is_pep=True)
+        self.assertSameDump(LegalEntitySchema(only=("id", "name")), [le])
+        self.assertEqual(dump_many(LegalEntitySchema(many=True), [le]), LegalEntitySchema(many=True).dump([le]))
+        self.assertEqual(dump_many(LegalEntitySchema, [le]), LegalEntitySchema().dump([le], many=True))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)